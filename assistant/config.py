@@ -8,6 +8,68 @@ load_dotenv()
 # --- Chaves de API e Segurança ---
 DB_FILE = "database.db"
 
+# --- Execução das consultas (assistant/executa_sql.py) ---
+# Conexões somente leitura mantidas abertas para as consultas geradas pelo LLM
+SQL_POOL_SIZE = 4
+# Statements preparados guardados por conexão (parâmetro cached_statements do sqlite3)
+SQL_STATEMENT_CACHE = 128
+# Tempo máximo de uma consulta; acima disso ela é interrompida
+SQL_TIMEOUT_SECONDS = float(os.getenv("THORR_SQL_TIMEOUT", "10"))
+# Linhas e memória máximas de um resultado; acima disso o DataFrame volta truncado
+SQL_MAX_ROWS = 10000
+SQL_MAX_RESULT_MB = 256
+# Resultados paginados (executa_sql.open_query): linhas por página no REPL e na API HTTP
+SQL_PAGE_SIZE = 50
+# Cursores abertos ao mesmo tempo na API HTTP: cada um segura uma conexão do pool até
+# ser lido até o fim, fechado ou expirar (deixe abaixo de SQL_POOL_SIZE)
+SQL_MAX_OPEN_CURSORS = 2
+SQL_CURSOR_TTL_SECONDS = 60
+# Log JSONL das consultas executadas e seus planos, lido pelo index_advisor.py ("" desliga)
+SQL_QUERY_LOG = os.getenv("THORR_SQL_QUERY_LOG", ".cache/query_log.jsonl")
+# Guarda de custo (assistant/query_guard.py): EXPLAIN QUERY PLAN antes de executar SQL gerado
+SQL_GUARD_ENABLED = True
+# Tabelas com mais linhas que isso contam como "grandes" (contagens do sqlite_stat1)
+SQL_GUARD_LARGE_TABLE_ROWS = 100000
+# Estimativa máxima de linhas visitadas por um loop aninhado sem índice (produto cartesiano)
+SQL_GUARD_MAX_NESTED_ROWS = 10000000
+
+# Motor colunar opcional (assistant/duckdb_engine.py, requer 'pip install duckdb'):
+# "sqlite" executa tudo no SQLite; "duckdb" manda as agregações pesadas para o DuckDB
+SQL_ANALYTIC_ENGINE = os.getenv("THORR_SQL_ENGINE", "sqlite")
+# De onde o DuckDB lê os dados: "sqlite" (anexa o database.db pela extensão sqlite) ou
+# "parquet" (cópia colunar das tabelas em DUCKDB_PARQUET_DIR, refeita quando o banco muda)
+DUCKDB_SOURCE = os.getenv("THORR_DUCKDB_SOURCE", "sqlite")
+DUCKDB_PARQUET_DIR = ".cache/parquet"
+# Threads do DuckDB (0 = padrão do DuckDB, um por núcleo)
+DUCKDB_THREADS = 0
+# Agregações sobre tabelas que somam pelo menos esse número de linhas vão para o DuckDB
+SQL_ANALYTIC_MIN_ROWS = 100000
+
+# Catálogo do esquema (assistant/schema_catalog.py): valores de exemplo por coluna e
+# linhas lidas, no máximo, para encontrá-los
+SCHEMA_SAMPLE_VALUES = 5
+SCHEMA_SAMPLE_SCAN_ROWS = 1000
+
+# Orçamento, em tokens do modelo de chat, do esquema nos prompts (assistant/prompt_fragments.py).
+# Os fragmentos de tabela e coluna entram por ordem de relevância na recuperação até o
+# limite; colunas-chave e colunas com valores citados na pergunta sempre entram. 0 = sem limite.
+SQL_SCHEMA_TOKEN_BUDGET = 384
+DATA_ASSISTANCE_SCHEMA_TOKEN_BUDGET = 512
+
+# Índice de valores (assistant/value_index.py): valores reais das colunas categóricas
+# citados na pergunta entram no prompt de SQL. Colunas com mais valores distintos ou
+# valores mais longos que os limites abaixo não são indexadas.
+VALUE_INDEX_ENABLED = True
+VALUE_INDEX_MAX_DISTINCT = 20000
+VALUE_INDEX_MAX_LENGTH = 100
+# Valores, no máximo, mostrados por coluna no prompt
+VALUE_INDEX_MATCHES = 5
+# Valores mais bem ranqueados pelo FTS (todas as colunas) antes do corte por coluna
+VALUE_INDEX_CANDIDATES = 40
+# Palavras presentes em mais valores que isto (ex.: "porto", "residencial") só são
+# buscadas dentro de sequências da pergunta ("porto alegre")
+VALUE_INDEX_MAX_TERM_VALUES = 100
+
 # --- Configurações de Arquivos e Pastas ---
 # Dicionário com os nomes das tabelas e seus respectivos arquivos
 DATA_FILES = {
@@ -24,16 +86,99 @@ BASE_TEXTS = {
     'typologies': "Tipologias: configuração de quartos, banheiros, suites, lavabos e área, por id_predio.",
     'units': "Unidades individuais para venda/aluguel: andar, área, número, id_predio e tipologia.",
     'units_updates': "Histórico de preços das unidades: disponibilidade, preço, descontos, datas.",
+    'units_latest': "Situação atual de cada unidade: a atualização mais recente do histórico (preço, desconto e disponibilidade atuais), com id_predio. Use para preço atual ou disponibilidade hoje.",
+    'buildings_summary': "Resumo atual por prédio (id_predio): total de unidades, unidades disponíveis, preço mínimo, médio e máximo, desconto médio.",
+    'cities_summary': "Resumo atual por cidade: número de prédios, total de unidades, unidades disponíveis, preço mínimo, médio e máximo, desconto médio.",
 }
 
+# --- Tabelas de resumo do histórico de preços (assistant/summary_tables.py) ---
+# Nomes das colunas de units_updates usadas nos resumos (colunas ausentes ficam NULL)
+UNITS_UPDATES_COLUMNS = {
+    "id": "id_atualização",          # cresce a cada atualização: a maior é a mais recente
+    "unit": "unidade_id",
+    "price": "preco",
+    "discount": "desconto",
+    "availability": "disponibilidade",
+    "date": "data_atualizacao",
+}
+# Coluna de units que liga com units_updates[UNITS_UPDATES_COLUMNS["unit"]]
+UNITS_ID_COLUMN = "unidade_id"
+# Valores (normalizados) de disponibilidade que contam como unidade disponível
+UNIT_AVAILABLE_VALUES = ["disponivel", "1", "sim"]
+
 # Colunas-chave que devem ser mantidas durante o refinamento para garantir os JOINs
 KEY_COLUMNS = ['id_unidade', 'id_predio', 'id_tipologia', 'unidade_id', 'id_atualização']
 
 
 # --- Configurações dos Modelos de IA ---
 EMBEDDING_MODEL = 'intfloat/multilingual-e5-large'
+# Backend dos embeddings (assistant/embeddings.py): "sentence-transformers" ou "onnx-int8"
+# (modelo exportado com: python -m assistant.embeddings export)
+EMBEDDING_BACKEND = os.getenv("THORR_EMBEDDING_BACKEND", "sentence-transformers")
+EMBEDDING_ONNX_DIR = os.getenv("THORR_EMBEDDING_ONNX_DIR", "models/e5-large-onnx-int8")
+# Dimensões mantidas de cada embedding (0 = todas). O e5 não foi treinado para
+# truncamento: confira o recall com python -m evaluation.retrieval antes de reduzir
+EMBEDDING_DIMENSIONS = int(os.getenv("THORR_EMBEDDING_DIMENSIONS", "0"))
+# Normaliza os embeddings (L2): os índices FAISS passam a usar produto interno (cosseno)
+EMBEDDING_NORMALIZE = True
 CHAT_MODEL = "NousResearch/Llama-2-7b-chat-hf"
 
+# Perfis de geração por tarefa: limite de tokens, decodificação e regra de parada
+# ("json": para na chave que fecha o objeto; "sql": para no ';' ou na cerca ```)
+GENERATION_PROFILES = {
+    "default": {"max_new_tokens": 256, "temperature": 0.7},
+    "json": {"max_new_tokens": 48, "do_sample": False, "stop": "json"},
+    "sql": {"max_new_tokens": 200, "do_sample": False, "stop": "sql"},
+    "chat": {"max_new_tokens": 256, "do_sample": False},
+}
+
+# Decodificação especulativa (opcional, backends do transformers): um modelo pequeno
+# com o mesmo tokenizer propõe tokens que o CHAT_MODEL verifica. Vazio desativa.
+# Ex.: "TinyLlama/TinyLlama-1.1B-Chat-v1.0"
+DRAFT_MODEL = os.getenv("THORR_DRAFT_MODEL", "")
+
+# Geração em lote (generate_local_responses): prompts por lote e limite de tokens
+# (prompt + geração, somados no lote) para não estourar a memória
+LLM_BATCH_SIZE = 8
+LLM_BATCH_MAX_TOKENS = 16384
+# Tamanho do lote nas chamadas de model.encode em massa
+EMBEDDING_BATCH_SIZE = 64
+
+# Reaproveita o KV cache dos system prompts fixos (SQL, intenção, persona) entre chamadas
+PREFIX_KV_CACHE = True
+# Memória máxima ocupada pelos KV caches de prefixo guardados
+PREFIX_CACHE_MAX_MB = 1024
+
+# Pasta do cache de embeddings e índices FAISS (vazio desativa o cache)
+EMBEDDING_CACHE_DIR = os.getenv("THORR_EMBEDDING_CACHE_DIR", ".cache/embeddings")
+
+# --- Classificador de Intenção ---
+# Abaixo desta confiança o classificador por embeddings delega a decisão ao LLM
+INTENT_CONFIDENCE_THRESHOLD = 0.6
+# Temperatura do softmax sobre as similaridades de cosseno com os centróides
+INTENT_SOFTMAX_TEMPERATURE = 0.02
+
+# --- Cache de Perguntas -> SQL ---
+SQL_CACHE_MAX_ENTRIES = 1000
+SQL_CACHE_TTL_SECONDS = 7 * 24 * 3600
+# Similaridade de cosseno mínima para reaproveitar o SQL de uma pergunta parecida
+SQL_CACHE_SIMILARITY_THRESHOLD = 0.97
+# Arquivo SQLite para persistir o cache entre execuções (vazio = só em memória)
+SQL_CACHE_DB = os.getenv("THORR_SQL_CACHE_DB", ".cache/sql_cache.db")
+
+# --- Backend de Inferência do Modelo de Chat ---
+# "bnb-4bit": transformers + bitsandbytes em 4 bits (requer GPU CUDA)
+# "torch-int8": transformers em CPU com quantização dinâmica int8 do PyTorch
+# "llama-cpp": llama.cpp (llama-cpp-python) com um modelo GGUF, em CPU
+# "stub": respostas fixas, sem modelo (testes e benchmarks)
+LLM_BACKEND = os.getenv("THORR_LLM_BACKEND", "bnb-4bit")
+# Threads de CPU para os backends "torch-int8" e "llama-cpp" (None = padrão da biblioteca)
+LLM_NUM_THREADS = int(os.getenv("THORR_LLM_THREADS", "0")) or None
+# Janela de contexto (prompt + geração) em tokens
+LLM_CONTEXT_SIZE = int(os.getenv("THORR_LLM_CONTEXT_SIZE", "4096"))
+# Arquivo GGUF usado pelo backend "llama-cpp"
+GGUF_MODEL_PATH = os.getenv("THORR_GGUF_MODEL_PATH", "models/llama-2-7b-chat.Q4_K_M.gguf")
+
 # --- Templates de Prompt ---
 # Prompt do sistema para a geração de SQL. Mantê-lo aqui limpa o código principal.
 SQL_GENERATION_SYSTEM_PROMPT = """Você é um especialista em SQL. Sua tarefa é converter perguntas em linguagem natural para consultas SQL para um banco de dados SQLite. 
@@ -42,4 +187,22 @@ USE APENAS NOMES DE TABELAS E COLUNAS FORNECIDOS NO ESQUEMA.
 ***REGRAS CRUCIAIS:***
 1.  **NOMES DE COLUNAS/TABELAS:** Os nomes devem ser usados EXATAMENTE como aparecem no esquema fornecido (Ex: use 'cidade_endereço', NÃO 'ciudad_endereço').
 2.  **FILTROS (Valores):** Ao filtrar valores (strings como nome da cidade ou status), SEMPRE converta o valor para **MINÚSCULAS** (Ex: 'porto alegre'), pois os dados no banco são minúsculos.
-3.  As junções (JOIN) devem ser feitas usando as colunas de ID que conectam as tabelas, como 'id_predio' ou 'unidade_id'.""" 
\ No newline at end of file
+3.  As junções (JOIN) devem ser feitas usando as colunas de ID que conectam as tabelas, como 'id_predio' ou 'unidade_id'.
+4.  Quando uma coluna trouxer 'Valores existentes citados na pergunta', filtre usando esses valores EXATAMENTE como aparecem (Ex: 'cyrela goldsztein', não 'cyrela').""" 
+
+# --- Rastreamento (assistant/tracing.py) ---
+# Spans das etapas (intenção, embedding, FAISS, refinamento, prompt, LLM, SQL) em JSON lines ("" desliga)
+TRACE_FILE = os.getenv("THORR_TRACE_FILE", "")
+# Métricas no formato texto do Prometheus, regravadas a cada pergunta ("" desliga)
+TRACE_METRICS_FILE = os.getenv("THORR_METRICS_FILE", "")
+# Inclui o texto completo dos prompts no TRACE_FILE
+TRACE_INCLUDE_PROMPTS = False
+
+# --- Serviço HTTP (assistant/server.py) ---
+SERVER_HOST = os.getenv("THORR_SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("THORR_SERVER_PORT", "8000"))
+# Micro-lotes: até N pedidos por lote, esperando no máximo MAX_WAIT_MS pelo lote encher
+SERVER_MAX_BATCH_SIZE = 8
+SERVER_MAX_WAIT_MS = 20
+# Pedidos aguardando em cada fila; acima disso o serviço responde 429
+SERVER_MAX_QUEUE = 64
@@ -1,9 +1,8 @@
 # assistant/conversation.py
-from .local_llm import generate_local_response # Importe a nova função
+from .local_llm import generate_local_response, stream_local_response # Importe a nova função
 from . import config
 
-def handle_general_conversation(question: str) -> str:
-    system_message = f"""    Você é um assistente virtual amigável e prestativo de uma plataforma de dados do mercado imobiliário.
+SYSTEM_MESSAGE = """    Você é um assistente virtual amigável e prestativo de uma plataforma de dados do mercado imobiliário.
     Seu nome é Thori, o assistente de dados da Thorr.
     Sua missão é ajudar os usuários a entenderem e interagirem com os dados.
     Hoje é 21 de setembro de 2025 e você está operando em Porto Alegre, RS.
@@ -13,9 +12,21 @@ def handle_general_conversation(question: str) -> str:
     2.  **SEJA CONCISO:** Responda de forma clara, direta e educada.
     3.  **ASSUMA A PERSONA:** Aja sempre como o assistente Thori.
     4.  **SEJA HONESTO:** Se a pergunta for sobre algo que você não sabe (como a cotação do dólar ou a previsão do tempo), diga que você não tem acesso a essa informação."""
-    
+
+
+ERROR_MESSAGE = "Desculpe, ocorreu um erro ao tentar processar sua pergunta. Por favor, tente novamente."
+
+def handle_general_conversation(question: str) -> str:
+    try:
+        return generate_local_response(SYSTEM_MESSAGE, question, config.CHAT_MODEL, profile="chat")
+    except Exception as e:
+        print(f"❌ Erro ao gerar resposta de conversação: {e}")
+        return ERROR_MESSAGE
+
+def stream_general_conversation(question: str):
+    """Igual a handle_general_conversation, mas gera a resposta em pedaços (streaming)."""
     try:
-        return generate_local_response(system_message, question, config.CHAT_MODEL)
+        yield from stream_local_response(SYSTEM_MESSAGE, question, config.CHAT_MODEL, profile="chat")
     except Exception as e:
         print(f"❌ Erro ao gerar resposta de conversação: {e}")
-        return "Desculpe, ocorreu um erro ao tentar processar sua pergunta. Por favor, tente novamente."
\ No newline at end of file
+        yield ERROR_MESSAGE
@@ -0,0 +1,305 @@
+# assistant/duckdb_engine.py
+"""
+Motor colunar opcional (DuckDB) para as consultas analíticas.
+
+O SQLite lê linha a linha: agregações sobre o histórico inteiro (units_updates com
+units e buildings) ficam lentas quando o histórico cresce. Com
+config.SQL_ANALYTIC_ENGINE = "duckdb", o execute_query passa cada consulta pelo
+roteador (route_query): agregações sobre tabelas grandes vão para o DuckDB, buscas
+pontuais continuam no SQLite, que as resolve pelos índices.
+
+O DuckDB lê os dados de uma de duas fontes (config.DUCKDB_SOURCE):
+
+- "sqlite":  o database.db anexado pela extensão sqlite do DuckDB (sem cópia; a
+             extensão é baixada na primeira vez se não estiver instalada);
+- "parquet": uma cópia colunar das tabelas em config.DUCKDB_PARQUET_DIR, gravada
+             com pyarrow e refeita quando o arquivo do banco muda.
+
+O SQL gerado é escrito para o SQLite. As diferenças de dialeto que mudariam o
+resultado sem erro são tratadas aqui: LIKE vira ILIKE (no SQLite o LIKE ignora
+maiúsculas), NULLs vêm primeiro no ORDER BY ascendente e por último no descendente
+(como no SQLite; o padrão do DuckDB é NULLs sempre no fim) e consultas com '/'
+(divisão inteira no SQLite) ou GROUP_CONCAT ficam no SQLite. Qualquer outro erro do DuckDB (função ou sintaxe só do SQLite) faz a consulta
+voltar para o SQLite. Os nomes das colunas do resultado são os do SQLite.
+
+O pacote duckdb é opcional: sem ele, ou se o DuckDB não conseguir abrir a fonte,
+tudo roda no SQLite.
+"""
+import json
+import os
+import re
+import threading
+import time
+import pandas as pd
+from . import config
+from .executa_sql import QueryTimeoutError, _fetch_limited, _log_query, get_pool
+from .query_guard import _is_aggregate, get_table_rows, table_aliases
+from .schema_catalog import is_internal_table
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_SQLITE_ONLY = re.compile(r"/|\bgroup_concat\s*\(", re.IGNORECASE)
+_MANIFEST = "_source.json"
+
+_engines = {}
+_engines_lock = threading.Lock()
+_engine_stats = {"duckdb": 0, "sqlite": 0, "fallbacks": 0, "timeouts": 0}
+
+
+def _import_duckdb():
+    try:
+        import duckdb
+        return duckdb
+    except ImportError:
+        return None
+
+
+def _outside_literals(sql: str) -> str:
+    """O SQL sem as strings entre aspas simples (para procurar operadores e funções)."""
+    return _LITERAL.sub("''", sql)
+
+
+def to_duckdb_dialect(sql: str) -> str:
+    """LIKE -> ILIKE fora das strings: o LIKE do SQLite não diferencia maiúsculas (ASCII)."""
+    parts, last = [], 0
+    for match in _LITERAL.finditer(sql):
+        parts.append(re.sub(r"\blike\b", "ILIKE", sql[last:match.start()], flags=re.IGNORECASE))
+        parts.append(match.group(0))
+        last = match.end()
+    parts.append(re.sub(r"\blike\b", "ILIKE", sql[last:], flags=re.IGNORECASE))
+    return "".join(parts)
+
+
+def _source_id(db_file: str):
+    """Identifica a versão do arquivo do banco (o setup_database troca o arquivo inteiro)."""
+    try:
+        st = os.stat(db_file)
+        return [st.st_ino, st.st_mtime_ns, st.st_size]
+    except OSError:
+        return None
+
+
+def _export_table(conn, table: str, path: str, chunk_rows: int = 100000):
+    """
+    Copia a tabela para um arquivo Parquet em blocos lidos do SQLite. O tipo de cada
+    coluna vem dos valores gravados (tipagem dinâmica do SQLite; colunas de tabelas
+    criadas com CREATE TABLE AS nem têm tipo declarado): texto se houver algum texto,
+    senão real se houver algum real, senão inteiro.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    names = [r[1] for r in conn.execute(f'PRAGMA table_info("{table}")')]
+    checks = ", ".join(f"""MAX(typeof("{n}") IN ('text', 'blob')), MAX(typeof("{n}") = 'real')""" for n in names)
+    flags = conn.execute(f'SELECT {checks} FROM "{table}"').fetchone()
+    types = [pa.string() if flags[2 * i] else pa.float64() if flags[2 * i + 1] else pa.int64()
+             for i in range(len(names))]
+    schema = pa.schema(list(zip(names, types)))
+    select = ", ".join(f'CAST("{n}" AS TEXT)' if t == pa.string() else f'"{n}"' for n, t in zip(names, types))
+
+    cursor = conn.execute(f'SELECT {select} FROM "{table}"')
+    with pq.ParquetWriter(path, schema) as writer:
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(col, type=t) for col, t in zip(zip(*rows), types)], schema=schema))
+    cursor.close()
+
+
+def export_parquet(db_file: str = None, parquet_dir: str = None, force: bool = False) -> bool:
+    """
+    Exporta as tabelas do banco para Parquet (um arquivo por tabela, com pyarrow).
+    Não faz nada se a cópia já corresponde ao arquivo atual do banco, a menos que 'force'.
+    Retorna True se exportou.
+    """
+    db_file = db_file or config.DB_FILE
+    parquet_dir = parquet_dir or config.DUCKDB_PARQUET_DIR
+    manifest_path = os.path.join(parquet_dir, _MANIFEST)
+    source_id = _source_id(db_file)
+    if not force and os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            if json.load(f).get("source_id") == source_id:
+                return False
+
+    start = time.perf_counter()
+    os.makedirs(parquet_dir, exist_ok=True)
+    with get_pool(db_file).connection() as conn:
+        conn.set_progress_handler(None, 0)
+        tables = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
+                  if not is_internal_table(r[0])]
+        for table in tables:
+            # Grava num arquivo temporário: quem está lendo a cópia antiga não vê um arquivo pela metade
+            path = os.path.join(parquet_dir, f"{table}.parquet")
+            _export_table(conn, table, path + ".tmp")
+            os.replace(path + ".tmp", path)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump({"source_id": source_id, "tables": tables, "exported_at": time.time()}, f)
+    print(f"✅ {len(tables)} tabelas exportadas para Parquet em '{parquet_dir}' "
+          f"({time.perf_counter() - start:.1f}s).")
+    return True
+
+
+class DuckDBEngine:
+    """
+    Conexão DuckDB em memória sobre o banco (anexado ou exportado para Parquet).
+    Cada consulta usa um cursor próprio, então a mesma instância serve várias
+    threads. Quando o arquivo do banco muda, a conexão é refeita na próxima consulta.
+    """
+
+    def __init__(self, db_file: str = None, source: str = None, parquet_dir: str = None):
+        self.db_file = db_file or config.DB_FILE
+        self.source = source or config.DUCKDB_SOURCE
+        self.parquet_dir = parquet_dir or config.DUCKDB_PARQUET_DIR
+        self._duckdb = _import_duckdb()
+        self._con = None
+        self._source_id = None
+        self._lock = threading.Lock()
+        self.error = None
+
+    @property
+    def available(self) -> bool:
+        return self._duckdb is not None and self.error is None
+
+    def _connect(self):
+        con = self._duckdb.connect()
+        # Ordem dos NULLs do SQLite: com ORDER BY ... LIMIT, a ordem padrão do DuckDB devolveria outras linhas
+        con.execute("SET default_null_order = 'nulls_first_on_asc_last_on_desc'")
+        if config.DUCKDB_THREADS:
+            con.execute(f"SET threads TO {int(config.DUCKDB_THREADS)}")
+        if self.source == "parquet":
+            export_parquet(self.db_file, self.parquet_dir)
+            with open(os.path.join(self.parquet_dir, _MANIFEST), encoding="utf-8") as f:
+                tables = json.load(f)["tables"]
+            for table in tables:
+                path = os.path.join(self.parquet_dir, f"{table}.parquet")
+                con.execute(f'CREATE VIEW "{table}" AS SELECT * FROM read_parquet(\'{path}\')')
+        else:
+            con.execute("INSTALL sqlite")
+            con.execute("LOAD sqlite")
+            con.execute(f"ATTACH '{os.path.abspath(self.db_file)}' AS thorr (TYPE sqlite, READ_ONLY)")
+            con.execute("USE thorr")
+        return con
+
+    def _cursor(self):
+        with self._lock:
+            source_id = _source_id(self.db_file)
+            if self._con is None or source_id != self._source_id:
+                if self._con is not None:
+                    print(f"DEBUG - Banco '{self.db_file}' mudou; reabrindo o DuckDB ({self.source}).")
+                    self._con.close()
+                    self._con = None
+                try:
+                    self._con = self._connect()
+                except Exception as e:
+                    # Sem a fonte (ex.: extensão sqlite indisponível offline) o motor fica desligado
+                    self.error = str(e).splitlines()[0]
+                    print(f"⚠️ DuckDB indisponível ({self.error}); as consultas seguem no SQLite.")
+                    raise
+                self._source_id = source_id
+            return self._con.cursor()
+
+    def execute(self, sql_query: str, timeout: float = None, max_rows: int = None,
+                max_result_mb: float = None) -> pd.DataFrame:
+        """
+        Executa a consulta (já no dialeto do DuckDB) com os mesmos limites de tempo, de
+        linhas e de memória do executa_sql.run_query. Erros do DuckDB são repassados.
+        """
+        timeout = config.SQL_TIMEOUT_SECONDS if timeout is None else timeout
+        max_rows = config.SQL_MAX_ROWS if max_rows is None else max_rows
+        max_bytes = (config.SQL_MAX_RESULT_MB if max_result_mb is None else max_result_mb) * 1024 * 1024
+
+        start_time = time.perf_counter()
+        cursor = self._cursor()
+        timer = threading.Timer(timeout, cursor.interrupt)
+        timer.start()
+        try:
+            cursor.execute(sql_query)
+            frames, columns, reason = _fetch_limited(cursor, max_rows, max_bytes)
+        except self._duckdb.InterruptException:
+            raise QueryTimeoutError(f"consulta interrompida após {timeout:.0f}s") from None
+        finally:
+            timer.cancel()
+            cursor.close()
+
+        result_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+        if reason is not None:
+            result_df = result_df.iloc[:max_rows]
+            print(f"⚠️ Resultado truncado em {len(result_df)} linhas ({reason}).")
+        result_df.attrs.update(truncated=reason is not None, truncated_reason=reason,
+                               duration=time.perf_counter() - start_time, engine="duckdb")
+        return result_df
+
+
+def get_engine(db_file: str = None) -> DuckDBEngine:
+    db_file = db_file or config.DB_FILE
+    with _engines_lock:
+        if db_file not in _engines:
+            _engines[db_file] = DuckDBEngine(db_file)
+        return _engines[db_file]
+
+
+def route_query(sql_query: str, db_file: str = None) -> str:
+    """
+    "duckdb" para agregações (funções de agregação ou GROUP BY) sobre tabelas que somam
+    pelo menos config.SQL_ANALYTIC_MIN_ROWS linhas e sem construções cujo resultado
+    muda entre os dialetos; "sqlite" para o resto (buscas pontuais, consultas pequenas).
+    """
+    if config.SQL_ANALYTIC_ENGINE != "duckdb" or not get_engine(db_file).available:
+        return "sqlite"
+    code = _outside_literals(sql_query)
+    choice = "sqlite"
+    if _is_aggregate(code) and not _SQLITE_ONLY.search(code):
+        row_counts = get_table_rows(db_file)
+        rows = sum(row_counts.get(t, 0) for t in set(table_aliases(code).values()))
+        if rows >= config.SQL_ANALYTIC_MIN_ROWS:
+            choice = "duckdb"
+    if choice == "sqlite":
+        _engine_stats["sqlite"] += 1
+    return choice
+
+
+def _sqlite_column_names(sql_query: str, db_file: str = None) -> list:
+    """Nomes das colunas que o SQLite daria ao resultado (LIMIT 0: nada é calculado)."""
+    try:
+        with get_pool(db_file).connection() as conn:
+            cursor = conn.execute(f"SELECT * FROM ({sql_query.strip().rstrip(';')}) LIMIT 0")
+            names = [d[0] for d in cursor.description]
+            cursor.close()
+        return names
+    except Exception:
+        return []
+
+
+def run_analytic(sql_query: str, db_file: str = None, log: bool = False):
+    """
+    Executa a consulta no DuckDB. Retorna o DataFrame, ou None se o DuckDB não aceitou
+    a consulta (dialeto): nesse caso quem chamou executa no SQLite.
+    """
+    engine = get_engine(db_file)
+    start_time = time.perf_counter()
+    try:
+        result_df = engine.execute(to_duckdb_dialect(sql_query))
+    except QueryTimeoutError:
+        _engine_stats["timeouts"] += 1
+        raise
+    except Exception as e:
+        if engine.error is None and not isinstance(e, engine._duckdb.Error):
+            raise
+        _engine_stats["fallbacks"] += 1
+        print(f"DEBUG - DuckDB recusou a consulta ({type(e).__name__}: {str(e).splitlines()[0]}); usando o SQLite.")
+        return None
+    _engine_stats["duckdb"] += 1
+
+    names = _sqlite_column_names(sql_query, db_file)
+    if len(names) == len(result_df.columns):
+        result_df.columns = names
+    if log:
+        _log_query({"ts": time.time(), "sql": sql_query, "plan": None, "rows": len(result_df), "error": None,
+                    "engine": "duckdb", "duration_ms": 1000 * (time.perf_counter() - start_time)})
+    return result_df
+
+
+def get_engine_stats() -> dict:
+    """Consultas executadas no DuckDB, roteadas para o SQLite e devolvidas ao SQLite por erro."""
+    return dict(_engine_stats, engine=config.SQL_ANALYTIC_ENGINE, source=config.DUCKDB_SOURCE,
+                available=_import_duckdb() is not None)
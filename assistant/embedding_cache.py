@@ -0,0 +1,128 @@
+# assistant/embedding_cache.py
+import hashlib
+import json
+import os
+import numpy as np
+from .embeddings import new_index
+
+# Arquivo com a impressão digital (fingerprint) atual de cada tabela e de cada índice
+MANIFEST_FILE = "manifest.json"
+
+
+def fingerprint(*parts) -> str:
+    """Gera um hash estável (sha256) para qualquer combinação de valores serializáveis."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(json.dumps(part, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def _read_manifest(cache_dir: str) -> dict:
+    path = os.path.join(cache_dir, MANIFEST_FILE)
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"tables": {}, "indexes": {}}
+
+
+def _write_manifest(cache_dir: str, manifest: dict):
+    # Escrita atômica: outro processo (deploy em paralelo) nunca lê um manifesto pela metade
+    path = os.path.join(cache_dir, MANIFEST_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _save_npy(path: str, array: np.ndarray):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def encode_with_cache(texts_by_table: dict, model, model_name: str, cache_dir: str):
+    """
+    Retorna os embeddings de cada tabela ({nome: matriz}) e seus fingerprints.
+
+    O fingerprint de uma tabela cobre o nome do modelo e todos os seus textos (descrição
+    de BASE_TEXTS, lista de colunas e valores de exemplo), então apenas as tabelas que
+    mudaram são re-encodadas. As matrizes em cache são abertas via memory map.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest = _read_manifest(cache_dir)
+    cached_tables = manifest.setdefault("tables", {})
+
+    embeddings, fingerprints, to_encode = {}, {}, {}
+    for name, texts in texts_by_table.items():
+        fp = fingerprint(model_name, name, texts)
+        fingerprints[name] = fp
+        path = os.path.join(cache_dir, f"{name}-{fp[:16]}.npy")
+        if cached_tables.get(name) == fp and os.path.exists(path):
+            embeddings[name] = np.load(path, mmap_mode="r")
+        else:
+            to_encode[name] = (fp, path, texts)
+
+    if to_encode:
+        print(f"Gerando embeddings para {len(to_encode)} tabela(s) sem cache: {list(to_encode.keys())}")
+        all_texts = [text for _, _, texts in to_encode.values() for text in texts]
+        encoded = np.asarray(model.encode(all_texts), dtype="float32")
+
+        offset = 0
+        for name, (fp, path, texts) in to_encode.items():
+            _save_npy(path, encoded[offset:offset + len(texts)])
+            offset += len(texts)
+
+            old_fp = cached_tables.get(name)
+            if old_fp and old_fp != fp:
+                _remove_quietly(os.path.join(cache_dir, f"{name}-{old_fp[:16]}.npy"))
+            cached_tables[name] = fp
+            embeddings[name] = np.load(path, mmap_mode="r")
+
+        _write_manifest(cache_dir, manifest)
+    else:
+        print(f"Embeddings das tabelas carregados do cache '{cache_dir}'.")
+
+    return embeddings, fingerprints
+
+
+def load_or_build_index(kind: str, vectors: np.ndarray, fp: str, cache_dir: str):
+    """
+    Carrega o índice FAISS 'kind' do cache quando o fingerprint bate; caso contrário,
+    constrói o índice a partir de 'vectors' e o serializa para os próximos starts.
+    """
+    import faiss
+
+    manifest = _read_manifest(cache_dir)
+    indexes = manifest.setdefault("indexes", {})
+    path = os.path.join(cache_dir, f"{kind}-{fp[:16]}.faiss")
+
+    if indexes.get(kind) == fp and os.path.exists(path):
+        try:
+            return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            # Nem todo tipo de índice suporta memory map; lê normalmente nesse caso
+            return faiss.read_index(path)
+
+    index = new_index(vectors.shape[1])
+    index.add(np.ascontiguousarray(vectors, dtype="float32"))
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+    old_fp = indexes.get(kind)
+    if old_fp and old_fp != fp:
+        _remove_quietly(os.path.join(cache_dir, f"{kind}-{old_fp[:16]}.faiss"))
+    indexes[kind] = fp
+    _write_manifest(cache_dir, manifest)
+    return index
@@ -0,0 +1,177 @@
+# assistant/embeddings.py
+"""
+Backends do modelo de embeddings (config.EMBEDDING_BACKEND):
+
+- "sentence-transformers": o modelo original (config.EMBEDDING_MODEL) em PyTorch;
+- "onnx-int8": o mesmo modelo exportado para ONNX com pesos quantizados em int8,
+  executado no ONNX Runtime (menos memória e encode mais rápido em CPU).
+
+Os dois passam pelo EmbeddingModel, que mantém a interface .encode do
+SentenceTransformer e aplica o truncamento de dimensões (config.EMBEDDING_DIMENSIONS)
+e a normalização L2 (config.EMBEDDING_NORMALIZE). Com vetores normalizados, o
+produto interno é a similaridade de cosseno e os índices FAISS usam IndexFlatIP.
+
+Exportação do modelo ONNX (uma vez, precisa de torch, transformers e onnxruntime):
+    python -m assistant.embeddings export [--output models/e5-large-onnx-int8]
+"""
+import argparse
+import os
+import shutil
+import numpy as np
+from . import config
+
+BACKENDS = ["sentence-transformers", "onnx-int8"]
+# Arquivo do modelo quantizado dentro de config.EMBEDDING_ONNX_DIR
+ONNX_MODEL_FILE = "model.onnx"
+
+
+class OnnxEncoder:
+    """Encoder e5 no ONNX Runtime: tokenização, modelo int8 e mean pooling pela máscara de atenção."""
+
+    def __init__(self, model_dir: str, max_length: int = 512):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length)
+        self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id("<pad>") or 0)
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(os.path.join(model_dir, ONNX_MODEL_FILE), options,
+                                                    providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts, batch_size: int = 32, **kwargs) -> np.ndarray:
+        outputs = []
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(list(texts[start:start + batch_size]))
+            input_ids = np.array([e.ids for e in encodings], dtype="int64")
+            attention_mask = np.array([e.attention_mask for e in encodings], dtype="int64")
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+            hidden = self.session.run(None, feeds)[0]
+            # Mean pooling (o mesmo do sentence-transformers para o e5): média dos tokens reais
+            mask = attention_mask[:, :, None].astype("float32")
+            outputs.append((hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9))
+        return np.vstack(outputs).astype("float32") if outputs else np.zeros((0, 0), dtype="float32")
+
+
+class EmbeddingModel:
+    """
+    Envolve o encoder do backend: trunca os vetores para 'dimensions' (0 = todas) e,
+    com 'normalize', os normaliza (L2) depois do truncamento.
+    """
+
+    def __init__(self, encoder, backend: str, dimensions: int = 0, normalize: bool = True, name: str = None):
+        self.encoder = encoder
+        self.name = name or config.EMBEDDING_MODEL
+        self.backend = backend
+        self.dimensions = dimensions
+        self.normalize = normalize
+
+    def encode(self, texts, batch_size: int = 32, **kwargs) -> np.ndarray:
+        embeddings = np.asarray(self.encoder.encode(texts, batch_size=batch_size), dtype="float32")
+        if self.dimensions:
+            embeddings = embeddings[:, :self.dimensions]
+        if self.normalize:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.maximum(norms, 1e-12)
+        return np.ascontiguousarray(embeddings)
+
+
+def model_id(model) -> str:
+    """
+    Identifica o modelo carregado (nome, backend que de fato subiu, dimensões e
+    normalização) e a métrica dos índices: entra nos fingerprints dos caches que
+    guardam vetores. Modelos fora do EmbeddingModel (ex.: o HashingEmbedder dos
+    benchmarks) são identificados pela classe.
+    """
+    name = getattr(model, "name", type(model).__name__)
+    backend = getattr(model, "backend", type(model).__name__)
+    dimensions = getattr(model, "dimensions", 0) or "full"
+    normalized = "norm" if getattr(model, "normalize", False) else "raw"
+    metric = "ip" if config.EMBEDDING_NORMALIZE else "l2"
+    return f"{name}|{backend}|dim={dimensions}|{normalized}|{metric}"
+
+
+def new_index(dimension: int):
+    """Índice FAISS exato da métrica configurada: produto interno para vetores normalizados, L2 caso contrário."""
+    import faiss
+    return faiss.IndexFlatIP(dimension) if config.EMBEDDING_NORMALIZE else faiss.IndexFlatL2(dimension)
+
+
+def similarity(distances: np.ndarray) -> np.ndarray:
+    """Converte o retorno de index.search em relevância (maior = mais parecido) nas duas métricas."""
+    return distances if config.EMBEDDING_NORMALIZE else -distances
+
+
+def load_embedding_model(model_name: str = None, backend: str = None) -> EmbeddingModel:
+    """
+    Carrega o modelo de embeddings do backend configurado (as bibliotecas de cada
+    backend só são importadas aqui). Sem o modelo ONNX exportado ou sem o
+    onnxruntime, volta para o sentence-transformers.
+    """
+    backend = backend or config.EMBEDDING_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de embeddings desconhecido: '{backend}'. Opções: {BACKENDS}")
+
+    encoder = None
+    if backend == "onnx-int8":
+        model_path = os.path.join(config.EMBEDDING_ONNX_DIR, ONNX_MODEL_FILE)
+        if not os.path.exists(model_path):
+            print(f"⚠️ Modelo ONNX não encontrado em '{model_path}' (rode: python -m assistant.embeddings export). "
+                  "Usando sentence-transformers.")
+        else:
+            try:
+                encoder = OnnxEncoder(config.EMBEDDING_ONNX_DIR)
+            except ImportError as e:
+                print(f"⚠️ onnxruntime/tokenizers indisponíveis ({e}). Usando sentence-transformers.")
+    if encoder is None:
+        from sentence_transformers import SentenceTransformer
+        backend, encoder = "sentence-transformers", SentenceTransformer(model_name or config.EMBEDDING_MODEL)
+    return EmbeddingModel(encoder, backend, config.EMBEDDING_DIMENSIONS, config.EMBEDDING_NORMALIZE, model_name)
+
+
+def export_onnx(model_name: str = None, output_dir: str = None):
+    """Exporta config.EMBEDDING_MODEL para ONNX e quantiza os pesos em int8 (quantização dinâmica)."""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    model_name = model_name or config.EMBEDDING_MODEL
+    output_dir = output_dir or config.EMBEDDING_ONNX_DIR
+    fp32_dir = os.path.join(output_dir, "fp32")
+    os.makedirs(fp32_dir, exist_ok=True)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    sample = tokenizer(["query: exemplo de pergunta"], return_tensors="pt")
+    fp32_path = os.path.join(fp32_dir, ONNX_MODEL_FILE)
+    print(f"Exportando '{model_name}' para ONNX...")
+    with torch.no_grad():
+        torch.onnx.export(
+            model, (sample["input_ids"], sample["attention_mask"]), fp32_path,
+            input_names=["input_ids", "attention_mask"], output_names=["last_hidden_state"],
+            dynamic_axes={name: {0: "batch", 1: "sequence"} for name in ["input_ids", "attention_mask", "last_hidden_state"]},
+            opset_version=17,
+        )
+
+    print("Quantizando os pesos em int8...")
+    quantize_dynamic(fp32_path, os.path.join(output_dir, ONNX_MODEL_FILE), weight_type=QuantType.QInt8)
+    shutil.rmtree(fp32_dir)  # O modelo fp32 (pesos em arquivos externos, >2 GB) só serve para a quantização
+    tokenizer.save_pretrained(output_dir)
+    print(f"✅ Modelo ONNX int8 salvo em '{output_dir}'.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("--model", default=config.EMBEDDING_MODEL)
+    parser.add_argument("--output", default=config.EMBEDDING_ONNX_DIR)
+    args = parser.parse_args()
+    export_onnx(args.model, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,456 @@
 # assistant/executa_sql.py
+import json
+import os
+import queue
 import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
 import pandas as pd
-from . import config
+from . import config, tracing
 
-def execute_query(sql_query: str):
-    """Executa uma query SQL no banco de dados e retorna o resultado como DataFrame."""
-    try:
-        conn = sqlite3.connect(config.DB_FILE)
-        result_df = pd.read_sql_query(sql_query, conn)
+# Instruções da VM do SQLite entre duas checagens do tempo limite
+_PROGRESS_INTERVAL = 10000
+# Linhas lidas por vez do cursor (checagem do limite de linhas e de memória)
+_FETCH_SIZE = 1000
+
+
+class QueryTimeoutError(Exception):
+    """A consulta passou de config.SQL_TIMEOUT_SECONDS e foi interrompida."""
+
+
+class ConnectionPool:
+    """
+    Conexões somente leitura (URI 'mode=ro') reaproveitadas entre consultas.
+
+    Cada conexão guarda seus statements preparados ('cached_statements') e pode ser
+    usada por qualquer thread (check_same_thread=False), mas apenas por uma de cada
+    vez: quem pega uma conexão do pool a devolve ao final. Em modo somente leitura as
+    consultas nunca escrevem e, num banco em WAL, não bloqueiam o processo que grava.
+    Quando o arquivo do banco é substituído (setup_database.py troca o arquivo inteiro),
+    as conexões abertas no arquivo antigo são fechadas e reabertas no novo, e as funções
+    registradas com add_reload_listener são chamadas (ex.: o cache SQL confere o esquema).
+    """
+
+    def __init__(self, db_file: str, size: int = config.SQL_POOL_SIZE,
+                 statement_cache: int = config.SQL_STATEMENT_CACHE):
+        self.db_file = db_file
+        self.size = size
+        self.statement_cache = statement_cache
+        self.stats = {"connections": 0, "acquired": 0, "waits": 0, "wait_seconds": 0.0, "reloads": 0}
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._file_id = None
+        self._conn_file_ids = {}
+        self._reload_listeners = []
+
+    def _current_file_id(self):
+        try:
+            return os.stat(self.db_file).st_ino
+        except OSError:
+            return None
+
+    def _connect(self) -> sqlite3.Connection:
+        uri = f"file:{os.path.abspath(self.db_file)}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=self.statement_cache)
+        conn.execute("PRAGMA query_only = ON")
+        self.stats["connections"] += 1
+        self._conn_file_ids[conn] = self._file_id
+        return conn
+
+    def _close(self, conn: sqlite3.Connection):
+        self._conn_file_ids.pop(conn, None)
+        self.stats["connections"] -= 1
         conn.close()
-        return result_df
+
+    def add_reload_listener(self, callback):
+        """Registra callback(db_file), chamado depois que o arquivo do banco é substituído."""
+        self._reload_listeners.append(callback)
+
+    def _check_file(self) -> bool:
+        """
+        Fecha as conexões ociosas se o arquivo do banco foi trocado (chamar com o lock).
+        Retorna True quando houve troca de um arquivo já aberto antes.
+        """
+        file_id = self._current_file_id()
+        if file_id == self._file_id:
+            return False
+        replaced = self._file_id is not None
+        if replaced:
+            self.stats["reloads"] += 1
+            print(f"DEBUG - Banco '{self.db_file}' foi substituído; reabrindo conexões.")
+        self._file_id = file_id
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        return replaced
+
+    @contextmanager
+    def connection(self, timeout: float = None):
+        """Empresta uma conexão; cria uma nova enquanto o pool não atingiu 'size'."""
+        conn = None
+        with self._lock:
+            replaced = self._check_file()
+        if replaced:
+            # Fora do lock: os listeners podem consultar o banco novo
+            for callback in list(self._reload_listeners):
+                try:
+                    callback(self.db_file)
+                except Exception as e:
+                    print(f"⚠️ Falha ao reagir à troca do banco '{self.db_file}': {e}")
+        with self._lock:
+            self.stats["acquired"] += 1
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                if self.stats["connections"] < self.size:
+                    conn = self._connect()
+        if conn is None:
+            start = time.perf_counter()
+            self.stats["waits"] += 1
+            try:
+                conn = self._idle.get(timeout=timeout)
+            except queue.Empty:
+                raise QueryTimeoutError("nenhuma conexão livre no pool") from None
+            finally:
+                self.stats["wait_seconds"] += time.perf_counter() - start
+        try:
+            yield conn
+        finally:
+            conn.set_progress_handler(None, 0)
+            with self._lock:
+                if self._conn_file_ids.get(conn) != self._file_id:
+                    # Conexão do arquivo antigo: troca por uma no arquivo atual
+                    self._close(conn)
+                    conn = self._connect()
+            self._idle.put(conn)
+
+    def report(self) -> dict:
+        return dict(self.stats, size=self.size, idle=self._idle.qsize())
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_query_stats = {"queries": 0, "errors": 0, "timeouts": 0, "truncated": 0}
+_query_durations = deque(maxlen=1000)
+# Tempo até o primeiro bloco de linhas das consultas lidas em blocos (iter_query)
+_first_row_durations = deque(maxlen=1000)
+_log_lock = threading.Lock()
+
+
+def get_pool(db_file: str = None) -> ConnectionPool:
+    db_file = db_file or config.DB_FILE
+    with _pools_lock:
+        if db_file not in _pools:
+            _pools[db_file] = ConnectionPool(db_file)
+        return _pools[db_file]
+
+
+def _fetch_limited(cursor, max_rows: int, max_bytes: int):
+    """Lê o resultado em blocos até acabar ou até estourar o limite de linhas ou de memória."""
+    columns = [d[0] for d in cursor.description]
+    frames, rows_read, bytes_read = [], 0, 0
+    while True:
+        rows = cursor.fetchmany(min(_FETCH_SIZE, max_rows + 1 - rows_read))
+        if not rows:
+            return frames, columns, None
+        frame = pd.DataFrame.from_records(rows, columns=columns)
+        rows_read += len(frame)
+        bytes_read += int(frame.memory_usage(deep=True).sum())
+        frames.append(frame)
+        if rows_read > max_rows:
+            return frames, columns, "max_rows"
+        if bytes_read > max_bytes:
+            return frames, columns, "max_memory"
+
+
+def _log_query(entry: dict):
+    """Acrescenta uma linha ao log de consultas (config.SQL_QUERY_LOG)."""
+    if not config.SQL_QUERY_LOG:
+        return
+    try:
+        os.makedirs(os.path.dirname(config.SQL_QUERY_LOG) or ".", exist_ok=True)
+        with _log_lock, open(config.SQL_QUERY_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"⚠️ Não foi possível gravar o log de consultas: {e}")
+
+
+def run_query(sql_query: str, params=(), timeout: float = None, max_rows: int = None,
+              max_result_mb: float = None, db_file: str = None, log: bool = False) -> pd.DataFrame:
+    """
+    Executa uma consulta somente leitura pelo pool e retorna um DataFrame.
+
+    A consulta é interrompida (QueryTimeoutError) se passar de 'timeout' segundos e
+    o resultado é cortado em 'max_rows' linhas ou 'max_result_mb' MB. O DataFrame
+    traz em .attrs: 'truncated' (bool), 'truncated_reason', 'duration' (segundos) e
+    'engine' ("sqlite").
+    Os padrões vêm de config.SQL_TIMEOUT_SECONDS, SQL_MAX_ROWS e SQL_MAX_RESULT_MB.
+    Com 'log', a consulta, o plano (EXPLAIN QUERY PLAN) e a duração vão para o log de
+    consultas usado pelo index_advisor.py.
+    """
+    timeout = config.SQL_TIMEOUT_SECONDS if timeout is None else timeout
+    max_rows = config.SQL_MAX_ROWS if max_rows is None else max_rows
+    max_bytes = (config.SQL_MAX_RESULT_MB if max_result_mb is None else max_result_mb) * 1024 * 1024
+
+    start_time = time.perf_counter()
+    _query_stats["queries"] += 1
+    entry = {"ts": time.time(), "sql": sql_query, "plan": None, "rows": None, "error": None}
+    try:
+        with get_pool(db_file).connection(timeout=timeout) as conn:
+            if log:
+                entry["plan"] = [r[3] for r in conn.execute(f"EXPLAIN QUERY PLAN {sql_query}", params)]
+            deadline = start_time + timeout
+            conn.set_progress_handler(lambda: time.perf_counter() > deadline, _PROGRESS_INTERVAL)
+            try:
+                cursor = conn.execute(sql_query, params)
+                if cursor.description is None:
+                    frames, columns, reason = [], [], None
+                else:
+                    frames, columns, reason = _fetch_limited(cursor, max_rows, max_bytes)
+                cursor.close()
+            except sqlite3.OperationalError as e:
+                if "interrupted" in str(e):
+                    _query_stats["timeouts"] += 1
+                    raise QueryTimeoutError(f"consulta interrompida após {timeout:.0f}s") from None
+                raise
+    except Exception as e:
+        _query_stats["errors"] += 1
+        entry["error"] = str(e)
+        raise
+    finally:
+        _query_durations.append(time.perf_counter() - start_time)
+        if log:
+            entry["duration_ms"] = 1000 * (time.perf_counter() - start_time)
+            if entry["error"] is None:
+                entry["rows"] = sum(len(f) for f in frames)
+            _log_query(entry)
+
+    result_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+    if reason is not None:
+        _query_stats["truncated"] += 1
+        result_df = result_df.iloc[:max_rows]
+        print(f"⚠️ Resultado truncado em {len(result_df)} linhas ({reason}).")
+    result_df.attrs.update(truncated=reason is not None, truncated_reason=reason,
+                           duration=time.perf_counter() - start_time, engine="sqlite")
+    return result_df
+
+
+def iter_query(sql_query: str, params=(), chunk_size: int = _FETCH_SIZE, timeout: float = None,
+               db_file: str = None, arrow: bool = False, log: bool = False):
+    """
+    Executa a consulta e entrega o resultado em blocos de até 'chunk_size' linhas
+    (DataFrames ou, com 'arrow', pyarrow.RecordBatch), lidos do cursor com fetchmany:
+    só um bloco fica na memória por vez. Um resultado vazio gera um único bloco vazio,
+    com as colunas. O 'timeout' vale para a leitura de cada bloco, e a conexão fica
+    emprestada do pool até o gerador terminar ou ser fechado (close()).
+    """
+    timeout = config.SQL_TIMEOUT_SECONDS if timeout is None else timeout
+    start_time = time.perf_counter()
+    _query_stats["queries"] += 1
+    entry = {"ts": time.time(), "sql": sql_query, "plan": None, "rows": 0, "error": None}
+    to_batch = None
+    if arrow:
+        import pyarrow as pa
+        to_batch = lambda frame: pa.RecordBatch.from_pandas(frame, preserve_index=False)
+    try:
+        with get_pool(db_file).connection(timeout=timeout) as conn:
+            if log:
+                entry["plan"] = [r[3] for r in conn.execute(f"EXPLAIN QUERY PLAN {sql_query}", params)]
+            deadline = [start_time + timeout]
+            conn.set_progress_handler(lambda: time.perf_counter() > deadline[0], _PROGRESS_INTERVAL)
+            cursor = conn.execute(sql_query, params)
+            try:
+                columns = [d[0] for d in cursor.description or ()]
+                while True:
+                    deadline[0] = time.perf_counter() + timeout
+                    rows = cursor.fetchmany(chunk_size)
+                    if entry["rows"] == 0:
+                        _first_row_durations.append(time.perf_counter() - start_time)
+                    if not rows and entry["rows"] > 0:
+                        break
+                    entry["rows"] += len(rows)
+                    frame = pd.DataFrame.from_records(rows, columns=columns)
+                    yield to_batch(frame) if to_batch else frame
+                    if len(rows) < chunk_size:
+                        break
+            finally:
+                cursor.close()
+    except sqlite3.OperationalError as e:
+        _query_stats["errors"] += 1
+        entry["error"] = str(e)
+        if "interrupted" in str(e):
+            _query_stats["timeouts"] += 1
+            raise QueryTimeoutError(f"consulta interrompida após {timeout:.0f}s") from None
+        raise
+    except Exception as e:
+        _query_stats["errors"] += 1
+        entry["error"] = str(e)
+        raise
+    finally:
+        _query_durations.append(time.perf_counter() - start_time)
+        if log:
+            entry["duration_ms"] = 1000 * (time.perf_counter() - start_time)
+            _log_query(entry)
+
+
+def _prepare_query(sql_query: str, guard: bool):
+    """Passa a consulta pelo query_guard. Retorna (sql, None) ou (None, mensagem de recusa)."""
+    if guard:
+        from .query_guard import check_query
+        decision = check_query(sql_query)
+        if decision["action"] == "reject":
+            return None, f"Consulta recusada pelo guarda de custo: {decision['reason']}"
+        sql_query = decision["sql"]
+    return sql_query, None
+
+
+def _run_analytic(sql_query: str):
+    """Resultado do motor DuckDB, se ativo e se o roteador escolheu ele; senão None."""
+    if config.SQL_ANALYTIC_ENGINE != "duckdb":
+        return None
+    from .duckdb_engine import route_query, run_analytic
+    if route_query(sql_query) == "duckdb":
+        return run_analytic(sql_query, log=True)
+    return None
+
+
+def execute_query(sql_query: str, guard: bool = config.SQL_GUARD_ENABLED):
+    """
+    Executa uma query SQL no banco de dados e retorna o resultado como DataFrame.
+    Com 'guard', a consulta passa antes pelo query_guard: pode ganhar um LIMIT ou ser
+    recusada (a recusa volta como mensagem de erro, com o motivo). Com
+    config.SQL_ANALYTIC_ENGINE = "duckdb", as agregações pesadas rodam no DuckDB
+    (assistant/duckdb_engine.py) e voltam para o SQLite se o DuckDB não as aceitar.
+    """
+    with tracing.span("sql.execute") as span:
+        try:
+            sql_query, rejection = _prepare_query(sql_query, guard)
+            if rejection:
+                span.set(rejected=rejection)
+                return rejection
+            result_df = _run_analytic(sql_query)
+            if result_df is None:
+                result_df = run_query(sql_query, log=True)
+            span.set(engine=result_df.attrs.get("engine"), rows=len(result_df))
+            return result_df
+        except Exception as e:
+            # Retorna a mensagem de erro como uma string para ser impressa no console
+            span.set(failed=str(e))
+            return f"Erro ao executar a query: {e}"
+
+
+class QueryPager:
+    """
+    Resultado lido página a página: 'fetch_page' traz as próximas 'page_size' linhas
+    do cursor, sem guardar as páginas anteriores. Mede separadamente o tempo até a
+    primeira página e o tempo até o fim do resultado. Feche com 'close' se o
+    resultado não for lido até o fim: a conexão só volta ao pool quando ele acaba.
+    """
+
+    def __init__(self, sql_query: str, page_size: int = None, params=(), db_file: str = None, chunks=None):
+        self.sql = sql_query
+        self.page_size = page_size or config.SQL_PAGE_SIZE
+        self._chunks = chunks if chunks is not None else iter_query(sql_query, params, chunk_size=self.page_size,
+                                                                     db_file=db_file, log=True)
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.columns = None
+        self.rows = 0
+        self.done = False
+        self.first_page_seconds = None
+        self.total_seconds = None
+        self.last_used = time.time()
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, sql_query: str = "", page_size: int = None):
+        """Pagina um resultado já calculado (ex.: uma agregação executada no DuckDB)."""
+        page_size = page_size or config.SQL_PAGE_SIZE
+        chunks = (df.iloc[i:i + page_size] for i in range(0, max(len(df), 1), page_size))
+        return cls(sql_query, page_size, chunks=chunks)
+
+    def fetch_page(self) -> pd.DataFrame:
+        """Próxima página (DataFrame com o índice contínuo entre páginas), ou None se acabou."""
+        with self._lock:
+            self.last_used = time.time()
+            if self.done:
+                return None
+            with tracing.span("sql.page", page_size=self.page_size) as span:
+                page = next(self._chunks, None)
+                span.set(rows=0 if page is None else len(page))
+            if page is None or len(page) < self.page_size:
+                self._finish()
+            if page is None:
+                return None
+            if self.first_page_seconds is None:
+                self.first_page_seconds = time.perf_counter() - self._start
+                self.columns = list(page.columns)
+            page = page.reset_index(drop=True)
+            page.index += self.rows
+            self.rows += len(page)
+            return page
+
+    def _finish(self, complete: bool = True):
+        self.done = True
+        if complete:
+            self.total_seconds = time.perf_counter() - self._start
+        self._chunks.close()
+
+    def close(self):
+        """Encerra a leitura (devolve a conexão ao pool); 'total_seconds' fica None se não acabou."""
+        with self._lock:
+            if not self.done:
+                self._finish(complete=False)
+
+    def report(self) -> dict:
+        return {"rows": self.rows, "done": self.done,
+                "first_page_ms": None if self.first_page_seconds is None else 1000 * self.first_page_seconds,
+                "total_ms": None if self.total_seconds is None else 1000 * self.total_seconds}
+
+
+def open_query(sql_query: str, page_size: int = None, guard: bool = config.SQL_GUARD_ENABLED):
+    """
+    Como execute_query, mas devolve um QueryPager (ou a mensagem de erro, como texto)
+    em vez do resultado inteiro: a primeira página pode ser mostrada logo e o resto
+    lido sob demanda.
+    """
+    try:
+        sql_query, rejection = _prepare_query(sql_query, guard)
+        if rejection:
+            return rejection
+        result_df = _run_analytic(sql_query)
+        if result_df is not None:
+            return QueryPager.from_dataframe(result_df, sql_query, page_size)
+        return QueryPager(sql_query, page_size)
     except Exception as e:
-        # Retorna a mensagem de erro como uma string para ser impressa no console
         return f"Erro ao executar a query: {e}"
 
 
+def get_query_stats() -> dict:
+    """
+    Estatísticas do pool de conexões e das durações das consultas (p50/p95 em ms); nas
+    consultas lidas em blocos, também o tempo até o primeiro bloco.
+    """
+    durations = np.array(_query_durations) * 1000
+    first_rows = np.array(_first_row_durations) * 1000
+    return {
+        **_query_stats,
+        "pools": {db_file: pool.report() for db_file, pool in _pools.items()},
+        "p50_ms": float(np.percentile(durations, 50)) if len(durations) else 0.0,
+        "p95_ms": float(np.percentile(durations, 95)) if len(durations) else 0.0,
+        "first_row_p50_ms": float(np.percentile(first_rows, 50)) if len(first_rows) else 0.0,
+        "first_row_p95_ms": float(np.percentile(first_rows, 95)) if len(first_rows) else 0.0,
+    }
+
+
 def get_all_tables_dfs():
     """
     Carrega todas as tabelas do banco de dados para um dicionário de DataFrames.
-    Essencial para o setup inicial do FAISS no main.py.
+    Lê as tabelas inteiras; para o setup do pipeline use schema_catalog.SchemaCatalog.
     """
     try:
         conn = sqlite3.connect(config.DB_FILE)
@@ -1,12 +1,83 @@
 # assistant/intent_classifier.py
 import json
-from . import config 
-from .local_llm import generate_local_response 
-from . import config
+import re
+import numpy as np
+from .local_llm import generate_local_response
+from . import config, tracing
 
-def classify_intent(question: str) -> str:
-    # A lógica do prompt permanece a mesma
-    system_message = """    Você é um especialista em classificar a intenção do usuário para um assistente de dados imobiliários.
+# Exemplos rotulados usados pelo classificador rápido (os mesmos do prompt, e mais alguns)
+INTENT_EXEMPLARS = {
+    "SQL_QUERY": [
+        "Qual a unidade mais cara?",
+        "Liste os prédios da Melnick Even",
+        "Quantos imóveis temos em Porto Alegre?",
+        "Qual o preço médio das unidades de 2 quartos?",
+        "Quantas unidades disponíveis existem no bairro Moinhos de Vento?",
+        "Quais empreendimentos foram lançados em 2023?",
+        "Qual o maior desconto já dado em uma unidade?",
+        "Mostre as tipologias com mais de 3 suítes",
+    ],
+    "DATA_ASSISTANCE": [
+        "Quais dados você tem sobre os prédios?",
+        "O que significa a coluna 'unidade_id'?",
+        "Quais tabelas estão relacionadas?",
+        "Quais colunas existem na tabela de unidades?",
+        "Como as tabelas de unidades e prédios se ligam?",
+        "Que informações existem no histórico de preços?",
+        "Explique o esquema do banco de dados",
+    ],
+    "GENERAL_CONVERSATION": [
+        "Olá, tudo bem?",
+        "O que você faz?",
+        "Qual a cotação do dólar hoje?",
+        "O mercado imobiliário está bom para investir?",
+        "Bom dia!",
+        "Obrigado pela ajuda",
+        "Quem é você?",
+        "Vai chover amanhã em Porto Alegre?",
+    ],
+}
+
+# Centróides por modelo de embeddings (calculados uma vez por modelo carregado)
+_centroid_cache = {}
+
+
+def _unit_rows(matrix) -> np.ndarray:
+    matrix = np.atleast_2d(np.asarray(matrix, dtype="float32"))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
+
+def _get_centroids(model):
+    key = id(model)
+    if key not in _centroid_cache:
+        labels = list(INTENT_EXEMPLARS.keys())
+        centroids = []
+        for label in labels:
+            embeddings = _unit_rows(model.encode([f"query: {q}" for q in INTENT_EXEMPLARS[label]]))
+            centroids.append(embeddings.mean(axis=0))
+        _centroid_cache[key] = (labels, _unit_rows(np.vstack(centroids)))
+    return _centroid_cache[key]
+
+
+def classify_intent_embedding(question: str, model, question_embedding=None):
+    """
+    Classificador por centróide mais próximo sobre os embeddings do SentenceTransformer.
+    Retorna (intenção, confiança), com a confiança dada por um softmax das similaridades.
+    """
+    labels, centroids = _get_centroids(model)
+    if question_embedding is None:
+        question_embedding = model.encode([f"query: {question}"])
+    similarities = centroids @ _unit_rows(question_embedding)[0]
+
+    logits = similarities / config.INTENT_SOFTMAX_TEMPERATURE
+    probs = np.exp(logits - logits.max())
+    probs /= probs.sum()
+    best = int(np.argmax(probs))
+    return labels[best], float(probs[best])
+
+
+INTENT_SYSTEM_MESSAGE = """    Você é um especialista em classificar a intenção do usuário para um assistente de dados imobiliários.
     Analise a pergunta do usuário e determine se ela pode ser respondida por uma consulta a um banco de dados (SQL_QUERY) ou se é uma conversa geral (GENERAL_CONVERSATION).
 
     REGRAS DE SAÍDA CRUCIAIS:
@@ -26,17 +97,55 @@ def classify_intent(question: str) -> str:
     Responda APENAS com um objeto JSON contendo a chave "intent" e o valor da intenção classificada.
     Exemplo de resposta válida: {"intent": "SQL_QUERY"}"""
 
-    user_message = f"Analise a seguinte pergunta do usuário: \"{question}\""
 
+def build_intent_user_message(question: str) -> str:
+    return f"Analise a seguinte pergunta do usuário: \"{question}\""
+
+
+def parse_intent_response(response_text: str) -> str:
+    # O modelo local precisa ser instruído a gerar um JSON válido; se vier texto
+    # em volta do objeto, tenta aproveitar o primeiro {...} da resposta
     try:
-        response_text = generate_local_response(system_message, user_message, config.CHAT_MODEL)
-        
-        # O modelo local precisa ser instruído a gerar um JSON válido
         response_json = json.loads(response_text)
-        intent = response_json.get("intent", "UNKNOWN")
-        
-        print(f"DEBUG - Intenção classificada: {intent}")
+    except json.JSONDecodeError:
+        match = re.search(r"\{.*?\}", response_text, re.DOTALL)
+        if match is None:
+            raise
+        response_json = json.loads(match.group(0))
+    return response_json.get("intent", "UNKNOWN")
+
+
+def classify_intent_llm(question: str) -> str:
+    with tracing.span("intent.llm") as span:
+        try:
+            response_text = generate_local_response(INTENT_SYSTEM_MESSAGE, build_intent_user_message(question),
+                                                    config.CHAT_MODEL, profile="json")
+            intent = parse_intent_response(response_text)
+        except Exception as e:
+            print(f"❌ Erro ao classificar intenção: {e}")
+            intent = "UNKNOWN"
+        span.set(intent=intent)
+    return intent
+
+
+def classify_intent(question: str, model=None, question_embedding=None) -> str:
+    """
+    Classifica a intenção da pergunta. Com o modelo de embeddings disponível, usa o
+    classificador rápido e só recorre ao LLM quando a confiança fica abaixo de
+    config.INTENT_CONFIDENCE_THRESHOLD.
+    """
+    with tracing.span("intent") as span:
+        if model is None:
+            intent = classify_intent_llm(question)
+            span.set(intent=intent, source="llm")
+            return intent
+
+        intent, confidence = classify_intent_embedding(question, model, question_embedding)
+        span.set(confidence=round(float(confidence), 2))
+        if confidence < config.INTENT_CONFIDENCE_THRESHOLD:
+            # Confiança baixa: o LLM decide
+            intent = classify_intent_llm(question)
+            span.set(intent=intent, source="llm")
+            return intent
+        span.set(intent=intent, source="embedding")
         return intent
-    except Exception as e:
-        print(f"❌ Erro ao classificar intenção: {e}")
-        return "UNKNOWN"
\ No newline at end of file
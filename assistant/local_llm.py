@@ -1,50 +1,380 @@
 # assistant/local_llm.py
-from transformers import AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig
-import torch
+from collections import OrderedDict
+import copy
+import re
+import threading
+import time
+from . import config, tracing
 
-# Dicionário para armazenar o modelo e o tokenizer após o carregamento inicial
+# Dicionário para armazenar o modelo, o tokenizer e o backend após o carregamento inicial
 _model_cache = {}
+# Uma carga por vez: quem pede o modelo durante a carga (ex.: a subida em assistant/warmup.py) espera por ela
+_load_lock = threading.Lock()
 
-def get_local_llm_pipeline(model_name: str):
-    if model_name not in _model_cache:
-        print(f"Carregando modelo local: {model_name}")
-        tokenizer = AutoTokenizer.from_pretrained(model_name)
-
-        bnb_config = BitsAndBytesConfig(
-            load_in_4bit=True,
-            bnb_4bit_quant_type="nf4",
-            bnb_4bit_compute_dtype=torch.bfloat16 
-        )
+# Estado do KV cache (past_key_values) de cada prefixo de sistema já visto,
+# chaveado por (model_name, hash do system prompt), em ordem LRU
+_prefix_cache = OrderedDict()
 
-        model = AutoModelForCausalLM.from_pretrained(
-            model_name, 
-            quantization_config=bnb_config, # <-- Use a nova config
-            device_map="auto"
-        )
-        
-        _model_cache[model_name] = {"tokenizer": tokenizer, "model": model}
-    
-    return _model_cache[model_name]["tokenizer"], _model_cache[model_name]["model"]
-
-def generate_local_response(system_prompt: str, user_prompt: str, model_name: str) -> str:
-    tokenizer, model = get_local_llm_pipeline(model_name)
-    
+# Tokens gerados por perfil de geração, para medir o ganho dos limites por tarefa
+_generation_stats = {}
+
+def format_prompt(system_prompt: str, user_prompt: str):
+    """Retorna (prefixo fixo do sistema, prompt completo) no formato do Llama 2."""
     # 1. Formato da mensagem de Sistema (System Prompt)
     system_message_formatted = f"<<SYS>>\n{system_prompt}\n<</SYS>>\n\n"
-    
+
     # 2. Formato final do Prompt
     # O Llama 2 usa a estrutura [INST] para instruções e /s para início/fim de diálogo.
-    input_text = f"<s>[INST] {system_message_formatted}{user_prompt} [/INST]"
-        
-    # Gera a resposta
-    inputs = tokenizer(input_text, return_tensors="pt").to(model.device)
-    outputs = model.generate(**inputs, max_new_tokens=256, temperature=0.7)
-    
-    response = tokenizer.decode(outputs[0], skip_special_tokens=True)
-    
-    # Remove o prompt original da resposta
-    response_start_tag = "[/INST]"
-    if response_start_tag in response:
-        response = response.split(response_start_tag, 1)[1].strip()
-        
-    return response.strip()
\ No newline at end of file
+    prefix_text = f"<s>[INST] {system_message_formatted}"
+    return prefix_text, f"{prefix_text}{user_prompt} [/INST]"
+
+# --- Critérios de parada por tarefa ---------------------------------------------
+
+def _json_stop_index(text: str):
+    """Posição logo após a chave que fecha o primeiro objeto JSON, ou None."""
+    depth, in_string, escaped = 0, False, False
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"' and depth > 0:
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}" and depth > 0:
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return None
+
+# Começo do SQL quando não há cerca ```: SELECT/WITH em maiúsculas ou no início de uma linha
+_SQL_KEYWORD = re.compile(r"\b(?:SELECT|WITH)\b|^[ \t]*(?:select|with)\b", re.MULTILINE)
+
+def find_sql_start(text: str):
+    """
+    Posição onde o SQL começa na resposta: logo após a linha da primeira cerca ```
+    ou, sem cerca, no primeiro SELECT/WITH. O texto antes dele (ex.: "Sure! Here's
+    the SQL query:") é ignorado. None se o SQL ainda não começou.
+    """
+    fence, match = text.find("```"), _SQL_KEYWORD.search(text)
+    if match is None and fence == -1:
+        return None
+    if match is not None and (fence == -1 or match.start() < fence):
+        if fence == -1:
+            return match.start()
+        # SELECT/WITH antes da cerca: ela abre o SQL se trouxer a linguagem ("```sql"), senão o fecha
+        line_end = text.find("\n", fence)
+        if line_end == -1:
+            return None
+        if not text[fence + 3:line_end].strip():
+            return match.start()
+    newline = text.find("\n", fence)
+    return newline + 1 if newline != -1 else None
+
+def _sql_stop_index(text: str):
+    """
+    Posição de corte de um único comando SQL: após o ';' ou antes da cerca ``` de
+    fechamento. As aspas só contam a partir do início do SQL (find_sql_start), e o
+    corte só acontece depois de algum conteúdo de SQL.
+    """
+    start = find_sql_start(text)
+    if start is None:
+        return None
+
+    in_quote, has_sql = None, False
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_quote:
+            if char == in_quote:
+                in_quote = None
+        elif char in ("'", '"'):
+            in_quote, has_sql = char, True
+        elif text.startswith("```", i):
+            if has_sql:
+                return i
+        elif char == ";":
+            if has_sql:
+                return i + 1
+        elif not char.isspace() and char != "`":
+            has_sql = True
+    return None
+
+STOP_RULES = {"json": _json_stop_index, "sql": _sql_stop_index}
+
+def get_generation_profile(profile: str) -> dict:
+    if profile not in config.GENERATION_PROFILES:
+        raise ValueError(f"Perfil de geração desconhecido: '{profile}'")
+    return config.GENERATION_PROFILES[profile]
+
+def _record_generation(profile: str, prompt_tokens: int, new_tokens: int, seconds: float, ttft: float = None):
+    stats = _generation_stats.setdefault(profile, {"calls": 0, "prompt_tokens": 0, "new_tokens": 0, "seconds": 0.0})
+    stats["calls"] += 1
+    stats["prompt_tokens"] += prompt_tokens
+    stats["new_tokens"] += new_tokens
+    stats["seconds"] += seconds
+    # Prefill e decode viram spans filhos do span atual (as mensagens DEBUG saem pelo console do tracing)
+    if ttft is not None:
+        # Prefill medido à parte: base da estimativa de tempo por token de prompt (prompt_fragments.report)
+        stats["prefill_tokens"] = stats.get("prefill_tokens", 0) + prompt_tokens
+        stats["prefill_seconds"] = stats.get("prefill_seconds", 0.0) + ttft
+        decode_seconds = seconds - ttft
+        tokens_per_second = (new_tokens - 1) / decode_seconds if new_tokens > 1 and decode_seconds > 0 else 0.0
+        tracing.record("llm.prefill", ttft, profile=profile, prompt_tokens=prompt_tokens)
+        tracing.record("llm.decode", decode_seconds, profile=profile, new_tokens=new_tokens,
+                       tokens_per_second=round(tokens_per_second, 1))
+    else:
+        tracing.record("llm.generate", seconds, profile=profile, prompt_tokens=prompt_tokens, new_tokens=new_tokens)
+
+def get_generation_stats() -> dict:
+    """Totais de chamadas, tokens e tempo por perfil de geração."""
+    return copy.deepcopy(_generation_stats)
+
+def _apply_stop(response: str, stop_index) -> str:
+    # O último token pode passar do ponto de parada (ex.: ";\n"); corta exatamente nele
+    if stop_index is not None:
+        cut = stop_index(response)
+        if cut is not None:
+            response = response[:cut]
+    return response.strip()
+
+def _incremental_text(chunks, stop_index):
+    """
+    Recebe os pedaços de texto gerados e emite apenas o que já é definitivo: sem os
+    espaços das pontas e cortado na regra de parada, de modo que a concatenação da
+    saída seja igual a _apply_stop(texto completo).
+    """
+    text, emitted = "", 0
+    for chunk in chunks:
+        text += chunk
+        visible = text.lstrip()
+        stopped = False
+        if stop_index is not None:
+            cut = stop_index(visible)
+            if cut is not None:
+                visible, stopped = visible[:cut], True
+        # Espaços no fim ainda podem ser os últimos da resposta; só saem quando vier mais texto.
+        # Com regra de parada, crases no fim também esperam: podem ser o começo da cerca de corte
+        ready = visible.rstrip()
+        if stop_index is not None and not stopped:
+            ready = ready.rstrip("`").rstrip()
+        if len(ready) > emitted:
+            yield ready[emitted:]
+            emitted = len(ready)
+        if stopped:
+            return
+    # Fim sem corte: libera o que ficou retido
+    ready = _apply_stop(text, stop_index)
+    if len(ready) > emitted:
+        yield ready[emitted:]
+
+# ==============================================================================
+# BACKENDS DE INFERÊNCIA
+# ==============================================================================
+
+class LocalLLMBackend:
+    """
+    Interface comum dos backends do modelo de chat. Todos recebem o system prompt,
+    a mensagem do usuário e o nome de um perfil de config.GENERATION_PROFILES.
+    """
+
+    def generate(self, system_prompt: str, user_prompt: str, profile: str) -> str:
+        return "".join(self.stream(system_prompt, user_prompt, profile))
+
+    def stream(self, system_prompt: str, user_prompt: str, profile: str):
+        raise NotImplementedError
+
+    def generate_batch(self, batch: list, profile: str, batch_size: int) -> list:
+        # Sem suporte nativo a lotes: gera um prompt por vez
+        return [self.generate(system_prompt, user_prompt, profile) for system_prompt, user_prompt in batch]
+
+    def count_tokens(self, text: str) -> int:
+        raise NotImplementedError
+
+    def warm_up(self, system_prompts: list):
+        """Prepara o backend para os system prompts fixos antes da primeira pergunta (padrão: nada)."""
+
+class LlamaCppBackend(LocalLLMBackend):
+    """Backend de CPU sobre llama.cpp (llama-cpp-python) com um modelo GGUF quantizado."""
+
+    def __init__(self, model_path: str):
+        from llama_cpp import Llama, LlamaRAMCache
+
+        self.llm = Llama(
+            model_path=model_path,
+            n_ctx=config.LLM_CONTEXT_SIZE,
+            n_threads=config.LLM_NUM_THREADS,
+            verbose=False,
+        )
+        # O cache de estados do llama.cpp reaproveita o prefixo comum entre prompts
+        if config.PREFIX_KV_CACHE:
+            self.llm.set_cache(LlamaRAMCache(capacity_bytes=config.PREFIX_CACHE_MAX_MB * 1024 * 1024))
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.llm.tokenize(text.encode("utf-8"), add_bos=False))
+
+    def stream(self, system_prompt: str, user_prompt: str, profile: str):
+        generation = get_generation_profile(profile)
+        _, prompt = format_prompt(system_prompt, user_prompt)
+        # O llama.cpp já insere o token BOS; o "<s>" literal do template sairia como texto
+        prompt = prompt[len("<s>"):]
+        prompt_tokens = len(self.llm.tokenize(prompt.encode("utf-8")))
+
+        completion_kwargs = {
+            "max_tokens": max(1, min(generation.get("max_new_tokens", 256), config.LLM_CONTEXT_SIZE - prompt_tokens)),
+            # temperature 0 no llama.cpp é decodificação gulosa
+            "temperature": generation.get("temperature", 0.7) if generation.get("do_sample", True) else 0.0,
+            "stream": True,
+        }
+
+        counters = {"tokens": 0, "first": None}
+        def _chunks():
+            for part in self.llm.create_completion(prompt, **completion_kwargs):
+                counters["tokens"] += 1
+                if counters["first"] is None:
+                    counters["first"] = time.perf_counter()
+                yield part["choices"][0]["text"]
+
+        start_time = time.perf_counter()
+        # Sair do gerador ao atingir a regra de parada interrompe a geração no llama.cpp
+        yield from _incremental_text(_chunks(), STOP_RULES.get(generation.get("stop")))
+
+        ttft = counters["first"] - start_time if counters["first"] else None
+        _record_generation(profile, prompt_tokens, counters["tokens"], time.perf_counter() - start_time, ttft=ttft)
+
+class StubBackend(LocalLLMBackend):
+    """
+    Backend determinístico e sem modelo, para testes e benchmarks sem GPU nem rede.
+    Responde um texto fixo por perfil de geração; 'delay' simula o tempo do modelo.
+    """
+
+    RESPONSES = {
+        "json": '{"intent": "SQL_QUERY"}',
+        "sql": "SELECT COUNT(*) FROM buildings;",
+        "chat": "Olá! Eu sou o Thori, o assistente de dados da Thorr.",
+        "default": "Olá! Eu sou o Thori, o assistente de dados da Thorr.",
+    }
+
+    def __init__(self, responses: dict = None, delay: float = 0.0):
+        self.responses = dict(self.RESPONSES, **(responses or {}))
+        self.delay = delay
+
+    def count_tokens(self, text: str) -> int:
+        # Aproximação de ~4 caracteres por token
+        return max(1, len(text) // 4)
+
+    def respond(self, system_prompt: str, user_prompt: str, profile: str) -> str:
+        return self.responses.get(profile, self.responses["default"])
+
+    def stream(self, system_prompt: str, user_prompt: str, profile: str):
+        start_time = time.perf_counter()
+        if self.delay:
+            time.sleep(self.delay)
+        text = self.respond(system_prompt, user_prompt, profile)
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            yield word if i == 0 else " " + word
+        _record_generation(profile, self.count_tokens(system_prompt + user_prompt), self.count_tokens(text),
+                           time.perf_counter() - start_time)
+
+    def generate_batch(self, batch: list, profile: str, batch_size: int) -> list:
+        if self.delay:
+            time.sleep(self.delay)
+        return [self.respond(system_prompt, user_prompt, profile) for system_prompt, user_prompt in batch]
+
+def _load_bnb_4bit(model_name: str) -> LocalLLMBackend:
+    # torch e transformers só são importados quando um backend deles é carregado
+    from .transformers_backend import load_bnb_4bit
+    return load_bnb_4bit(model_name)
+
+def _load_torch_int8(model_name: str) -> LocalLLMBackend:
+    from .transformers_backend import load_torch_int8
+    return load_torch_int8(model_name)
+
+def _load_llama_cpp(model_name: str) -> LocalLLMBackend:
+    return LlamaCppBackend(config.GGUF_MODEL_PATH)
+
+# Backends disponíveis, escolhidos por config.LLM_BACKEND
+BACKEND_LOADERS = {
+    "bnb-4bit": _load_bnb_4bit,
+    "torch-int8": _load_torch_int8,
+    "llama-cpp": _load_llama_cpp,
+    "stub": lambda model_name: StubBackend(),
+}
+
+def get_backend(model_name: str) -> LocalLLMBackend:
+    if model_name in _model_cache:
+        return _model_cache[model_name]["backend"]
+    with _load_lock:
+        if model_name in _model_cache:
+            return _model_cache[model_name]["backend"]
+        if config.LLM_BACKEND not in BACKEND_LOADERS:
+            raise ValueError(f"Backend de LLM desconhecido: '{config.LLM_BACKEND}' "
+                             f"(opções: {', '.join(BACKEND_LOADERS)})")
+        print(f"Carregando modelo local: {model_name} (backend: {config.LLM_BACKEND})")
+        backend = BACKEND_LOADERS[config.LLM_BACKEND](model_name)
+        _model_cache[model_name] = {
+            "tokenizer": getattr(backend, "tokenizer", None),
+            "model": getattr(backend, "model", None),
+            "backend": backend,
+        }
+    return _model_cache[model_name]["backend"]
+
+def get_local_llm_pipeline(model_name: str):
+    """Retorna (tokenizer, modelo) do transformers; só existe nos backends do transformers."""
+    from .transformers_backend import TransformersBackend
+
+    backend = get_backend(model_name)
+    if not isinstance(backend, TransformersBackend):
+        raise TypeError(f"O backend '{config.LLM_BACKEND}' não expõe um modelo do transformers.")
+    return backend.tokenizer, backend.model
+
+def register_local_model(model_name: str, tokenizer, model, drafts: dict = None):
+    """
+    Registra um modelo já carregado (ex.: um Llama minúsculo para testes em CPU) e,
+    opcionalmente, rascunhos já carregados ({nome: modelo}, escolhidos por config.DRAFT_MODEL).
+    """
+    from .transformers_backend import TransformersBackend
+
+    backend = TransformersBackend(model_name, tokenizer, model)
+    _model_cache[model_name] = {"tokenizer": tokenizer, "model": model, "backend": backend,
+                                "draft_models": dict(drafts or {})}
+    for key in [k for k in _prefix_cache if k[0] == model_name]:
+        del _prefix_cache[key]
+
+# ==============================================================================
+# API USADA PELOS MÓDULOS DE INTENÇÃO, SQL E CONVERSA
+# ==============================================================================
+
+def generate_local_response(system_prompt: str, user_prompt: str, model_name: str, profile: str = "default") -> str:
+    """
+    Gera a resposta do modelo local. 'profile' escolhe um perfil de
+    config.GENERATION_PROFILES (limite de tokens, greedy/amostragem e regra de parada).
+    """
+    with tracing.span("llm", profile=profile):
+        return get_backend(model_name).generate(system_prompt, user_prompt, profile)
+
+def stream_local_response(system_prompt: str, user_prompt: str, model_name: str, profile: str = "default"):
+    """
+    Versão em streaming de generate_local_response: gera pedaços de texto à medida
+    que os tokens saem do modelo. O prompt (tudo até o [/INST]) nunca é emitido, e
+    os espaços das pontas são removidos de forma incremental, então a concatenação
+    dos pedaços é igual ao retorno de generate_local_response.
+    """
+    yield from get_backend(model_name).stream(system_prompt, user_prompt, profile)
+
+def generate_local_responses(batch: list, model_name: str, profile: str = "default",
+                             batch_size: int = config.LLM_BATCH_SIZE) -> list:
+    """
+    Gera respostas para vários pares (system_prompt, user_prompt) em poucas chamadas
+    de model.generate, com padding à esquerda. Os prompts são ordenados por tamanho
+    para reduzir o padding e agrupados em lotes de até 'batch_size' prompts e até
+    config.LLM_BATCH_MAX_TOKENS tokens (prompt + geração). Retorna na ordem de entrada.
+    """
+    if not batch:
+        return []
+    with tracing.span("llm.batch", profile=profile, prompts=len(batch)):
+        return get_backend(model_name).generate_batch(batch, profile, batch_size)
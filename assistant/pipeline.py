@@ -1,17 +1,12 @@
-import pandas as pd
+# faiss, pandas e o modelo de embeddings são importados só nas funções que os usam:
+# importar o pipeline não carrega nenhum deles (ver assistant/warmup.py)
 import numpy as np
-import faiss
-from sentence_transformers import SentenceTransformer
-import re
 from unidecode import unidecode
-from assistant.local_llm import generate_local_response
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-import os
-from dotenv import load_dotenv
-import sqlite3
+from assistant.local_llm import find_sql_start, generate_local_response, generate_local_responses, stream_local_response
+import time
 
-from assistant import config
+from assistant import config, embedding_cache, embeddings, prompt_fragments, query_guard, tracing, value_index
+from assistant.schema_catalog import TableSchema, as_catalog
 
 # ==============================================================================
 # PARTE 1: NORMALIZAÇÃO DAS TABELAS PARA REPRESENTAÇÃO
@@ -22,12 +17,15 @@ def normalize_text(s: str) -> str:
         return ""
     return unidecode(str(s)).lower().strip()
 
-def build_thorr_table_representation(df: pd.DataFrame, name: str, base_text: str = "") -> str:
+def build_thorr_table_representation(df: TableSchema, name: str, base_text: str = "") -> str:
     relations = ""
     if name == 'buildings': relations = "Relacionada com: units (id_predio), typologies (id_predio)"
     elif name == 'units': relations = "Relacionada com: buildings (id_predio), units_updates (unidade_id)"
     elif name == 'typologies': relations = "Relacionada com: buildings (id_predio)"
     elif name == 'units_updates': relations = "Relacionada com: units (unidade_id)"
+    elif name == 'units_latest': relations = "Relacionada com: units (unidade_id), buildings (id_predio)"
+    elif name == 'buildings_summary': relations = "Relacionada com: buildings (id_predio)"
+    elif name == 'cities_summary': relations = "Relacionada com: buildings (cidade_endereço)"
     
     parts = [
         f"TABELA: {name}",
@@ -37,6 +35,8 @@ def build_thorr_table_representation(df: pd.DataFrame, name: str, base_text: str
     return "\n".join(parts)
 
 def load_data():
+    import pandas as pd
+
     dfs = {}
     for name, path in config.DATA_FILES.items():
         try:
@@ -49,200 +49,364 @@ def load_data():
 # PARTE 2: CONSTRUINDO REPRESENTAÇÃO DAS TABELAS E ÍNDICE FAISS
 # ==============================================================================
 
-def setup_faiss_and_model(dfs, base_texts, model):
+def build_column_text(tname: str, df: TableSchema, col: str) -> str:
+    sample_values = df.sample_values(col, 5)
+    return f"passage: Tabela {tname}, Coluna {col}. Exemplos: {', '.join(sample_values)}"
+
+def build_column_catalog(dfs, model, index=None):
+    """
+    Constrói o catálogo de colunas: um embedding por (tabela, coluna), todos em um
+    único índice FAISS. As posições de cada tabela no índice ficam em 'table_ids',
+    o que permite restringir a busca às tabelas recuperadas sem re-encodar nada.
+    Se 'index' já vier pronto (ex.: do cache em disco), nada é encodado.
+    """
+    dfs = as_catalog(dfs)
+    column_refs, table_ids = [], {}
+    for tname, df in dfs.items():
+        start = len(column_refs)
+        column_refs.extend((tname, col) for col in df.columns)
+        table_ids[tname] = np.arange(start, len(column_refs), dtype='int64')
+
+    if index is None and column_refs:
+        column_texts = [build_column_text(tname, dfs[tname], col) for tname, col in column_refs]
+        column_embeddings = model.encode(column_texts)
+        index = embeddings.new_index(column_embeddings.shape[1])
+        index.add(np.array(column_embeddings))
+    return {"index": index, "refs": column_refs, "table_ids": table_ids}
+
+def setup_faiss_and_model(dfs, base_texts, model, cache_dir: str = config.EMBEDDING_CACHE_DIR):
+    """
+    Monta os índices FAISS de tabelas e de colunas. 'dfs' é um SchemaCatalog (ou,
+    no formato antigo, um dicionário de DataFrames).
+    """
+    dfs = as_catalog(dfs)
     table_representations = {name: build_thorr_table_representation(df, name, base_texts.get(name, "")) for name, df in dfs.items()}
     table_names = list(table_representations.keys())
     table_texts = [f"passage: {desc}" for desc in table_representations.values()]
-    table_embeddings = model.encode(table_texts)
-    index = faiss.IndexFlatL2(table_embeddings.shape[1])
-    index.add(np.array(table_embeddings))
-    return index, table_names, table_texts, table_embeddings
+
+    if not cache_dir or not table_names:
+        table_embeddings = model.encode(table_texts)
+        index = embeddings.new_index(table_embeddings.shape[1])
+        index.add(np.array(table_embeddings))
+        column_catalog = build_column_catalog(dfs, model)
+        return index, table_names, table_texts, table_embeddings, column_catalog
+
+    # Com cache: cada tabela vira um bloco [texto da tabela, texto de cada coluna],
+    # e só os blocos cujo fingerprint mudou são re-encodados
+    texts_by_table = {
+        name: [text] + [build_column_text(name, dfs[name], col) for col in dfs[name].columns]
+        for name, text in zip(table_names, table_texts)
+    }
+    cached, fingerprints = embedding_cache.encode_with_cache(texts_by_table, model, embeddings.model_id(model), cache_dir)
+    schema_fp = embedding_cache.fingerprint([fingerprints[name] for name in table_names])
+
+    table_embeddings = np.vstack([cached[name][:1] for name in table_names])
+    index = embedding_cache.load_or_build_index("tables", table_embeddings, schema_fp, cache_dir)
+
+    column_vectors = np.vstack([cached[name][1:] for name in table_names])
+    col_index = embedding_cache.load_or_build_index("columns", column_vectors, schema_fp, cache_dir)
+    column_catalog = build_column_catalog(dfs, model, index=col_index)
+    return index, table_names, table_texts, table_embeddings, column_catalog
 
 # ==============================================================================
 # PARTE 2: A LÓGICA DE RECUPERAÇÃO
 # ==============================================================================
 
-def retrieve_tables_thorr(question, model, index, table_names, k=3):
-    augmented_question = f"query: {question}"
-    question_embedding = model.encode([augmented_question])
-    _, indices = index.search(question_embedding, k)
-    relevant_by_faiss = [table_names[i] for i in indices[0]]
+def encode_question(question: str, model):
+    # O mesmo embedding "query:" serve para a recuperação de tabelas e de colunas
+    with tracing.span("embed_question"):
+        return model.encode([f"query: {question}"])
+
+def retrieve_tables_thorr(question, model, index, table_names, k=3, question_embedding=None):
+    if question_embedding is None:
+        question_embedding = encode_question(question, model)
+    with tracing.span("retrieve_tables", k=k) as span:
+        _, indices = index.search(question_embedding, k)
+        relevant_by_faiss = [table_names[i] for i in indices[0] if i >= 0]
+        span.set(tables=relevant_by_faiss[:k])
     return relevant_by_faiss[:k]
 
 #==============================================================================
 # PARTE 3: A LÓGICA DE REFINAMENTO (THoRR: Refinement)
 # ==============================================================================
 
-def refine_tables_thorr(question: str, retrieved_tables: list, all_dfs: dict, model, top_k_columns: int = 10):
-    refined_dfs = {}
-    column_texts, column_refs = [], []
-    
-    for tname in retrieved_tables:
-        df = all_dfs.get(tname)
-        if df is None: continue
-        for col in df.columns:
-            sample_values = df[col].dropna().astype(str).head(5).tolist()
-            text = f"passage: Tabela {tname}, Coluna {col}. Exemplos: {', '.join(sample_values)}"
-            column_texts.append(text)
-            column_refs.append((tname, col))
-    
-    if not column_texts: return {}
-    
-    column_embeddings = model.encode(column_texts)
-    col_index = faiss.IndexFlatL2(column_embeddings.shape[1])
-    col_index.add(np.array(column_embeddings))
-    
-    question_embedding = model.encode([f"query: {question}"])
-    _, I = col_index.search(question_embedding, top_k_columns)
-    
-    selected_cols_per_table = {}
-    for idx in I[0]:
-        tname, col = column_refs[idx]
-        if tname not in selected_cols_per_table:
-            selected_cols_per_table[tname] = set()
-        selected_cols_per_table[tname].add(col)
+def refine_tables_thorr(question: str, retrieved_tables: list, all_dfs: dict, model, top_k_columns: int = 10,
+                        column_catalog: dict = None, question_embedding=None):
+    with tracing.span("refine_columns", tables=list(retrieved_tables)) as span:
+        refined_dfs = {}
+        all_dfs = as_catalog(all_dfs)
+        retrieved_tables = [tname for tname in retrieved_tables if tname in all_dfs]
+
+        # Sem catálogo pré-construído, monta um apenas com as tabelas recuperadas
+        if column_catalog is None:
+            column_catalog = build_column_catalog({t: all_dfs[t] for t in retrieved_tables}, model)
+
+        ids = [column_catalog["table_ids"][t] for t in retrieved_tables if t in column_catalog["table_ids"]]
+        if not ids: return {}
+        ids = np.concatenate(ids)
+        if len(ids) == 0: return {}
+
+        if question_embedding is None:
+            question_embedding = encode_question(question, model)
+
+        # Busca única no índice de colunas, restrita às tabelas recuperadas
+        import faiss
+        params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(ids))
+        D, I = column_catalog["index"].search(question_embedding, min(top_k_columns, len(ids)), params=params)
+        scores = embeddings.similarity(D[0])
     
-    key_columns = config.KEY_COLUMNS
-
-    for tname in selected_cols_per_table.keys():
-        original_df_cols = all_dfs[tname].columns
-        for key_col in key_columns:
-            if key_col in original_df_cols:
-                selected_cols_per_table[tname].add(key_col)
-
-    for tname, cols in selected_cols_per_table.items():
-        df = all_dfs[tname]
-        filtered_df = df[list(cols)].copy()
-        for c in filtered_df.columns:
-            if pd.api.types.is_numeric_dtype(filtered_df[c]):
-                filtered_df.loc[:, c] = filtered_df[c].fillna(0)
-            else:
-                filtered_df.loc[:, c] = filtered_df[c].fillna('')
-        refined_dfs[tname] = filtered_df
+        selected_cols_per_table, column_scores = {}, {}
+        for idx, score in zip(I[0], scores):
+            if idx < 0: continue
+            tname, col = column_catalog["refs"][idx]
+            if tname not in selected_cols_per_table:
+                selected_cols_per_table[tname] = set()
+                column_scores[tname] = {}
+            selected_cols_per_table[tname].add(col)
+            column_scores[tname][col] = float(score)
     
-    return refined_dfs
+        key_columns = config.KEY_COLUMNS
+
+        for tname in selected_cols_per_table.keys():
+            original_df_cols = all_dfs[tname].columns
+            for key_col in key_columns:
+                if key_col in original_df_cols:
+                    selected_cols_per_table[tname].add(key_col)
+
+        for tname, cols in selected_cols_per_table.items():
+            refined_dfs[tname] = all_dfs[tname].select(cols, column_scores=column_scores[tname])
+        span.set(columns={tname: sorted(cols) for tname, cols in selected_cols_per_table.items()})
+
+        return refined_dfs
 
 # ==============================================================================
 # PARTE 4: INTEGRAÇÃO COM O LLM (ChatGPT)
 # ==============================================================================
 
-def generate_sql_query_from_refined(question: str, refined_dfs: dict) -> str:
-    
-    schema_string = ""
-    for table_name, df in refined_dfs.items():
-            # Adiciona o nome da tabela
-            schema_string += f"Tabela: {table_name}\n"
-            
-            col_examples = []
-            for col in df.columns:
-                # Tenta obter os 3 primeiros valores não nulos de forma segura
-                try:
-                    # 1. Converte a coluna para string antes de pegar amostras para evitar falhas de tipo.
-                    sample_values = df[col].dropna().head(3).astype(str).tolist()
-                except Exception as e:
-                    # Se falhar, usa uma mensagem de segurança em vez de travar
-                    # print(f"AVISO: Falha ao obter amostras para a coluna {col} na tabela {table_name}: {e}")
-                    sample_values = ["Dados indisponíveis"]
-                
-                example_str = f"Exemplo(s): {sample_values}"
-                
-                # Adiciona ao esquema da tabela
-                col_examples.append(f"- Coluna '{col}': {example_str}")
-                
-            # Junta todas as colunas e exemplos e adiciona nova linha entre tabelas
-            schema_string += "\n".join(col_examples)
-            schema_string += "\n\n" 
+def build_sql_prompt(question: str, refined_dfs: dict, token_budget: int = None) -> str:
+    """
+    Monta a mensagem do usuário (esquema refinado + pergunta) para a geração de SQL.
+    O esquema sai dos fragmentos em cache (prompt_fragments), escolhidos pela relevância
+    das colunas até 'token_budget' tokens (padrão: config.SQL_SCHEMA_TOKEN_BUDGET).
+    Os valores reais que correspondem a termos da pergunta (value_index) aparecem na
+    coluna deles, inclusive em colunas que o refinamento deixou de fora.
+    """
+    with tracing.span("build_prompt", tables=len(refined_dfs)) as span:
+        refined_dfs = as_catalog(refined_dfs)
+        matched_values = {}
+        if config.VALUE_INDEX_ENABLED:
+            matched_values = value_index.lookup_values(normalize_text(question), tables=list(refined_dfs))
+
+        budget = config.SQL_SCHEMA_TOKEN_BUDGET if token_budget is None else token_budget
+        schema_string, stats = prompt_fragments.build_sql_schema(refined_dfs, matched_values, budget)
+
+        prompt = (f"Esquema de banco de dados:\n{schema_string}\n\n"
+                  f"Pergunta do usuário: {question}\n\n"
+                  "Consulta SQL:")
+        span.set(prompt_chars=len(prompt), matched_values=sum(len(c) for c in matched_values.values()),
+                 **stats, **prompt_fragments.record("SQL", stats), prompt=prompt)
+    return prompt
+
+def clean_sql_response(sql_query: str) -> str:
+    """Remove o texto antes do SQL, as cercas de markdown e o prefixo 'sql' da resposta do modelo."""
+    # Texto antes do SQL ("Sure! Here's the SQL query:\n```sql") e cerca de fechamento
+    start = find_sql_start(sql_query)
+    if start is not None:
+        sql_query = sql_query[start:]
+        fence = sql_query.find('```')
+        if fence != -1:
+            sql_query = sql_query[:fence]
+
+    # Limpeza Agressiva do Markdown (como discutimos)
+    sql_query = sql_query.strip()
+    if sql_query.startswith('```'):
+        sql_query = sql_query.lstrip('` \n')
+    if sql_query.endswith('```'):
+        sql_query = sql_query.rstrip('` \n')
+        
+    # Garante que qualquer tag "sql" inicial seja removida
+    if sql_query.lower().startswith('sql'):
+         sql_query = sql_query[3:].strip()
+         
+    return sql_query.strip()
 
+def build_sql_retry_prompt(user_message: str, sql_query: str, reason: str) -> str:
+    """Prompt da segunda tentativa: o original + a consulta recusada e o motivo da recusa."""
+    return (f"{user_message}\n\n"
+            f"A consulta abaixo foi recusada antes de ser executada:\n{sql_query}\n"
+            f"Motivo: {reason}\n"
+            "Gere uma nova consulta SQL que corrija o problema.\n\n"
+            "Consulta SQL:")
+
+def generate_sql_query_from_refined(question: str, refined_dfs: dict, rejected: dict = None) -> str:
+    """
+    Gera o SQL a partir das tabelas refinadas. 'rejected' ({"sql", "reason"}) é a
+    consulta recusada pelo guarda de custo numa tentativa anterior.
+    """
     system_message = config.SQL_GENERATION_SYSTEM_PROMPT
-    user_message = (f"Esquema de banco de dados:\n{schema_string}\n\n"
-                    f"Pergunta do usuário: {question}\n\n"
-                    "Consulta SQL:")
-    
-    print("-" * 50)
-    print("Conteúdo do prompt enviado ao ChatGPT:")
-    print("-" * 50)
-    print(user_message)
-    print("-" * 50)
+    user_message = build_sql_prompt(question, refined_dfs)
+    if rejected is not None:
+        user_message = build_sql_retry_prompt(user_message, rejected["sql"], rejected["reason"])
 
     try:
         # 1. PASSO CORRIGIDO: CHAMA A FUNÇÃO LLM PARA OBTER O TEXTO!
-        sql_query = generate_local_response(system_message, user_message, config.CHAT_MODEL)
+        sql_query = generate_local_response(system_message, user_message, config.CHAT_MODEL, profile="sql")
         
-        # 2. Limpeza Agressiva do Markdown (como discutimos)
-        sql_query = sql_query.strip()
-        if sql_query.startswith('```'):
-            sql_query = sql_query.lstrip('` \n')
-        if sql_query.endswith('```'):
-            sql_query = sql_query.rstrip('` \n')
-            
-        # Garante que qualquer tag "sql" inicial seja removida
-        if sql_query.lower().startswith('sql'):
-             sql_query = sql_query[3:].strip()
-             
-        return sql_query.strip()
+        # 2. Limpeza da resposta
+        return clean_sql_response(sql_query)
 
     except Exception as e:
         # Se houver qualquer erro, incluindo falha ao chamar o generate_local_response
         return f"Ocorreu um erro ao gerar a consulta SQL: {e}"
-def run_sql_pipeline(question: str, model, index, table_names, all_dfs, verbose: bool = False):
+
+def prepare_sql_generation(question: str, model, index, table_names, all_dfs, column_catalog: dict = None,
+                           question_embedding=None):
+    """Recuperação + refinamento + prompt: tudo o que vem antes do LLM. Retorna (tabelas, prompt)."""
+    retrieved_tables = retrieve_tables_thorr(question, model, index, table_names, question_embedding=question_embedding)
+    refined_data = refine_tables_thorr(question, retrieved_tables, all_dfs, model,
+                                       column_catalog=column_catalog, question_embedding=question_embedding)
+    return retrieved_tables, build_sql_prompt(question, refined_data)
+
+def schema_fingerprint(all_dfs: dict, model=None) -> str:
     """
-    Executa o pipeline completo de Text-to-SQL e opcionalmente imprime os passos de debug.
+    Fingerprint do esquema do banco (tabelas e colunas), usado para invalidar caches.
+    Com 'model', cobre também o modelo de embeddings (embeddings.model_id): caches que
+    guardam vetores, como o SemanticSQLCache, não podem misturar modelos ou dimensões.
     """
-    if verbose:
-        print("=" * 50)
-        print(f"DEBUG - Etapa 1: Recuperação de Tabelas")
-        print(f"Pergunta: '{question}'")
-    
-    retrieved_tables = retrieve_tables_thorr(question, model, index, table_names)
-    
-    if verbose:
-        print(f"Tabelas recuperadas: {retrieved_tables}")
-        print("=" * 50)
+    schema = {name: list(df.columns) for name, df in as_catalog(all_dfs).items()}
+    if model is None:
+        return embedding_cache.fingerprint(schema)
+    return embedding_cache.fingerprint(schema, embeddings.model_id(model))
 
-    if verbose:
-        print("\n" + "=" * 50)
-        print(f"DEBUG - Etapa 2: Refinamento de Colunas")
+def run_sql_pipeline(question: str, model, index, table_names, all_dfs, verbose: bool = False, column_catalog: dict = None,
+                     sql_cache=None, question_embedding=None):
+    """
+    Executa o pipeline completo de Text-to-SQL. Cada etapa é um span de 'tracing';
+    com verbose=True, os spans são impressos como mensagens DEBUG.
+    O embedding da pergunta é calculado uma única vez e reaproveitado na recuperação
+    de tabelas e no refinamento de colunas (via 'column_catalog'). Se 'sql_cache'
+    (um SemanticSQLCache) for passado, perguntas repetidas ou parafraseadas voltam
+    direto do cache, sem passar pelo LLM; o SQL gerado fica pendente no cache até
+    o chamador confirmar que executou (sql_cache.confirm).
+    """
+    with tracing.console(verbose), tracing.span("sql_pipeline", question=question) as span:
+        start_time = time.perf_counter()
+        if question_embedding is None:
+            question_embedding = encode_question(question, model)
+        all_dfs = as_catalog(all_dfs)
 
-    refined_data = refine_tables_thorr(question, retrieved_tables, all_dfs, model)
-    
-    if verbose:
-        print("Dados refinados (tabelas e colunas):")
-        for name, data in refined_data.items():
-            print(f"\n--- Tabela '{name}' ---")
-            print(data.head(2))
-        print("=" * 50)
-    
-    if verbose:
-        print("\n" + "=" * 50)
-        print(f"DEBUG - Etapa 3: Geração da Consulta SQL")
+        if sql_cache is not None:
+            cached_sql = sql_cache.lookup(question, question_embedding)
+            span.set(cache="hit" if cached_sql is not None else "miss")
+            if cached_sql is not None:
+                span.set(sql=cached_sql)
+                return cached_sql
 
-    sql_query = generate_sql_query_from_refined(question, refined_data)
-    
-    if verbose:
-        print(f"\nConsulta SQL gerada:\n{sql_query}")
-        print("=" * 50)
+        retrieved_tables = retrieve_tables_thorr(question, model, index, table_names, question_embedding=question_embedding)
+        refined_data = refine_tables_thorr(question, retrieved_tables, all_dfs, model,
+                                           column_catalog=column_catalog, question_embedding=question_embedding)
+        sql_query = generate_sql_query_from_refined(question, refined_data)
+
+        if config.SQL_GUARD_ENABLED and not sql_query.startswith("Ocorreu um erro"):
+            # Plano caro ou SQL inválido: uma nova tentativa, com o motivo da recusa no prompt
+            with tracing.span("sql_guard") as guard_span:
+                decision = query_guard.check_query(sql_query)
+                guard_span.set(action=decision["action"])
+            if decision["action"] == "reject":
+                span.set(rejected_sql=sql_query, rejection=decision["reason"])
+                sql_query = generate_sql_query_from_refined(question, refined_data,
+                                                            rejected={"sql": sql_query, "reason": decision["reason"]})
+
+        span.set(sql=sql_query)
+        if sql_cache is not None and not sql_query.startswith("Ocorreu um erro"):
+            sql_cache.store(question, sql_query, question_embedding, latency=time.perf_counter() - start_time)
+
+        return sql_query
 
-    return sql_query
+def run_sql_pipeline_batch(questions: list, model, index, table_names, all_dfs, column_catalog: dict = None,
+                           batch_size: int = config.LLM_BATCH_SIZE) -> list:
+    """
+    Versão em lote do run_sql_pipeline, para avaliação offline e processamento em massa.
+    As perguntas são encodadas em uma única chamada de model.encode, a recuperação de
+    tabelas é uma única busca no FAISS e a geração usa generate_local_responses.
+    Retorna, para cada pergunta, o SQL, as tabelas recuperadas e os tempos por etapa
+    (tempo da etapa no lote dividido pelo número de perguntas).
+    """
+    if not questions:
+        return []
+    n = len(questions)
+    all_dfs = as_catalog(all_dfs)
+    timings = {}
+
+    start = time.perf_counter()
+    question_embeddings = model.encode([f"query: {q}" for q in questions], batch_size=config.EMBEDDING_BATCH_SIZE)
+    timings["embedding"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _, indices = index.search(np.asarray(question_embeddings, dtype='float32'), 3)
+    retrieved = [[table_names[i] for i in row if i >= 0] for row in indices]
+    timings["retrieval"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if column_catalog is None:
+        column_catalog = build_column_catalog(all_dfs, model)
+    refined = [
+        refine_tables_thorr(q, tables, all_dfs, model, column_catalog=column_catalog,
+                            question_embedding=question_embeddings[i:i + 1])
+        for i, (q, tables) in enumerate(zip(questions, retrieved))
+    ]
+    timings["refinement"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    prompts = [(config.SQL_GENERATION_SYSTEM_PROMPT, build_sql_prompt(q, r)) for q, r in zip(questions, refined)]
+    timings["prompt"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    try:
+        responses = [clean_sql_response(r) for r in
+                     generate_local_responses(prompts, config.CHAT_MODEL, profile="sql", batch_size=batch_size)]
+    except Exception as e:
+        responses = [f"Ocorreu um erro ao gerar a consulta SQL: {e}"] * n
+    timings["generation"] = time.perf_counter() - start
 
-def handle_data_assistance(question: str, all_dfs: dict) -> str:
-    # A lógica para construir o esquema de dados permanece a mesma
-    schema_string = ""
-    for table_name, df in all_dfs.items():
-        schema_string += f"Tabela: {table_name}\n"
-        schema_string += f"- Colunas: {', '.join(df.columns)}\n"
-        sample_values = df.head(1).to_string(index=False)
-        schema_string += f"- Exemplo de dados: {sample_values}\n\n"
+    per_question = {stage: seconds / n for stage, seconds in timings.items()}
+    return [
+        {"question": q, "sql": sql, "tables": tables, "timings": per_question}
+        for q, sql, tables in zip(questions, responses, retrieved)
+    ]
 
-    system_message = """Você é o assistente Thorr. Sua tarefa é responder perguntas sobre o esquema de banco de dados e os dados que você contém de forma clara e conversacional. Não invente dados numéricos. Responda apenas com base no esquema fornecido."""
+DATA_ASSISTANCE_SYSTEM_MESSAGE = """Você é o assistente Thorr. Sua tarefa é responder perguntas sobre o esquema de banco de dados e os dados que você contém de forma clara e conversacional. Não invente dados numéricos. Responda apenas com base no esquema fornecido."""
 
-    user_message = f"Esquema de banco de dados:\n{schema_string}\n\nPergunta do usuário: {question}\n\nResposta:"
+def build_data_assistance_prompt(question: str, all_dfs: dict, ranked_tables: list = None, token_budget: int = None) -> str:
+    """
+    Mensagem do usuário para a assistência de dados. Os blocos das tabelas (fragmentos
+    em cache) entram na ordem de 'ranked_tables' (recuperação) até 'token_budget'
+    tokens (padrão: config.DATA_ASSISTANCE_SCHEMA_TOKEN_BUDGET).
+    """
+    with tracing.span("build_prompt", kind="data_assistance") as span:
+        budget = config.DATA_ASSISTANCE_SCHEMA_TOKEN_BUDGET if token_budget is None else token_budget
+        schema_string, stats = prompt_fragments.build_tables_schema(as_catalog(all_dfs), ranked_tables or [], budget)
+        prompt = f"Esquema de banco de dados:\n{schema_string}\n\nPergunta do usuário: {question}\n\nResposta:"
+        span.set(prompt_chars=len(prompt), **stats, **prompt_fragments.record("assistência de dados", stats),
+                 prompt=prompt)
+    return prompt
 
+def handle_data_assistance(question: str, all_dfs: dict, ranked_tables: list = None) -> str:
+    user_message = build_data_assistance_prompt(question, all_dfs, ranked_tables)
     try:
         # Substituímos a chamada da API da OpenAI pela função do modelo local
-        return generate_local_response(system_message, user_message, config.CHAT_MODEL)
+        return generate_local_response(DATA_ASSISTANCE_SYSTEM_MESSAGE, user_message, config.CHAT_MODEL, profile="chat")
     except Exception as e:
         return f"Desculpe, ocorreu um erro ao processar sua solicitação sobre o esquema dos dados: {e}"
 
+def stream_data_assistance(question: str, all_dfs: dict, ranked_tables: list = None):
+    """Igual a handle_data_assistance, mas gera a resposta em pedaços (streaming)."""
+    user_message = build_data_assistance_prompt(question, all_dfs, ranked_tables)
+    try:
+        yield from stream_local_response(DATA_ASSISTANCE_SYSTEM_MESSAGE, user_message, config.CHAT_MODEL, profile="chat")
+    except Exception as e:
+        yield f"Desculpe, ocorreu um erro ao processar sua solicitação sobre o esquema dos dados: {e}"
+
 # ==============================================================================
 # TRECHO DE EXECUÇÃO DE EXEMPLO (PARA TESTE)
 # ==============================================================================
@@ -260,7 +424,7 @@ def handle_data_assistance(question: str, all_dfs: dict) -> str:
     
 #     print("Configurando FAISS...")
 #     # ALTERADO: Passa config.BASE_TEXTS para a função
-#     index, table_names, _, _ = setup_faiss_and_model(dfs, config.BASE_TEXTS, model)
+#     index, table_names, _, _, column_catalog = setup_faiss_and_model(dfs, config.BASE_TEXTS, model)
 #     print("Configuração FAISS concluída.\n")
 
 #     question = "Quantas unidades a incorporadora melnick even tem? "
@@ -273,7 +437,7 @@ def handle_data_assistance(question: str, all_dfs: dict) -> str:
     
 #     print("\n" + "=" * 50)
 #     print(f"DEBUG - Etapa 2: Refinamento de Colunas")
-#     refined_data = refine_tables_thorr(question, retrieved_tables, dfs, model)
+#     refined_data = refine_tables_thorr(question, retrieved_tables, dfs, model, column_catalog=column_catalog)
 #     print("Dados refinados (tabelas e colunas):")
 #     for name, data in refined_data.items():
 #         print(f"\n--- Tabela '{name}' ---")
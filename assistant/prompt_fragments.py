@@ -0,0 +1,193 @@
+# assistant/prompt_fragments.py
+"""
+Fragmentos do esquema para os prompts do LLM. Cada linha de coluna (com seus valores
+de exemplo) e cada bloco de tabela é gerado uma única vez e guardado no TableSchema;
+a contagem de tokens de cada fragmento, feita com o tokenizer do modelo de chat,
+também fica em cache.
+
+Os prompts de SQL e de assistência de dados montam o esquema escolhendo fragmentos
+por relevância na recuperação até o orçamento de tokens de config: o tamanho do
+prompt é o que define o tempo de prefill no modelo de 7B. report() resume os tokens
+de esquema economizados por requisição e o prefill correspondente.
+"""
+import threading
+from functools import lru_cache
+from . import config, local_llm
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+@lru_cache(maxsize=16384)
+def _count_tokens(model_name: str, text: str) -> int:
+    backend = local_llm.get_backend(model_name)
+    try:
+        return backend.count_tokens(text)
+    except NotImplementedError:
+        return max(1, len(text) // 4)
+
+
+def count_tokens(text: str) -> int:
+    """Tokens de 'text' no tokenizer do modelo de chat (config.CHAT_MODEL), com cache."""
+    return _count_tokens(config.CHAT_MODEL, text)
+
+
+def table_header(table_name: str) -> str:
+    return f"Tabela: {table_name}\n"
+
+
+def column_fragment(table, col: str) -> str:
+    """Linha da coluna no prompt de SQL, com até 3 valores de exemplo."""
+    try:
+        return table.fragment(("column", col), lambda: f"- Coluna '{col}': Exemplo(s): {table.sample_values(col, 3)}")
+    except Exception:
+        # Falha ao ler as amostras: não vai para o cache, a próxima pergunta tenta de novo
+        return f"- Coluna '{col}': Exemplo(s): ['Dados indisponíveis']"
+
+
+def table_fragment(table) -> str:
+    """Bloco da tabela no prompt de assistência de dados: colunas e uma linha de exemplo."""
+    def _render():
+        sample_values = table.head(1).to_string(index=False)
+        return (f"{table_header(table.name)}- Colunas: {', '.join(table.columns)}\n"
+                f"- Exemplo de dados: {sample_values}\n\n")
+    return table.fragment(("table", tuple(table.columns)), _render)
+
+
+def precompute(catalog):
+    """Gera todos os fragmentos do catálogo e conta seus tokens (na subida, depois do LLM carregado)."""
+    for table in catalog.values():
+        count_tokens(table_header(table.name))
+        count_tokens(table_fragment(table))
+        for col in table.columns:
+            count_tokens(column_fragment(table, col) + "\n")
+
+
+def build_sql_schema(refined_dfs, matched_values: dict, budget: int) -> tuple:
+    """
+    Esquema do prompt de SQL a partir das tabelas refinadas. Colunas-chave e colunas
+    com valores citados na pergunta sempre entram; as demais, da mais para a menos
+    relevante (TableSchema.column_scores), enquanto couberem em 'budget' tokens
+    (0 = todas). Retorna (texto, estatísticas de tokens).
+    """
+    items, required, optional = [], set(), []
+    for table_name, df in refined_dfs.items():
+        table_matches = matched_values.get(table_name, {})
+        for col in df.columns:
+            line = column_fragment(df, col)
+            if col in table_matches:
+                line += f" | Valores existentes citados na pergunta: {table_matches[col]}"
+            items.append((table_name, line))
+            if col in config.KEY_COLUMNS or col in table_matches:
+                required.add(len(items) - 1)
+            else:
+                optional.append((df.column_scores.get(col, float("-inf")), len(items) - 1))
+        for col, values in table_matches.items():
+            if col not in df.columns:
+                items.append((table_name, f"- Coluna '{col}': Valores existentes citados na pergunta: {values}"))
+                required.add(len(items) - 1)
+
+    costs = [count_tokens(line + "\n") for _, line in items]
+    headers = {table_name: count_tokens(table_header(table_name)) for table_name in refined_dfs}
+    full_tokens = sum(costs) + sum(headers[t] for t in {t for t, _ in items})
+
+    selected, tables, used = set(), set(), 0
+
+    def _cost(i):
+        # O cabeçalho da tabela entra junto com a primeira coluna dela
+        return costs[i] + (0 if items[i][0] in tables else headers[items[i][0]])
+
+    candidates = sorted(required) + [i for _, i in sorted(optional, key=lambda item: -item[0])]
+    for i in candidates:
+        if i in required or not budget or used + _cost(i) <= budget:
+            used += _cost(i)
+            selected.add(i)
+            tables.add(items[i][0])
+
+    schema_string = ""
+    for table_name in refined_dfs:
+        lines = [line for i, (t, line) in enumerate(items) if t == table_name and i in selected]
+        if lines:
+            schema_string += table_header(table_name) + "\n".join(lines) + "\n\n"
+    return schema_string, {"schema_tokens": used, "full_schema_tokens": full_tokens,
+                           "dropped_columns": len(items) - len(selected)}
+
+
+def build_tables_schema(catalog, ranked_tables: list, budget: int) -> tuple:
+    """
+    Esquema do prompt de assistência de dados: blocos das tabelas na ordem de
+    'ranked_tables' (recuperação; as demais depois, na ordem do catálogo) enquanto
+    couberem em 'budget' tokens (0 = todas). As tabelas que ficam de fora aparecem só
+    pelo nome. Retorna (texto, estatísticas de tokens).
+    """
+    order = [t for t in ranked_tables if t in catalog] + [t for t in catalog if t not in ranked_tables]
+    blocks = {name: table_fragment(catalog[name]) for name in order}
+    costs = {name: count_tokens(block) for name, block in blocks.items()}
+
+    included, used = [], 0
+    for name in order:
+        if not included or not budget or used + costs[name] <= budget:
+            included.append(name)
+            used += costs[name]
+
+    schema_string = "".join(blocks[name] for name in included)
+    omitted = [name for name in order if name not in included]
+    if omitted:
+        others = f"Outras tabelas (sem detalhes): {', '.join(omitted)}\n\n"
+        schema_string += others
+        used += count_tokens(others)
+    return schema_string, {"schema_tokens": used, "full_schema_tokens": sum(costs.values()),
+                           "dropped_tables": len(omitted)}
+
+
+def prefill_seconds_per_token():
+    """Tempo médio de prefill por token de prompt medido no backend (None sem medição)."""
+    stats = local_llm.get_generation_stats().values()
+    tokens = sum(s.get("prefill_tokens", 0) for s in stats)
+    return sum(s.get("prefill_seconds", 0.0) for s in stats) / tokens if tokens else None
+
+
+def record(kind: str, stats: dict) -> dict:
+    """Acumula as estatísticas de um prompt e retorna a economia dele (tokens e prefill estimado)."""
+    saved = stats["full_schema_tokens"] - stats["schema_tokens"]
+    with _stats_lock:
+        totals = _stats.setdefault(kind, {"prompts": 0, "schema_tokens": 0, "full_schema_tokens": 0})
+        totals["prompts"] += 1
+        totals["schema_tokens"] += stats["schema_tokens"]
+        totals["full_schema_tokens"] += stats["full_schema_tokens"]
+    rate = prefill_seconds_per_token()
+    return {"saved_tokens": saved, "prefill_saved_ms": round(1000 * saved * rate, 1) if rate else None}
+
+
+def get_prompt_stats() -> dict:
+    """Por tipo de prompt: tokens de esquema por requisição, com e sem orçamento, e prefill economizado (ms)."""
+    with _stats_lock:
+        totals = {kind: dict(values) for kind, values in _stats.items()}
+    rate = prefill_seconds_per_token()
+    stats = {}
+    for kind, t in totals.items():
+        n = t["prompts"]
+        saved = (t["full_schema_tokens"] - t["schema_tokens"]) / n
+        stats[kind] = {
+            "prompts": n,
+            "schema_tokens_per_request": t["schema_tokens"] / n,
+            "full_schema_tokens_per_request": t["full_schema_tokens"] / n,
+            "saved_tokens_per_request": saved,
+            "prefill_saved_ms_per_request": 1000 * saved * rate if rate else None,
+        }
+    return stats
+
+
+def report() -> str:
+    stats = get_prompt_stats()
+    if not stats:
+        return "Prompts de esquema: nenhum montado."
+    lines = []
+    for kind, s in stats.items():
+        full = s["full_schema_tokens_per_request"]
+        line = (f"Prompts de {kind}: {s['prompts']} | esquema {s['schema_tokens_per_request']:.0f} tokens/req "
+                f"(sem orçamento: {full:.0f}, -{s['saved_tokens_per_request'] / full if full else 0:.0%})")
+        if s["prefill_saved_ms_per_request"] is not None:
+            line += f" | prefill economizado: ~{s['prefill_saved_ms_per_request']:.0f} ms/req"
+        lines.append(line)
+    return "\n".join(lines)
@@ -0,0 +1,208 @@
+# assistant/query_guard.py
+"""
+Guarda de custo para o SQL gerado pelo LLM.
+
+Antes da execução, a consulta passa por EXPLAIN QUERY PLAN e o plano é comparado
+com o número de linhas de cada tabela (sqlite_stat1). O resultado é uma decisão:
+
+- "allow":  executa como veio;
+- "limit":  varredura completa de uma tabela grande sem agregação; executa com LIMIT;
+- "reject": produto cartesiano ou loop aninhado sem índice caro demais, ou SQL
+            inválido. O campo 'reason' vai de volta ao LLM para uma nova tentativa.
+"""
+import os
+import re
+import threading
+from . import config
+from .executa_sql import get_pool
+
+_SQL_KEYWORDS = {"where", "join", "inner", "left", "right", "full", "outer", "cross", "natural", "on", "using",
+                 "group", "order", "limit", "having", "union", "except", "intersect", "as", "select", "from"}
+
+_row_counts = {}
+_row_counts_lock = threading.Lock()
+_guard_stats = {"allow": 0, "limit": 0, "reject": 0}
+
+
+def get_table_rows(db_file: str = None) -> dict:
+    """
+    Número de linhas por tabela, lido do sqlite_stat1 (gerado pelo ANALYZE) e guardado
+    em memória. Tabelas sem estatística usam MAX(rowid), que também não varre a tabela.
+    """
+    db_file = db_file or config.DB_FILE
+    # A chave inclui o inode: quando o setup_database troca o arquivo, as contagens são relidas
+    key = (db_file, os.stat(db_file).st_ino if os.path.exists(db_file) else None)
+    with _row_counts_lock:
+        if key in _row_counts:
+            return _row_counts[key]
+
+        counts = {}
+        with get_pool(db_file).connection() as conn:
+            tables = [r[0] for r in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")]
+            try:
+                for table, stat in conn.execute("SELECT tbl, stat FROM sqlite_stat1"):
+                    counts[table] = max(counts.get(table, 0), int(str(stat).split()[0]))
+            except Exception:
+                pass  # Banco ainda sem ANALYZE
+            for table in tables:
+                if table not in counts:
+                    counts[table] = conn.execute(f'SELECT COALESCE(MAX(rowid), 0) FROM "{table}"').fetchone()[0]
+        _row_counts[key] = counts
+        return counts
+
+
+def invalidate_row_counts(db_file: str = None):
+    """Descarta as contagens guardadas (chamar depois de recarregar ou analisar o banco)."""
+    with _row_counts_lock:
+        for key in list(_row_counts):
+            if db_file is None or key[0] == db_file:
+                del _row_counts[key]
+
+
+def table_aliases(sql: str) -> dict:
+    """Mapeia alias -> tabela a partir das cláusulas FROM/JOIN (inclusive 'FROM a, b')."""
+    aliases = {}
+    pattern = r'(?:\bfrom|\bjoin|,)\s+["`\[]?(\w+)["`\]]?(?:\s+(?:as\s+)?(\w+))?'
+    for table, alias in re.findall(pattern, sql, re.IGNORECASE):
+        if table.lower() in _SQL_KEYWORDS:
+            continue
+        aliases[table] = table
+        if alias and alias.lower() not in _SQL_KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+
+def _has_join_condition(sql: str, outer: list, inner: str) -> bool:
+    if re.search(r"\busing\s*\(", sql, re.IGNORECASE):
+        return True
+    for name in outer:
+        a, b = re.escape(name), re.escape(inner)
+        if re.search(rf"\b{a}\.\w+\s*=\s*{b}\.\w+|\b{b}\.\w+\s*=\s*{a}\.\w+", sql, re.IGNORECASE):
+            return True
+    return False
+
+
+def _is_aggregate(sql: str) -> bool:
+    return bool(re.search(r"\b(count|sum|avg|min|max|total|group_concat)\s*\(|\bgroup\s+by\b", sql, re.IGNORECASE))
+
+
+def strip_trailing(sql: str) -> str:
+    """Remove comentários ('--' e '/* */') e ';' do fim do SQL, respeitando literais entre aspas."""
+    while True:
+        end, i, quote = 0, 0, None
+        while i < len(sql):
+            ch = sql[i]
+            if quote:
+                if ch == quote:
+                    quote = None
+                end = i + 1
+            elif sql.startswith("--", i):
+                newline = sql.find("\n", i)
+                i = len(sql) if newline < 0 else newline
+                continue
+            elif sql.startswith("/*", i):
+                close = sql.find("*/", i + 2)
+                i = len(sql) if close < 0 else close + 2
+                continue
+            elif not ch.isspace():
+                quote = {"'": "'", '"': '"', "`": "`", "[": "]"}.get(ch)
+                end = i + 1
+            i += 1
+        stripped = sql[:end].rstrip(";").rstrip()
+        if stripped == sql:
+            return sql
+        sql = stripped
+
+
+def _has_limit(sql: str) -> bool:
+    return bool(re.search(r"\blimit\s+\d+(\s*(,|offset)\s*\d+)?\s*;?\s*$", sql, re.IGNORECASE))
+
+
+def analyze_plan(sql: str, plan: list, row_counts: dict) -> list:
+    """
+    Lista os problemas do plano: 'full_scan' (varredura de tabela grande no loop
+    externo), 'unindexed_join' (JOIN resolvido com índice automático ou loop aninhado
+    sem índice) e 'cartesian_product' (loop aninhado sem condição de junção).
+    'plan' são as linhas (id, parent, notused, detail) do EXPLAIN QUERY PLAN.
+    """
+    aliases = table_aliases(sql)
+    issues = []
+    loops_by_parent = {}
+    for _, parent, _, detail in plan:
+        match = re.match(r"(SCAN|SEARCH) (?:TABLE )?(\w+)", detail)
+        if match is None:
+            continue
+        kind, name = match.groups()
+        table = aliases.get(name, name)
+        rows = row_counts.get(table, 0)
+        outer_loops = loops_by_parent.setdefault(parent, [])
+
+        if kind == "SCAN" and not outer_loops:
+            if rows > config.SQL_GUARD_LARGE_TABLE_ROWS:
+                issues.append({"code": "full_scan", "table": table, "rows": rows, "detail": detail})
+        elif kind == "SCAN":
+            # Loop aninhado: a tabela interna é varrida inteira para cada linha do loop externo
+            estimate = rows
+            for _, outer_kind, outer_rows in outer_loops:
+                estimate *= max(outer_rows, 1) if outer_kind == "SCAN" else 1
+            code = ("unindexed_join" if _has_join_condition(sql, [n for n, _, _ in outer_loops], name)
+                    else "cartesian_product")
+            issues.append({"code": code, "table": table, "rows": rows, "estimate": estimate, "detail": detail})
+        elif "AUTOMATIC" in detail and rows > config.SQL_GUARD_LARGE_TABLE_ROWS:
+            issues.append({"code": "unindexed_join", "table": table, "rows": rows, "estimate": rows, "detail": detail})
+
+        outer_loops.append((name, kind, rows))
+    return issues
+
+
+def _describe(issue: dict) -> str:
+    table, rows = issue["table"], issue["rows"]
+    if issue["code"] == "cartesian_product":
+        return (f"produto cartesiano com a tabela '{table}' ({rows} linhas, ~{issue['estimate']} combinações); "
+                f"junte as tabelas por uma coluna de ID (ex.: id_predio, unidade_id)")
+    if issue["code"] == "unindexed_join":
+        return f"JOIN sem índice na tabela '{table}' ({rows} linhas); junte por id_predio ou unidade_id"
+    return f"varredura completa da tabela '{table}' ({rows} linhas)"
+
+
+def check_query(sql: str, db_file: str = None) -> dict:
+    """
+    Decide se o SQL pode ser executado. Retorna um dicionário com 'action' ("allow",
+    "limit" ou "reject"), 'sql' (a consulta a executar, com LIMIT quando for o caso),
+    'reason' (texto para o usuário ou para o LLM) e 'issues' (problemas do plano).
+    """
+    # Sem comentário no fim: o LIMIT acrescentado não pode cair dentro de um "-- ..."
+    sql = strip_trailing(sql)
+    decision = {"action": "allow", "sql": sql, "reason": "", "issues": []}
+
+    try:
+        with get_pool(db_file).connection() as conn:
+            plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    except Exception as e:
+        decision.update(action="reject", reason=f"a consulta não é um SQL válido para este banco: {e}",
+                        issues=[{"code": "invalid_sql", "detail": str(e)}])
+        _guard_stats["reject"] += 1
+        return decision
+
+    issues = analyze_plan(sql, plan, get_table_rows(db_file))
+    decision["issues"] = issues
+    too_expensive = [i for i in issues if i["code"] in ("cartesian_product", "unindexed_join")
+                     and i.get("estimate", 0) > config.SQL_GUARD_MAX_NESTED_ROWS]
+
+    if too_expensive:
+        decision.update(action="reject", reason="; ".join(_describe(i) for i in too_expensive))
+    elif issues and not _is_aggregate(sql) and not _has_limit(sql):
+        decision.update(action="limit", sql=f"{sql} LIMIT {config.SQL_MAX_ROWS}",
+                        reason="; ".join(_describe(i) for i in issues))
+    elif issues:
+        decision["reason"] = "; ".join(_describe(i) for i in issues)
+
+    _guard_stats[decision["action"]] += 1
+    if decision["action"] != "allow":
+        print(f"DEBUG - Guarda de custo: {decision['action']} ({decision['reason']})")
+    return decision
+
+
+def get_guard_stats() -> dict:
+    return dict(_guard_stats)
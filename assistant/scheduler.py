@@ -0,0 +1,150 @@
+# assistant/scheduler.py
+import asyncio
+import time
+from collections import deque
+
+
+class QueueFullError(Exception):
+    """A fila do micro-batcher está cheia; o chamador deve tentar de novo mais tarde."""
+
+
+class MicroBatcher:
+    """
+    Agrupa pedidos concorrentes em micro-lotes.
+
+    Cada pedido entra em uma fila limitada ('max_queue'); um worker retira o primeiro
+    pedido, espera até 'max_wait_ms' por outros (no máximo 'max_batch_size') e chama
+    'process_batch(itens) -> resultados' fora do event loop, no 'executor' indicado.
+    Com a fila cheia, submit() levanta QueueFullError em vez de enfileirar.
+    """
+
+    def __init__(self, name: str, process_batch, executor, max_batch_size: int, max_wait_ms: float, max_queue: int):
+        self.name = name
+        self.process_batch = process_batch
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max_queue
+        self.stats = {"batches": 0, "items": 0, "rejected": 0}
+        self._queue = None
+        self._task = None
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((item, future))
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            raise QueueFullError(self.name)
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Pedidos cancelados enquanto esperavam (ex.: cliente desconectou) saem do lote
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            self.stats["batches"] += 1
+            self.stats["items"] += len(batch)
+            try:
+                results = await loop.run_in_executor(self.executor, self.process_batch, [item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def report(self) -> dict:
+        batches = self.stats["batches"]
+        return dict(self.stats, queue_depth=self.depth,
+                    avg_batch_size=self.stats["items"] / batches if batches else 0.0)
+
+
+class LatencyRecorder:
+    """
+    Guarda as latências mais recentes de cada endpoint e calcula percentis. Só pedidos
+    atendidos entram nos percentis: os recusados (fila cheia ou HTTP 429) e os que
+    terminaram em erro são apenas contados, em 'rejected' e 'errors'.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._samples = {}
+        self._failures = {}
+
+    def record(self, endpoint: str, seconds: float):
+        self._samples.setdefault(endpoint, deque(maxlen=self.window)).append(seconds)
+
+    def record_failure(self, endpoint: str, exc: BaseException):
+        counts = self._failures.setdefault(endpoint, {"rejected": 0, "errors": 0})
+        rejected = isinstance(exc, QueueFullError) or getattr(exc, "status_code", None) == 429
+        counts["rejected" if rejected else "errors"] += 1
+
+    def time(self, endpoint: str):
+        recorder = self
+
+        class _Timer:
+            def __enter__(self):
+                self.start = time.perf_counter()
+                return self
+
+            def __exit__(self, exc_type, exc, traceback):
+                if exc is None:
+                    recorder.record(endpoint, time.perf_counter() - self.start)
+                else:
+                    recorder.record_failure(endpoint, exc)
+                return False
+
+        return _Timer()
+
+    def percentiles(self) -> dict:
+        report = {}
+        for endpoint in {**self._samples, **self._failures}:
+            ordered = sorted(self._samples.get(endpoint, ()))
+            report[endpoint] = {"count": len(ordered), **self._failures.get(endpoint, {"rejected": 0, "errors": 0})}
+            if ordered:
+                pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+                report[endpoint].update(p50_ms=1000 * pick(0.50), p95_ms=1000 * pick(0.95), p99_ms=1000 * pick(0.99))
+        return report
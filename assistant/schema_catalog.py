@@ -0,0 +1,124 @@
+# assistant/schema_catalog.py
+"""
+Catálogo do esquema do banco: colunas, número de linhas e poucas amostras de valores
+por coluna, lidos sob demanda do SQLite. Substitui o carregamento de todas as tabelas
+em DataFrames (executa_sql.get_all_tables_dfs): o custo da subida deixa de depender
+do tamanho das tabelas, porque nenhuma consulta lê mais que config.SCHEMA_SAMPLE_SCAN_ROWS
+linhas. As funções do pipeline aceitam um SchemaCatalog no lugar de 'all_dfs'.
+"""
+import pandas as pd
+from . import config
+from .executa_sql import get_pool
+
+
+def is_internal_table(name: str) -> bool:
+    """Tabelas do SQLite e tabelas auxiliares do Thorr (prefixo '_') ficam fora do catálogo."""
+    return name.startswith("sqlite_") or name.startswith("_")
+
+
+class TableSchema:
+    """
+    Esquema de uma tabela. As amostras e os fragmentos de prompt são gerados na
+    primeira vez que são pedidos e guardados; 'select' cria uma visão com parte das
+    colunas que compartilha o que já foi carregado. 'column_scores' guarda a
+    relevância de cada coluna para a pergunta atual (ver refine_tables_thorr).
+    """
+
+    def __init__(self, name: str, columns: list, row_count: int = 0, db_file: str = None,
+                 samples: dict = None, sample_rows: list = None, fragments: dict = None,
+                 column_scores: dict = None):
+        self.name = name
+        self.columns = list(columns)
+        self.row_count = row_count
+        self.db_file = db_file
+        self._samples = samples if samples is not None else {}
+        self._sample_rows = sample_rows
+        self._fragments = fragments if fragments is not None else {}
+        self.column_scores = column_scores or {}
+
+    def __repr__(self):
+        return f"TableSchema({self.name!r}, {len(self.columns)} colunas, {self.row_count} linhas)"
+
+    def sample_values(self, col: str, n: int = config.SCHEMA_SAMPLE_VALUES) -> list:
+        """Até 'n' valores distintos e não nulos da coluna, como texto."""
+        if col not in self._samples:
+            with get_pool(self.db_file).connection() as conn:
+                # O limite vem antes do filtro de NULL: em colunas esparsas (ou só com NULL) o
+                # filtro primeiro faria a leitura percorrer a tabela inteira
+                rows = conn.execute(
+                    f'SELECT DISTINCT "{col}" FROM (SELECT "{col}" FROM "{self.name}" '
+                    f'LIMIT {config.SCHEMA_SAMPLE_SCAN_ROWS}) '
+                    f'WHERE "{col}" IS NOT NULL LIMIT {config.SCHEMA_SAMPLE_VALUES}'
+                ).fetchall()
+            self._samples[col] = [str(r[0]) for r in rows]
+        return self._samples[col][:n]
+
+    def head(self, n: int = 5) -> pd.DataFrame:
+        """Primeiras linhas da tabela (no máximo 5), só com as colunas desta visão."""
+        if self._sample_rows is None:
+            with get_pool(self.db_file).connection() as conn:
+                cursor = conn.execute(f'SELECT * FROM "{self.name}" LIMIT 5')
+                names = [d[0] for d in cursor.description]
+                self._sample_rows = [dict(zip(names, row)) for row in cursor.fetchall()]
+        return pd.DataFrame(self._sample_rows[:n], columns=self.columns)
+
+    def fragment(self, key, render) -> str:
+        """Fragmento de prompt 'key', gerado por render() uma única vez e compartilhado pelas visões."""
+        if key not in self._fragments:
+            self._fragments[key] = render()
+        return self._fragments[key]
+
+    def select(self, columns, column_scores: dict = None) -> "TableSchema":
+        """Visão com as colunas pedidas, na ordem do esquema."""
+        wanted = set(columns)
+        return TableSchema(self.name, [c for c in self.columns if c in wanted], self.row_count, self.db_file,
+                           samples=self._samples, sample_rows=self._sample_rows, fragments=self._fragments,
+                           column_scores=column_scores)
+
+    @classmethod
+    def from_dataframe(cls, name: str, df: pd.DataFrame) -> "TableSchema":
+        samples = {col: df[col].dropna().astype(str).head(config.SCHEMA_SAMPLE_VALUES).tolist() for col in df.columns}
+        return cls(name, df.columns, len(df), samples=samples, sample_rows=df.head(5).to_dict("records"))
+
+
+class SchemaCatalog(dict):
+    """Dicionário nome da tabela -> TableSchema."""
+
+    @classmethod
+    def from_database(cls, db_file: str = None) -> "SchemaCatalog":
+        """Lê o esquema com PRAGMA table_info; as contagens vêm do sqlite_stat1 (ou MAX(rowid))."""
+        from .query_guard import get_table_rows
+
+        db_file = db_file or config.DB_FILE
+        catalog = cls()
+        try:
+            row_counts = get_table_rows(db_file)
+            with get_pool(db_file).connection() as conn:
+                names = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY rowid")]
+                for name in names:
+                    if is_internal_table(name):
+                        continue
+                    columns = [r[1] for r in conn.execute(f'PRAGMA table_info("{name}")')]
+                    catalog[name] = TableSchema(name, columns, row_counts.get(name, 0), db_file)
+        except Exception as e:
+            print(f"❌ ERRO FATAL: Não foi possível ler o esquema do banco de dados '{db_file}'.")
+            print("   Verifique se o arquivo existe e se o script 'setup_database.py' foi executado.")
+            print(f"   Detalhe do erro: {e}")
+            return catalog
+
+        print(f"Esquema carregado: {len(catalog)} tabelas ({', '.join(f'{t.name}: {t.row_count} linhas' for t in catalog.values())})")
+        return catalog
+
+    @classmethod
+    def from_dataframes(cls, dfs: dict) -> "SchemaCatalog":
+        """Compatibilidade com o formato antigo (dicionário de DataFrames)."""
+        return cls({name: TableSchema.from_dataframe(name, df) for name, df in dfs.items()})
+
+
+def as_catalog(tables) -> SchemaCatalog:
+    """Aceita um SchemaCatalog, um dicionário de TableSchema ou um de DataFrames."""
+    if isinstance(tables, SchemaCatalog):
+        return tables
+    if all(isinstance(t, TableSchema) for t in tables.values()):
+        return SchemaCatalog(tables)
+    return SchemaCatalog.from_dataframes(tables)
@@ -0,0 +1,262 @@
+# assistant/server.py
+"""
+Serviço HTTP assíncrono do Thorr.
+
+Pedidos concorrentes não chamam o modelo diretamente: as chamadas ao LLM e ao
+modelo de embeddings entram em filas (MicroBatcher) e são agrupadas em micro-lotes,
+executados em threads dedicadas, fora do event loop. Com uma fila cheia o serviço
+responde 429. Para testar sem GPU, use THORR_LLM_BACKEND=stub ou passe um 'state'
+pronto para create_app.
+
+Uso: uvicorn assistant.server:app   (ou: python -m assistant.server)
+"""
+import asyncio
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel
+from . import (config, conversation, duckdb_engine, executa_sql, intent_classifier, pipeline, prompt_fragments,
+               query_guard, tracing, value_index)
+from .local_llm import generate_local_responses, get_generation_stats
+from .scheduler import LatencyRecorder, MicroBatcher, QueueFullError
+
+
+class QuestionRequest(BaseModel):
+    question: str
+
+
+class ExecuteRequest(BaseModel):
+    sql: str
+    # Com page_size, a resposta traz só a primeira página e um 'cursor' para as seguintes
+    page_size: Optional[int] = None
+
+
+def load_state() -> dict:
+    """
+    Carrega o esquema, modelo de embeddings, índice FAISS, cache SQL e o LLM, em
+    paralelo (assistant/warmup.py), antes de o serviço aceitar pedidos.
+    """
+    from .warmup import Warmup
+
+    warmup = Warmup().start()
+    state = warmup.wait()
+    warmup.ready.wait()
+    return state
+
+
+def _generate_llm_batch(items: list) -> list:
+    """Processa um micro-lote de (perfil, system_prompt, user_prompt), um generate por perfil."""
+    results = [None] * len(items)
+    by_profile = {}
+    for i, (profile, system_prompt, user_prompt) in enumerate(items):
+        by_profile.setdefault(profile, []).append(i)
+    for profile, positions in by_profile.items():
+        responses = generate_local_responses([items[i][1:] for i in positions], config.CHAT_MODEL, profile=profile,
+                                             batch_size=config.SERVER_MAX_BATCH_SIZE)
+        for i, response in zip(positions, responses):
+            results[i] = response
+    return results
+
+
+def create_app(state: dict = None) -> FastAPI:
+    """
+    Cria a aplicação. 'state' (chaves de load_state) permite injetar tabelas e
+    modelos já carregados, ou falsos em testes; sem ele, o setup roda na subida.
+    """
+    latencies = LatencyRecorder()
+    # Uma thread por modelo: o GPU/CPU processa um lote por vez, e o event loop fica livre
+    llm_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="thorr-llm")
+    embedding_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="thorr-embeddings")
+    batchers = {}
+    cursors = {}
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        tracing.enable_metrics()
+        app.state.thorr = state if state is not None else await asyncio.to_thread(load_state)
+        model = app.state.thorr["model"]
+
+        batchers["llm"] = MicroBatcher("llm", _generate_llm_batch, llm_executor, config.SERVER_MAX_BATCH_SIZE,
+                                       config.SERVER_MAX_WAIT_MS, config.SERVER_MAX_QUEUE)
+        batchers["embeddings"] = MicroBatcher("embeddings", lambda questions: list(model.encode(
+                                                  [f"query: {q}" for q in questions], batch_size=config.EMBEDDING_BATCH_SIZE)),
+                                              embedding_executor, config.EMBEDDING_BATCH_SIZE,
+                                              config.SERVER_MAX_WAIT_MS, config.SERVER_MAX_QUEUE)
+        for batcher in batchers.values():
+            await batcher.start()
+        yield
+        for batcher in batchers.values():
+            await batcher.stop()
+        for pager in cursors.values():
+            pager.close()
+        llm_executor.shutdown(wait=False)
+        embedding_executor.shutdown(wait=False)
+
+    app = FastAPI(title="Thorr", lifespan=lifespan)
+
+    @app.exception_handler(QueueFullError)
+    async def queue_full_handler(request, exc):
+        return JSONResponse(status_code=429, content={"detail": f"Fila '{exc}' cheia, tente novamente."},
+                            headers={"Retry-After": "1"})
+
+    async def embed(question: str):
+        return (await batchers["embeddings"].submit(question)).reshape(1, -1)
+
+    async def llm(profile: str, system_prompt: str, user_prompt: str) -> str:
+        return await batchers["llm"].submit((profile, system_prompt, user_prompt))
+
+    async def classify(question: str, question_embedding):
+        intent, confidence = intent_classifier.classify_intent_embedding(question, app.state.thorr["model"],
+                                                                         question_embedding)
+        if confidence >= config.INTENT_CONFIDENCE_THRESHOLD:
+            return intent, confidence, "embeddings"
+        response = await llm("json", intent_classifier.INTENT_SYSTEM_MESSAGE,
+                             intent_classifier.build_intent_user_message(question))
+        try:
+            return intent_classifier.parse_intent_response(response), confidence, "llm"
+        except ValueError:
+            return "UNKNOWN", confidence, "llm"
+
+    @app.post("/classify")
+    async def classify_endpoint(request: QuestionRequest):
+        with latencies.time("/classify"):
+            intent, confidence, source = await classify(request.question, await embed(request.question))
+            return {"intent": intent, "confidence": confidence, "source": source}
+
+    @app.post("/text-to-sql")
+    async def text_to_sql_endpoint(request: QuestionRequest):
+        with latencies.time("/text-to-sql"):
+            start_time = time.perf_counter()
+            s = app.state.thorr
+            question_embedding = await embed(request.question)
+
+            cached_sql = s["sql_cache"].lookup(request.question, question_embedding) if s.get("sql_cache") else None
+            if cached_sql is not None:
+                return {"sql": cached_sql, "tables": None, "cached": True}
+
+            retrieved_tables, prompt = await asyncio.to_thread(
+                pipeline.prepare_sql_generation, request.question, s["model"], s["index"], s["table_names"],
+                s["dfs"], s.get("column_catalog"), question_embedding)
+            sql_query = pipeline.clean_sql_response(await llm("sql", config.SQL_GENERATION_SYSTEM_PROMPT, prompt))
+            if config.SQL_GUARD_ENABLED:
+                decision = await asyncio.to_thread(query_guard.check_query, sql_query)
+                if decision["action"] == "reject":
+                    retry_prompt = pipeline.build_sql_retry_prompt(prompt, sql_query, decision["reason"])
+                    sql_query = pipeline.clean_sql_response(
+                        await llm("sql", config.SQL_GENERATION_SYSTEM_PROMPT, retry_prompt))
+
+            if s.get("sql_cache"):
+                s["sql_cache"].store(request.question, sql_query, question_embedding,
+                                     latency=time.perf_counter() - start_time)
+            return {"sql": sql_query, "tables": retrieved_tables, "cached": False}
+
+    def page_response(page, pager: executa_sql.QueryPager, cursor_id: str = None) -> dict:
+        rows = [] if page is None else page.astype(object).where(page.notna(), None).values.tolist()
+        return {"columns": pager.columns or [], "rows": rows, "cursor": None if pager.done else cursor_id,
+                **pager.report()}
+
+    def expire_cursors():
+        now = time.time()
+        for cursor_id, pager in list(cursors.items()):
+            if pager.done or now - pager.last_used > config.SQL_CURSOR_TTL_SECONDS:
+                pager.close()
+                del cursors[cursor_id]
+
+    def confirm_cached(sql: str):
+        # O SQL gerado em /text-to-sql só entra no cache depois de executar sem erro
+        sql_cache = app.state.thorr.get("sql_cache")
+        if sql_cache is not None:
+            sql_cache.confirm(sql)
+
+    @app.post("/execute")
+    async def execute_endpoint(request: ExecuteRequest):
+        with latencies.time("/execute"):
+            if request.page_size:
+                expire_cursors()
+                if len(cursors) >= config.SQL_MAX_OPEN_CURSORS:
+                    raise HTTPException(status_code=429, detail="Cursores demais abertos; leia até o fim ou feche um.",
+                                        headers={"Retry-After": "1"})
+                pager = await asyncio.to_thread(executa_sql.open_query, request.sql, request.page_size)
+                if isinstance(pager, str):
+                    raise HTTPException(status_code=400, detail=pager)
+                try:
+                    page = await asyncio.to_thread(pager.fetch_page)
+                except Exception as e:
+                    pager.close()
+                    raise HTTPException(status_code=400, detail=f"Erro ao executar a query: {e}")
+                confirm_cached(request.sql)
+                cursor_id = uuid.uuid4().hex
+                if not pager.done:
+                    cursors[cursor_id] = pager
+                return page_response(page, pager, cursor_id)
+
+            result = await asyncio.to_thread(executa_sql.execute_query, request.sql)
+            if isinstance(result, str):
+                raise HTTPException(status_code=400, detail=result)
+            confirm_cached(request.sql)
+            return {"columns": list(result.columns), "rows": result.astype(object).where(result.notna(), None).values.tolist(),
+                    "truncated": result.attrs.get("truncated", False), "duration": result.attrs.get("duration"),
+                    "engine": result.attrs.get("engine")}
+
+    @app.get("/execute/{cursor_id}")
+    async def fetch_page_endpoint(cursor_id: str):
+        """Próxima página de um resultado aberto com page_size; 'cursor' volta None na última."""
+        with latencies.time("/execute/cursor"):
+            expire_cursors()
+            pager = cursors.get(cursor_id)
+            if pager is None:
+                raise HTTPException(status_code=404, detail="Cursor inexistente, expirado ou já lido até o fim.")
+            try:
+                page = await asyncio.to_thread(pager.fetch_page)
+            except Exception as e:
+                pager.close()
+                cursors.pop(cursor_id, None)
+                raise HTTPException(status_code=400, detail=f"Erro ao executar a query: {e}")
+            if pager.done:
+                cursors.pop(cursor_id, None)
+            return page_response(page, pager, cursor_id)
+
+    @app.delete("/execute/{cursor_id}")
+    async def close_cursor_endpoint(cursor_id: str):
+        pager = cursors.pop(cursor_id, None)
+        if pager is not None:
+            await asyncio.to_thread(pager.close)
+        return {"closed": pager is not None}
+
+    @app.post("/chat")
+    async def chat_endpoint(request: QuestionRequest):
+        with latencies.time("/chat"):
+            return {"answer": await llm("chat", conversation.SYSTEM_MESSAGE, request.question)}
+
+    @app.get("/metrics")
+    async def metrics_endpoint():
+        return {
+            "latency": latencies.percentiles(),
+            "batchers": {name: batcher.report() for name, batcher in batchers.items()},
+            "generation": get_generation_stats(),
+            "sql": executa_sql.get_query_stats(),
+            "guard": query_guard.get_guard_stats(),
+            "engine": duckdb_engine.get_engine_stats(),
+            "open_cursors": len(cursors),
+            "value_index": value_index.get_value_index_stats(),
+            "prompts": prompt_fragments.get_prompt_stats(),
+        }
+
+    @app.get("/metrics/prometheus", response_class=PlainTextResponse)
+    async def prometheus_endpoint():
+        # Histogramas de latência por etapa (spans de assistant/tracing.py) e tokens do LLM
+        return tracing.prometheus_text()
+
+    return app
+
+
+app = create_app()
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host=config.SERVER_HOST, port=config.SERVER_PORT)
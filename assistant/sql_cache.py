@@ -0,0 +1,216 @@
+# assistant/sql_cache.py
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from . import config, value_index
+from .pipeline import normalize_text
+
+
+def _normalize_question(question: str) -> str:
+    # normalize_text + remoção de pontuação e espaços repetidos
+    text = re.sub(r"[^\w\s]", " ", normalize_text(question))
+    return " ".join(text.split())
+
+
+def _literals(normalized: str):
+    """
+    O que distingue duas perguntas parecidas no SQL: os valores existentes citados
+    (value_index: cidades, incorporadoras, bairros...) ou, sem o índice de valores,
+    as palavras fora das stopwords.
+    """
+    if config.VALUE_INDEX_ENABLED and value_index.index_available():
+        matches = value_index.lookup_values(normalized)
+        return {(t, c, v) for t, cols in matches.items() for c, values in cols.items() for v in values}
+    return {term for term in value_index.question_terms(normalized) if " " not in term}
+
+
+def _unit_vector(embedding) -> np.ndarray:
+    vector = np.asarray(embedding, dtype="float32").reshape(-1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class SemanticSQLCache:
+    """
+    Cache pergunta -> SQL na frente do run_sql_pipeline.
+
+    Um acerto exato acontece quando o texto normalizado já está no cache; um acerto
+    semântico, quando a similaridade de cosseno entre os embeddings da pergunta fica
+    acima de 'similarity_threshold' e as duas citam os mesmos números e literais
+    (_literals). O SQL gerado só vira entrada depois de executar sem erro
+    (store, depois confirm). As entradas saem por LRU ('max_entries') e por
+    idade ('ttl_seconds'), podem ser persistidas em SQLite ('db_path') e são todas
+    descartadas quando o fingerprint do esquema do banco muda.
+    """
+
+    def __init__(self, schema_fingerprint: str = "",
+                 max_entries: int = config.SQL_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = config.SQL_CACHE_TTL_SECONDS,
+                 similarity_threshold: float = config.SQL_CACHE_SIMILARITY_THRESHOLD,
+                 db_path: str = config.SQL_CACHE_DB):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.schema_fingerprint = schema_fingerprint
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "latency_saved": 0.0}
+
+        self._entries = OrderedDict()
+        # SQL gerado, mas ainda não executado com sucesso: SQL -> [(pergunta normalizada, entrada)]
+        self._pending = OrderedDict()
+        self._matrix, self._matrix_keys = None, []
+        self._lock = threading.Lock()
+
+        self._conn = None
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS sql_cache (
+                normalized TEXT PRIMARY KEY, question TEXT, sql TEXT, embedding BLOB,
+                created REAL, latency REAL, schema_fingerprint TEXT)""")
+            self._conn.commit()
+            self._load_persisted()
+
+    # --- Persistência ---------------------------------------------------------
+
+    def _load_persisted(self):
+        cutoff = time.time() - self.ttl_seconds if self.ttl_seconds else 0
+        self._conn.execute("DELETE FROM sql_cache WHERE schema_fingerprint != ? OR created < ?",
+                           (self.schema_fingerprint, cutoff))
+        self._conn.commit()
+        rows = self._conn.execute(
+            "SELECT normalized, question, sql, embedding, created, latency FROM sql_cache ORDER BY created"
+        ).fetchall()
+        for normalized, question, sql, blob, created, latency in rows[-self.max_entries:]:
+            embedding = np.frombuffer(blob, dtype="float32") if blob else None
+            self._entries[normalized] = {"question": question, "sql": sql, "embedding": embedding,
+                                         "created": created, "latency": latency}
+
+    def _persist(self, normalized: str, entry: dict):
+        if self._conn is None:
+            return
+        blob = entry["embedding"].tobytes() if entry["embedding"] is not None else None
+        self._conn.execute("INSERT OR REPLACE INTO sql_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                           (normalized, entry["question"], entry["sql"], blob, entry["created"],
+                            entry["latency"], self.schema_fingerprint))
+        self._conn.commit()
+
+    def _forget(self, normalized: str):
+        self._entries.pop(normalized, None)
+        self._matrix = None
+        if self._conn is not None:
+            self._conn.execute("DELETE FROM sql_cache WHERE normalized = ?", (normalized,))
+            self._conn.commit()
+
+    # --- API ------------------------------------------------------------------
+
+    def set_schema_fingerprint(self, schema_fingerprint: str):
+        """
+        Invalida todo o cache se o esquema do banco mudou. O warmup a chama quando o pool
+        de conexões detecta que o arquivo do banco foi substituído.
+        """
+        with self._lock:
+            if schema_fingerprint == self.schema_fingerprint:
+                return
+            print("DEBUG - Cache SQL: esquema do banco mudou; entradas descartadas.")
+            self.schema_fingerprint = schema_fingerprint
+            self._entries.clear()
+            self._pending.clear()
+            self._matrix = None
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM sql_cache")
+                self._conn.commit()
+
+    def _expired(self, entry: dict) -> bool:
+        return bool(self.ttl_seconds) and time.time() - entry["created"] > self.ttl_seconds
+
+    def _nearest(self, vector: np.ndarray, normalized: str):
+        if self._matrix is None:
+            self._matrix_keys = [k for k, e in self._entries.items() if e["embedding"] is not None]
+            self._matrix = (np.vstack([self._entries[k]["embedding"] for k in self._matrix_keys])
+                            if self._matrix_keys else None)
+        if self._matrix is None:
+            return None, 0.0
+        similarities = self._matrix @ vector
+        best = int(np.argmax(similarities))
+        key = self._matrix_keys[best]
+        # Números mudam o SQL ("2 quartos" x "3 quartos"): só aceita vizinho com os mesmos números
+        if re.findall(r"\d+", key) != re.findall(r"\d+", normalized):
+            return None, 0.0
+        similarity = float(similarities[best])
+        # Entidades também ("prédios em porto alegre" x "prédios em canoas" ficam acima de 0.97 no e5)
+        if similarity >= self.similarity_threshold and _literals(key) != _literals(normalized):
+            return None, 0.0
+        return key, similarity
+
+    def lookup(self, question: str, question_embedding=None):
+        """Retorna o SQL guardado para a pergunta (ou uma paráfrase dela), ou None."""
+        normalized = _normalize_question(question)
+        with self._lock:
+            entry = self._entries.get(normalized)
+            if entry is not None and self._expired(entry):
+                self._forget(normalized)
+                entry = None
+
+            if entry is not None:
+                self.stats["exact_hits"] += 1
+            elif question_embedding is not None and self.similarity_threshold:
+                key, similarity = self._nearest(_unit_vector(question_embedding), normalized)
+                if key is not None and similarity >= self.similarity_threshold and not self._expired(self._entries[key]):
+                    normalized, entry = key, self._entries[key]
+                    self.stats["semantic_hits"] += 1
+                    print(f"DEBUG - Cache SQL: pergunta similar a '{entry['question']}' (similaridade {similarity:.3f})")
+
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end(normalized)
+            self.stats["latency_saved"] += entry["latency"]
+            return entry["sql"]
+
+    def store(self, question: str, sql: str, question_embedding=None, latency: float = 0.0):
+        """
+        Registra o SQL gerado e quanto tempo o pipeline levou para gerá-lo. Ele fica
+        pendente e só entra no cache com confirm(sql), depois de executado sem erro.
+        """
+        normalized = _normalize_question(question)
+        entry = {
+            "question": question,
+            "sql": sql,
+            "embedding": _unit_vector(question_embedding) if question_embedding is not None else None,
+            "created": time.time(),
+            "latency": latency,
+        }
+        with self._lock:
+            self._pending.setdefault(sql, []).append((normalized, entry))
+            self._pending.move_to_end(sql)
+            while len(self._pending) > self.max_entries:
+                self._pending.popitem(last=False)
+
+    def confirm(self, sql: str):
+        """Guarda no cache as perguntas pendentes que geraram 'sql' (chamado quando ele executou sem erro)."""
+        with self._lock:
+            for normalized, entry in self._pending.pop(sql, []):
+                self._add(normalized, entry)
+
+    def _add(self, normalized: str, entry: dict):
+        # Chamado com self._lock adquirido
+        self._entries[normalized] = entry
+        self._entries.move_to_end(normalized)
+        self._matrix = None
+        self._persist(normalized, entry)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._forget(oldest)
+
+    def report(self) -> str:
+        hits = self.stats["exact_hits"] + self.stats["semantic_hits"]
+        total = hits + self.stats["misses"]
+        hit_rate = hits / total if total else 0.0
+        return (f"Cache SQL: {hits}/{total} acertos ({hit_rate:.0%}; "
+                f"{self.stats['exact_hits']} exatos, {self.stats['semantic_hits']} semânticos), "
+                f"{self.stats['latency_saved']:.1f}s de LLM economizados, {len(self._entries)} entradas.")
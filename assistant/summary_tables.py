@@ -0,0 +1,153 @@
+# assistant/summary_tables.py
+"""
+Tabelas derivadas do histórico de preços (units_updates), mantidas pelo setup_database:
+
+- units_latest:      a atualização mais recente de cada unidade, com o id_predio;
+- buildings_summary: por prédio, unidades, disponibilidade e preço mínimo/médio/máximo;
+- cities_summary:    o mesmo por cidade.
+
+Perguntas sobre o preço ou a disponibilidade atuais deixam de precisar da subconsulta
+"última linha por unidade" sobre o histórico inteiro. A atualização é incremental:
+a maior id de atualização já processada (high-water mark) fica em '_summary_state', e
+só as unidades com linhas novas, e os prédios e cidades delas, são recalculados.
+"""
+import time
+from . import config
+
+SUMMARY_TABLES = ["units_latest", "buildings_summary", "cities_summary"]
+STATE_TABLE = "_summary_state"
+CITY_COLUMN = "cidade_endereço"
+
+
+def _q(name: str) -> str:
+    return f'"{name}"'
+
+
+def _columns(conn, table: str) -> list:
+    return [r[1] for r in conn.execute(f"PRAGMA table_info({_q(table)})")]
+
+
+def _table_exists(conn, table: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name = ?", (table,)).fetchone() is not None
+
+
+def _metric_expressions(available_columns: list, alias: str = "") -> dict:
+    """Expressões de agregação sobre units_latest; colunas ausentes viram NULL."""
+    c = config.UNITS_UPDATES_COLUMNS
+    col = lambda key: f"{alias}{_q(c[key])}" if c[key] in available_columns else None
+    price, discount, availability, date = col("price"), col("discount"), col("availability"), col("date")
+    values = ", ".join(f"'{v}'" for v in config.UNIT_AVAILABLE_VALUES)
+    # Coluna 0/1 numérica (REAL quando o pandas encontra NULLs: 1.0 vira '1.0' em texto) compara como número
+    available = (f"CASE WHEN typeof({availability}) IN ('integer', 'real') THEN {availability} = 1 "
+                 f"ELSE CAST({availability} AS TEXT) IN ({values}) END")
+    return {
+        "total_unidades": "COUNT(*)",
+        "unidades_disponiveis": f"SUM(CASE WHEN {available} THEN 1 ELSE 0 END)" if availability else "NULL",
+        "preco_min": f"MIN({price})" if price else "NULL",
+        "preco_medio": f"AVG({price})" if price else "NULL",
+        "preco_max": f"MAX({price})" if price else "NULL",
+        "desconto_medio": f"AVG({discount})" if discount else "NULL",
+        "ultima_atualizacao": f"MAX({date})" if date else "NULL",
+    }
+
+
+def _read_state(conn):
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {STATE_TABLE} (name TEXT PRIMARY KEY, high_water, rows_covered INTEGER)")
+    return conn.execute(f"SELECT high_water, rows_covered FROM {STATE_TABLE} WHERE name = 'units_updates'").fetchone()
+
+
+def _create_tables(conn, updates_columns: list):
+    """Recria as três tabelas vazias (atualização completa)."""
+    unit, uid = config.UNITS_UPDATES_COLUMNS["unit"], config.UNITS_ID_COLUMN
+    extra = "" if "id_predio" in updates_columns else ", u.id_predio AS id_predio"
+    for table in SUMMARY_TABLES:
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+
+    conn.execute(f"CREATE TABLE units_latest AS SELECT uu.*{extra} FROM units_updates uu "
+                 f"LEFT JOIN units u ON u.{_q(uid)} = uu.{_q(unit)} WHERE 0")
+    conn.execute(f"CREATE UNIQUE INDEX idx_units_latest_unit ON units_latest ({_q(unit)})")
+    conn.execute("CREATE INDEX idx_units_latest_id_predio ON units_latest (id_predio)")
+
+    metrics = ", ".join(_metric_expressions([]).keys())
+    conn.execute(f"CREATE TABLE buildings_summary (id_predio PRIMARY KEY, {metrics})")
+    conn.execute(f"CREATE TABLE cities_summary ({_q(CITY_COLUMN)} PRIMARY KEY, total_predios, {metrics})")
+
+
+def refresh_summary_tables(conn, changed_tables=(), force: bool = False) -> dict:
+    """
+    Atualiza units_latest, buildings_summary e cities_summary. Recalcula tudo se
+    'force', na primeira vez, se units ou buildings foram recarregadas ou se linhas
+    antigas do histórico mudaram; senão processa só as atualizações novas.
+    Retorna {"mode", "new_rows", "units", "seconds"}.
+    """
+    start = time.perf_counter()
+    if not all(_table_exists(conn, t) for t in ("units_updates", "units", "buildings")):
+        print("⚠️ Tabelas de resumo não atualizadas: faltam units_updates, units ou buildings no banco.")
+        return {"mode": "skipped", "new_rows": 0, "units": 0, "seconds": 0.0}
+
+    c = config.UNITS_UPDATES_COLUMNS
+    update_id, unit = _q(c["id"]), _q(c["unit"])
+    updates_columns = _columns(conn, "units_updates")
+    state = _read_state(conn)
+
+    full = (force or state is None or state[0] is None or bool({"units", "buildings"} & set(changed_tables))
+            or not all(_table_exists(conn, t) for t in SUMMARY_TABLES))
+    # O histórico só cresce por carga do arquivo (sem DELETE): MAX(rowid) é o total de linhas sem contar a tabela
+    total_rows = conn.execute("SELECT MAX(rowid) FROM units_updates").fetchone()[0] or 0
+    high_water, rows_covered = (None, 0) if full else state
+    new_filter = "" if high_water is None else f"WHERE {update_id} > ?"
+    params = () if high_water is None else (high_water,)
+    new_rows = conn.execute(f"SELECT COUNT(*) FROM units_updates {new_filter}", params).fetchone()[0]
+    if not full and total_rows - new_rows != rows_covered:
+        # O arquivo do histórico foi recarregado e as linhas antigas mudaram: recalcula tudo
+        full, high_water, rows_covered, new_filter, params = True, None, 0, "", ()
+        new_rows = total_rows
+    if full:
+        _create_tables(conn, updates_columns)
+
+    # 1. Unidades com atualizações novas e a linha mais recente de cada uma. No incremental,
+    # '+' no GROUP BY impede o planejador de varrer o índice (unidade, id) inteiro para
+    # agrupar: as linhas novas saem da busca por intervalo no índice do id
+    group_by = unit if high_water is None else f"+{unit}"
+    conn.execute("DROP TABLE IF EXISTS temp._touched_units")
+    conn.execute(f"CREATE TEMP TABLE _touched_units AS SELECT {unit} AS unit_key, MAX({update_id}) AS max_id "
+                 f"FROM units_updates {new_filter} GROUP BY {group_by}", params)
+
+    extra = "" if "id_predio" in updates_columns else ", u.id_predio"
+    conn.execute(f"INSERT OR REPLACE INTO units_latest SELECT uu.*{extra} FROM units_updates uu "
+                 f"JOIN temp._touched_units t ON uu.{update_id} = t.max_id "
+                 f"LEFT JOIN units u ON u.{_q(config.UNITS_ID_COLUMN)} = uu.{unit}")
+
+    # 2. Prédios e cidades afetados
+    conn.execute("DROP TABLE IF EXISTS temp._touched_buildings")
+    conn.execute("CREATE TEMP TABLE _touched_buildings AS SELECT DISTINCT l.id_predio FROM units_latest l "
+                 f"JOIN temp._touched_units t ON l.{unit} = t.unit_key")
+    latest_columns = _columns(conn, "units_latest")
+    metrics = _metric_expressions(latest_columns, alias="l.")
+    metric_sql = ", ".join(metrics.values())
+
+    conn.execute("DELETE FROM buildings_summary WHERE id_predio IN (SELECT id_predio FROM temp._touched_buildings)")
+    conn.execute(f"INSERT INTO buildings_summary SELECT l.id_predio, {metric_sql} FROM units_latest l "
+                 "WHERE l.id_predio IN (SELECT id_predio FROM temp._touched_buildings) GROUP BY l.id_predio")
+
+    city = _q(CITY_COLUMN)
+    if CITY_COLUMN in _columns(conn, "buildings"):
+        touched_cities = (f"SELECT DISTINCT b.{city} FROM buildings b "
+                          "JOIN temp._touched_buildings t ON b.id_predio = t.id_predio")
+        conn.execute(f"DELETE FROM cities_summary WHERE {city} IN ({touched_cities})")
+        conn.execute(f"INSERT INTO cities_summary SELECT b.{city}, COUNT(DISTINCT l.id_predio), {metric_sql} "
+                     f"FROM units_latest l JOIN buildings b ON b.id_predio = l.id_predio "
+                     f"WHERE b.{city} IN ({touched_cities}) GROUP BY b.{city}")
+
+    touched = conn.execute("SELECT COUNT(*) FROM temp._touched_units").fetchone()[0]
+    new_high_water = conn.execute(f"SELECT MAX({update_id}) FROM units_updates").fetchone()[0]
+    conn.execute(f"INSERT OR REPLACE INTO {STATE_TABLE} VALUES ('units_updates', ?, ?)",
+                 (new_high_water, rows_covered + new_rows))
+    conn.execute("DROP TABLE temp._touched_units")
+    conn.execute("DROP TABLE temp._touched_buildings")
+
+    result = {"mode": "full" if full else "incremental", "new_rows": new_rows, "units": touched,
+              "seconds": time.perf_counter() - start}
+    print(f"✅ Tabelas de resumo ({result['mode']}): {new_rows} atualizações novas, {touched} unidades "
+          f"recalculadas em {result['seconds']:.2f}s.")
+    return result
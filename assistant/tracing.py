@@ -0,0 +1,251 @@
+# assistant/tracing.py
+"""
+Rastreamento leve, em processo, das etapas do Thorr.
+
+Cada etapa roda dentro de um span (`with tracing.span("retrieve_tables") as s:`), com
+nome, duração, atributos (tabelas recuperadas, tokens do prompt e gerados...) e o
+span pai, que liga as etapas de uma mesma pergunta num trace. Ao terminar, o span vai
+para os sinks ativos:
+
+- JsonLinesSink (config.TRACE_FILE): um span por linha;
+- MetricsSink (config.TRACE_METRICS_FILE e /metrics/prometheus no servidor):
+  histogramas de latência por etapa e contadores de tokens, no formato texto do
+  Prometheus;
+- console (run_sql_pipeline(verbose=True) ou `with tracing.console():`): as
+  mensagens DEBUG de cada etapa, no lugar dos prints fixos.
+
+Sem nenhum sink ativo, span() devolve um objeto vazio compartilhado: o custo por
+etapa é uma checagem de lista e de uma ContextVar.
+"""
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from . import config
+
+# Limites (segundos) dos baldes dos histogramas de latência
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Atributos com texto longo: só vão para o TRACE_FILE com config.TRACE_INCLUDE_PROMPTS
+_LONG_ATTRIBUTES = {"prompt"}
+
+_current = contextvars.ContextVar("thorr_span", default=None)
+_console = contextvars.ContextVar("thorr_console", default=False)
+_sinks = []
+_span_ids = itertools.count(1)
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "duration", "attrs", "error")
+
+    def __init__(self, name: str, parent, attrs: dict, start: float = None):
+        self.name = name
+        self.span_id = next(_span_ids)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex[:16]
+        self.start = time.time() if start is None else start
+        self.duration = None
+        self.attrs = attrs
+        self.error = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self, include_long: bool = True) -> dict:
+        attrs = self.attrs if include_long else {k: v for k, v in self.attrs.items() if k not in _LONG_ATTRIBUTES}
+        return {"trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id, "name": self.name,
+                "start": self.start, "duration_ms": 1000 * self.duration, "error": self.error, "attrs": attrs}
+
+
+class _NoopSpan:
+    """Span usado quando o rastreamento está desligado: não mede nem guarda nada."""
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def enabled() -> bool:
+    return bool(_sinks) or _console.get()
+
+
+def span(name: str, **attrs):
+    """Context manager que mede uma etapa; os atributos podem ser completados com .set()."""
+    if not _sinks and not _console.get():
+        return _NOOP_SPAN
+    return _active_span(name, attrs)
+
+
+@contextmanager
+def _active_span(name: str, attrs: dict):
+    current = Span(name, _current.get(), attrs)
+    token = _current.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.duration = time.perf_counter() - start
+        _current.reset(token)
+        _emit(current)
+
+
+def record(name: str, seconds: float, **attrs):
+    """Registra uma etapa já medida (ex.: prefill e decode do LLM), como filha do span atual."""
+    if not _sinks and not _console.get():
+        return
+    finished = Span(name, _current.get(), attrs, start=time.time() - seconds)
+    finished.duration = seconds
+    _emit(finished)
+
+
+def _emit(finished: Span):
+    for sink in list(_sinks):
+        try:
+            sink(finished)
+        except Exception as e:
+            print(f"⚠️ Falha no sink de rastreamento {type(sink).__name__}: {e}")
+    if _console.get():
+        console_sink(finished)
+
+
+def add_sink(sink):
+    if sink not in _sinks:
+        _sinks.append(sink)
+
+
+def remove_sink(sink):
+    if sink in _sinks:
+        _sinks.remove(sink)
+
+
+@contextmanager
+def console(active: bool = True):
+    """Imprime os spans terminados neste contexto (thread ou tarefa) como mensagens DEBUG."""
+    if not active:
+        yield
+        return
+    token = _console.set(True)
+    try:
+        yield
+    finally:
+        _console.reset(token)
+
+
+def console_sink(finished: Span):
+    short = {k: v for k, v in finished.attrs.items() if not (isinstance(v, str) and "\n" in v)}
+    line = f"DEBUG - [{finished.name}] {1000 * finished.duration:.1f} ms"
+    if short:
+        line += " | " + ", ".join(f"{k}={v}" for k, v in short.items())
+    if finished.error:
+        line += f" | erro: {finished.error}"
+    print(line)
+    for key, value in finished.attrs.items():
+        if key not in short:
+            print("-" * 50)
+            print(value)
+            print("-" * 50)
+
+
+class JsonLinesSink:
+    """Acrescenta cada span terminado, como uma linha JSON, ao arquivo 'path'."""
+
+    def __init__(self, path: str, include_long: bool = False):
+        self.path = path
+        self.include_long = include_long
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def __call__(self, finished: Span):
+        line = json.dumps(finished.to_dict(self.include_long), ensure_ascii=False, default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class MetricsSink:
+    """
+    Histograma de latência e contagem de erros por nome de span, mais os tokens
+    (atributos prompt_tokens e new_tokens) somados por span. Com 'path', o texto do
+    Prometheus é regravado no arquivo a cada span raiz (uma pergunta) terminado.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._errors = {}
+        self._tokens = {}
+
+    def __call__(self, finished: Span):
+        with self._lock:
+            counts = self._histograms.setdefault(finished.name, {"buckets": [0] * len(LATENCY_BUCKETS),
+                                                                 "sum": 0.0, "count": 0})
+            for i, limit in enumerate(LATENCY_BUCKETS):
+                if finished.duration <= limit:
+                    counts["buckets"][i] += 1
+            counts["sum"] += finished.duration
+            counts["count"] += 1
+            if finished.error:
+                self._errors[finished.name] = self._errors.get(finished.name, 0) + 1
+            for kind in ("prompt_tokens", "new_tokens"):
+                if isinstance(finished.attrs.get(kind), int):
+                    key = (finished.name, kind)
+                    self._tokens[key] = self._tokens.get(key, 0) + finished.attrs[kind]
+        if self.path and finished.parent_id is None:
+            self.write(self.path)
+
+    def prometheus_text(self) -> str:
+        lines = ["# HELP thorr_stage_duration_seconds Latência de cada etapa do Thorr.",
+                 "# TYPE thorr_stage_duration_seconds histogram"]
+        with self._lock:
+            for name, counts in sorted(self._histograms.items()):
+                for limit, count in zip(LATENCY_BUCKETS, counts["buckets"]):
+                    lines.append(f'thorr_stage_duration_seconds_bucket{{stage="{name}",le="{limit}"}} {count}')
+                lines.append(f'thorr_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {counts["count"]}')
+                lines.append(f'thorr_stage_duration_seconds_sum{{stage="{name}"}} {counts["sum"]:.6f}')
+                lines.append(f'thorr_stage_duration_seconds_count{{stage="{name}"}} {counts["count"]}')
+            lines += ["# HELP thorr_stage_errors_total Etapas terminadas com exceção.",
+                      "# TYPE thorr_stage_errors_total counter"]
+            lines += [f'thorr_stage_errors_total{{stage="{name}"}} {n}' for name, n in sorted(self._errors.items())]
+            lines += ["# HELP thorr_llm_tokens_total Tokens de prompt e gerados pelo LLM.",
+                      "# TYPE thorr_llm_tokens_total counter"]
+            lines += [f'thorr_llm_tokens_total{{stage="{name}",kind="{kind}"}} {n}'
+                      for (name, kind), n in sorted(self._tokens.items())]
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+
+metrics = MetricsSink(config.TRACE_METRICS_FILE or None)
+
+
+def enable_metrics():
+    """Liga a coleta de métricas (o servidor HTTP liga na subida)."""
+    add_sink(metrics)
+
+
+def prometheus_text() -> str:
+    return metrics.prometheus_text()
+
+
+if config.TRACE_FILE:
+    add_sink(JsonLinesSink(config.TRACE_FILE, include_long=config.TRACE_INCLUDE_PROMPTS))
+if config.TRACE_METRICS_FILE:
+    enable_metrics()
@@ -0,0 +1,353 @@
+# assistant/transformers_backend.py
+"""
+Backend do modelo de chat sobre o transformers/PyTorch (bitsandbytes 4 bits em GPU,
+int8 em CPU). Fica separado de local_llm.py para que torch e transformers só sejam
+importados quando um desses backends é carregado: o stub, o llama.cpp e o resto do
+Thorr sobem sem eles.
+"""
+from contextlib import contextmanager
+import copy
+import hashlib
+import threading
+import time
+from transformers import (AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig, StoppingCriteria,
+                          StoppingCriteriaList, TextIteratorStreamer)
+import torch
+from . import config, tracing
+from .local_llm import (STOP_RULES, LocalLLMBackend, _apply_stop, _generation_stats, _incremental_text, _model_cache,
+                        _prefix_cache, _record_generation, format_prompt, get_backend, get_generation_profile)
+
+class _StopOnText(StoppingCriteria):
+    """Para cada sequência quando o texto gerado satisfaz a regra de parada do perfil."""
+
+    def __init__(self, tokenizer, prompt_length: int, stop_index):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.stop_index = stop_index
+
+    def __call__(self, input_ids, scores, **kwargs):
+        done = [
+            self.stop_index(self.tokenizer.decode(row[self.prompt_length:], skip_special_tokens=True)) is not None
+            for row in input_ids
+        ]
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+class _FirstTokenTimer(StoppingCriteria):
+    """Não para a geração: só marca o instante do primeiro token gerado (fim do prefill)."""
+
+    def __init__(self):
+        self.at = None
+
+    def __call__(self, input_ids, scores, **kwargs):
+        if self.at is None:
+            self.at = time.perf_counter()
+        return torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+
+def _cache_size_bytes(past_key_values) -> int:
+    if hasattr(past_key_values, "layers"):
+        # transformers >= 5: o DynamicCache guarda keys/values em cada camada
+        tensors = [t for layer in past_key_values.layers for t in (layer.keys, layer.values)]
+    else:
+        layers = past_key_values.to_legacy_cache() if hasattr(past_key_values, "to_legacy_cache") else past_key_values
+        tensors = [t for layer in layers for t in layer]
+    return sum(t.numel() * t.element_size() for t in tensors if t is not None)
+
+class _MeteredStreamer(TextIteratorStreamer):
+    """TextIteratorStreamer que conta os tokens gerados e marca o primeiro deles."""
+
+    def __init__(self, tokenizer, **kwargs):
+        super().__init__(tokenizer, **kwargs)
+        self.new_tokens = 0
+        self.first_token_time = None
+
+    def put(self, value):
+        if not (self.skip_prompt and self.next_tokens_are_prompt):
+            self.new_tokens += value.numel()
+            if self.first_token_time is None:
+                self.first_token_time = time.perf_counter()
+        super().put(value)
+
+@contextmanager
+def _count_forward_calls(*modules):
+    """Conta as chamadas de forward de cada módulo enquanto o bloco executa."""
+    counters = [0] * len(modules)
+    def _hook_for(i):
+        def _hook(*_):
+            counters[i] += 1
+        return _hook
+    handles = [module.register_forward_hook(_hook_for(i)) for i, module in enumerate(modules)]
+    try:
+        yield counters
+    finally:
+        for handle in handles:
+            handle.remove()
+
+def _record_speculation(profile: str, new_tokens: int, target_calls: int, draft_calls: int):
+    # Cada verificação do modelo principal aceita n tokens do rascunho e acrescenta 1
+    # próprio, logo aceitos = tokens gerados - verificações; propostos = passos do rascunho
+    accepted = max(0, new_tokens - target_calls)
+    stats = _generation_stats.setdefault(profile, {"calls": 0, "prompt_tokens": 0, "new_tokens": 0, "seconds": 0.0})
+    stats["draft_proposed"] = stats.get("draft_proposed", 0) + draft_calls
+    stats["draft_accepted"] = stats.get("draft_accepted", 0) + accepted
+    rate = accepted / draft_calls if draft_calls else 0.0
+    print(f"DEBUG - Decodificação especulativa [{profile}]: {accepted}/{draft_calls} tokens do rascunho aceitos "
+          f"({rate:.0%}), {target_calls} passos do modelo principal")
+
+def _is_out_of_memory(error: Exception) -> bool:
+    return isinstance(error, torch.cuda.OutOfMemoryError) or "out of memory" in str(error).lower()
+
+class TransformersBackend(LocalLLMBackend):
+    """Backend sobre um modelo do transformers (bitsandbytes 4 bits em GPU, int8 em CPU...)."""
+
+    def __init__(self, model_name: str, tokenizer, model):
+        self.model_name = model_name
+        self.tokenizer = tokenizer
+        self.model = model
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.tokenizer(text, add_special_tokens=False).input_ids)
+
+    def _get_prefix_state(self, system_prompt: str, prefix_text: str):
+        """
+        Retorna (ids do prefixo, past_key_values) do prefixo de sistema, calculando o
+        prefill apenas na primeira vez. O cache é limitado a config.PREFIX_CACHE_MAX_MB.
+        """
+        key = (self.model_name, hashlib.sha256(system_prompt.encode("utf-8")).hexdigest())
+        if key in _prefix_cache:
+            _prefix_cache.move_to_end(key)
+            return _prefix_cache[key]["ids"], _prefix_cache[key]["past"]
+
+        prefix_ids = self.tokenizer(prefix_text, return_tensors="pt").input_ids.to(self.model.device)
+        with torch.no_grad():
+            past = self.model(input_ids=prefix_ids, use_cache=True).past_key_values
+        _prefix_cache[key] = {"ids": prefix_ids, "past": past, "bytes": _cache_size_bytes(past)}
+
+        budget = config.PREFIX_CACHE_MAX_MB * 1024 * 1024
+        while len(_prefix_cache) > 1 and sum(entry["bytes"] for entry in _prefix_cache.values()) > budget:
+            _prefix_cache.popitem(last=False)
+        return prefix_ids, past
+
+    def warm_up(self, system_prompts: list):
+        # Prefill dos prefixos de sistema fora da primeira pergunta (e aquecimento dos kernels)
+        if config.PREFIX_KV_CACHE and not config.DRAFT_MODEL:
+            for system_prompt in system_prompts:
+                self._get_prefix_state(system_prompt, format_prompt(system_prompt, "")[0])
+
+    def _generate_kwargs(self, generation: dict, prompt_length: int, stop_index) -> dict:
+        generate_kwargs = {key: value for key, value in generation.items() if key != "stop"}
+
+        # Respeita a janela de contexto configurada: prompt + geração não passam dela
+        max_new_tokens = generate_kwargs.get("max_new_tokens", 256)
+        if prompt_length + max_new_tokens > config.LLM_CONTEXT_SIZE:
+            generate_kwargs["max_new_tokens"] = max(1, config.LLM_CONTEXT_SIZE - prompt_length)
+            print(f"AVISO: Prompt de {prompt_length} tokens; geração limitada a "
+                  f"{generate_kwargs['max_new_tokens']} tokens pelo contexto de {config.LLM_CONTEXT_SIZE}.")
+
+        if stop_index is not None:
+            generate_kwargs["stopping_criteria"] = StoppingCriteriaList([_StopOnText(self.tokenizer, prompt_length, stop_index)])
+        return generate_kwargs
+
+    def _prepare(self, system_prompt: str, user_prompt: str, profile: str):
+        """Tokeniza o prompt e monta os argumentos de generate() para o perfil escolhido."""
+        generation = get_generation_profile(profile)
+        prefix_text, input_text = format_prompt(system_prompt, user_prompt)
+
+        inputs = self.tokenizer(input_text, return_tensors="pt").to(self.model.device)
+        prompt_length = inputs.input_ids.shape[1]
+        stop_index = STOP_RULES.get(generation.get("stop"))
+        generate_kwargs = self._generate_kwargs(generation, prompt_length, stop_index)
+
+        # Decodificação especulativa (opcional): o modelo de rascunho propõe tokens e o
+        # modelo principal os verifica. Sob greedy a saída é idêntica à do caminho normal.
+        # A geração assistida administra os próprios caches, então o KV cache de prefixo
+        # não é usado junto com ela.
+        if config.DRAFT_MODEL:
+            generate_kwargs["assistant_model"] = get_draft_model(self.model_name)
+            return inputs, generate_kwargs, stop_index
+
+        # Reaproveita o KV cache do prefixo de sistema: só a parte do usuário passa pelo
+        # prefill. Só vale se a tokenização do prompt completo começar exatamente com os
+        # tokens do prefixo; caso contrário segue pelo caminho normal.
+        if config.PREFIX_KV_CACHE:
+            prefix_ids, past = self._get_prefix_state(system_prompt, prefix_text)
+            n_prefix = prefix_ids.shape[1]
+            if prompt_length > n_prefix and torch.equal(inputs.input_ids[0, :n_prefix], prefix_ids[0]):
+                # generate() estende o cache recebido, então cada chamada usa uma cópia
+                generate_kwargs["past_key_values"] = copy.deepcopy(past)
+
+        return inputs, generate_kwargs, stop_index
+
+    def generate(self, system_prompt: str, user_prompt: str, profile: str) -> str:
+        inputs, generate_kwargs, stop_index = self._prepare(system_prompt, user_prompt, profile)
+        prompt_length = inputs.input_ids.shape[1]
+
+        # Com o rastreamento ligado, marca o primeiro token para separar prefill e decode
+        first_token = None
+        if tracing.enabled():
+            first_token = _FirstTokenTimer()
+            generate_kwargs["stopping_criteria"] = StoppingCriteriaList(
+                [*generate_kwargs.get("stopping_criteria", []), first_token])
+
+        # Gera a resposta
+        start_time = time.perf_counter()
+        draft_model = generate_kwargs.get("assistant_model")
+        with _count_forward_calls(self.model, *([draft_model] if draft_model is not None else [])) as calls:
+            outputs = self.model.generate(**inputs, **generate_kwargs)
+        new_tokens = outputs.shape[1] - prompt_length
+        ttft = first_token.at - start_time if first_token is not None and first_token.at is not None else None
+        _record_generation(profile, prompt_length, new_tokens, time.perf_counter() - start_time, ttft=ttft)
+        if draft_model is not None:
+            _record_speculation(profile, new_tokens, calls[0], calls[1])
+
+        response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+
+        # Remove o prompt original da resposta
+        response_start_tag = "[/INST]"
+        if response_start_tag in response:
+            response = response.split(response_start_tag, 1)[1].strip()
+
+        return _apply_stop(response, stop_index)
+
+    def stream(self, system_prompt: str, user_prompt: str, profile: str):
+        inputs, generate_kwargs, stop_index = self._prepare(system_prompt, user_prompt, profile)
+        prompt_length = inputs.input_ids.shape[1]
+        streamer = _MeteredStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+
+        errors = []
+        draft_model = generate_kwargs.get("assistant_model")
+        calls = []
+        def _run():
+            try:
+                with torch.no_grad(), _count_forward_calls(self.model, *([draft_model] if draft_model is not None else [])) as counters:
+                    calls.append(counters)
+                    self.model.generate(**inputs, streamer=streamer, **generate_kwargs)
+            except Exception as e:
+                errors.append(e)
+                streamer.end()
+
+        start_time = time.perf_counter()
+        worker = threading.Thread(target=_run, daemon=True)
+        worker.start()
+
+        finished = []
+        def _chunks():
+            yield from streamer
+            finished.append(True)
+
+        yield from _incremental_text(_chunks(), stop_index)
+        # Cortado pela regra de parada: esgota o streamer (a geração para sozinha pelo
+        # critério de parada). Se já chegou ao fim, o sinal de término já foi consumido.
+        if not finished:
+            for _ in streamer:
+                pass
+
+        worker.join()
+        if errors:
+            raise errors[0]
+
+        ttft = streamer.first_token_time - start_time if streamer.first_token_time else None
+        _record_generation(profile, prompt_length, streamer.new_tokens, time.perf_counter() - start_time, ttft=ttft)
+        if draft_model is not None:
+            _record_speculation(profile, streamer.new_tokens, calls[0][0], calls[0][1])
+
+    def _generate_chunk(self, input_texts: list, profile: str) -> list:
+        """Gera um lote já dimensionado; em caso de falta de memória, divide o lote ao meio."""
+        generation = get_generation_profile(profile)
+        inputs = self.tokenizer(input_texts, return_tensors="pt", padding=True).to(self.model.device)
+        prompt_length = inputs.input_ids.shape[1]
+        stop_index = STOP_RULES.get(generation.get("stop"))
+        generate_kwargs = self._generate_kwargs(generation, prompt_length, stop_index)
+
+        try:
+            start_time = time.perf_counter()
+            with torch.no_grad():
+                outputs = self.model.generate(**inputs, pad_token_id=self.tokenizer.pad_token_id, **generate_kwargs)
+        except Exception as e:
+            if len(input_texts) == 1 or not _is_out_of_memory(e):
+                raise
+            del inputs
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+            half = len(input_texts) // 2
+            print(f"AVISO: Memória insuficiente para um lote de {len(input_texts)} prompts; dividindo em dois.")
+            return self._generate_chunk(input_texts[:half], profile) + self._generate_chunk(input_texts[half:], profile)
+
+        new_tokens = outputs[:, prompt_length:]
+        n_generated = int((new_tokens != self.tokenizer.pad_token_id).sum())
+        _record_generation(profile, int(inputs.attention_mask.sum()), n_generated, time.perf_counter() - start_time)
+
+        # Com padding à esquerda, tudo depois de 'prompt_length' é texto gerado
+        return [_apply_stop(text, stop_index) for text in self.tokenizer.batch_decode(new_tokens, skip_special_tokens=True)]
+
+    def generate_batch(self, batch: list, profile: str, batch_size: int) -> list:
+        tokenizer = self.tokenizer
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        tokenizer.padding_side = "left"
+
+        max_new_tokens = get_generation_profile(profile).get("max_new_tokens", 256)
+        input_texts = [format_prompt(system_prompt, user_prompt)[1] for system_prompt, user_prompt in batch]
+        lengths = [len(ids) for ids in tokenizer(input_texts).input_ids]
+        order = sorted(range(len(input_texts)), key=lambda i: lengths[i])
+
+        responses = [None] * len(input_texts)
+        chunk = []
+        for position, i in enumerate(order):
+            chunk.append(i)
+            is_last = position == len(order) - 1
+            if not is_last:
+                # O próximo prompt é o mais longo até aqui: estima o custo do lote com ele
+                next_cost = (len(chunk) + 1) * (lengths[order[position + 1]] + max_new_tokens)
+                if len(chunk) < batch_size and next_cost <= config.LLM_BATCH_MAX_TOKENS:
+                    continue
+            for j, text in zip(chunk, self._generate_chunk([input_texts[j] for j in chunk], profile)):
+                responses[j] = text
+            chunk = []
+
+        return responses
+
+def load_bnb_4bit(model_name: str) -> LocalLLMBackend:
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+    bnb_config = BitsAndBytesConfig(
+        load_in_4bit=True,
+        bnb_4bit_quant_type="nf4",
+        bnb_4bit_compute_dtype=torch.bfloat16
+    )
+
+    model = AutoModelForCausalLM.from_pretrained(
+        model_name,
+        quantization_config=bnb_config, # <-- Use a nova config
+        device_map="auto"
+    )
+    return TransformersBackend(model_name, tokenizer, model)
+
+def load_torch_int8(model_name: str) -> LocalLLMBackend:
+    # Em CPU: pesos em float32 e camadas Linear quantizadas dinamicamente para int8
+    if config.LLM_NUM_THREADS:
+        torch.set_num_threads(config.LLM_NUM_THREADS)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=torch.float32, low_cpu_mem_usage=True)
+    model.eval()
+    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return TransformersBackend(model_name, tokenizer, model)
+
+def get_draft_model(model_name: str):
+    """
+    Modelo de rascunho (config.DRAFT_MODEL) para a decodificação especulativa do modelo
+    'model_name'. Fica guardado ao lado do modelo principal em _model_cache, pelo nome
+    (trocar config.DRAFT_MODEL carrega o novo), e precisa usar o mesmo tokenizer
+    (ex.: TinyLlama para o Llama 2).
+    """
+    if config.DRAFT_MODEL == model_name:
+        raise ValueError(f"O modelo de rascunho precisa ser diferente do modelo principal ('{model_name}').")
+    get_backend(model_name)
+    drafts = _model_cache[model_name].setdefault("draft_models", {})
+    if config.DRAFT_MODEL not in drafts:
+        target = _model_cache[model_name]["model"]
+        print(f"Carregando modelo de rascunho: {config.DRAFT_MODEL}")
+        dtype = torch.float16 if target.device.type == "cuda" else torch.float32
+        draft_model = AutoModelForCausalLM.from_pretrained(config.DRAFT_MODEL, torch_dtype=dtype).to(target.device)
+        draft_model.eval()
+        drafts[config.DRAFT_MODEL] = draft_model
+    return drafts[config.DRAFT_MODEL]
@@ -0,0 +1,183 @@
+# assistant/value_index.py
+"""
+Índice dos valores reais das colunas categóricas (incorporadoras, cidades, bairros,
+status...), numa tabela FTS5 (palavras, sem acentos) dentro do próprio banco.
+
+O prompt de SQL só mostra poucos exemplos por coluna, e o modelo acaba chutando a
+grafia dos literais ("Cyrela" em vez de "cyrela goldsztein"): a consulta volta vazia
+e o usuário pergunta de novo. O setup_database constrói o índice na carga
+(build_value_index) e, na geração do SQL, lookup_values procura os termos da
+pergunta e devolve os valores existentes que os contêm, que entram no prompt.
+
+A busca consulta primeiro, em _value_index_terms, em quantos valores aparece cada
+palavra de conteúdo da pergunta (sem stopwords nem palavras do esquema, como
+"empreendimentos" ou "bairro"). Depois, uma consulta MATCH com as sequências de
+palavras da pergunta e as palavras isoladas raras o bastante (as comuns, como
+"porto" ou "residencial", só contam dentro de uma sequência), com o ranking no
+próprio FTS (ORDER BY rank, o bm25): palavras raras nos valores ("cyrela") pesam
+mais que as comuns.
+"""
+import re
+import time
+from collections import deque
+from . import config
+from .executa_sql import get_pool
+
+INDEX_TABLE = "_value_index"
+# Em quantos valores indexados aparece cada palavra (o IDF de lookup_values)
+TERMS_TABLE = "_value_index_terms"
+_STOPWORDS = {
+    "a", "as", "o", "os", "um", "uma", "de", "da", "das", "do", "dos", "em", "na", "nas", "no", "nos", "e", "ou",
+    "que", "qual", "quais", "quanto", "quantos", "quantas", "com", "sem", "por", "para", "pelo", "pela", "mais",
+    "menos", "me", "mostre", "liste", "todos", "todas", "tem", "ha", "sao", "esta", "estao", "entre", "cada",
+}
+# Palavras do esquema e do vocabulário das perguntas: aparecem em muitos valores
+# ("fg empreendimentos", "medio-alto") sem identificar nenhum
+_NOISE_WORDS = {
+    "empreendimento", "empreendimentos", "predio", "predios", "edificio", "edificios", "imovel", "imoveis",
+    "unidade", "unidades", "bairro", "bairros", "cidade", "cidades", "rua", "endereco", "incorporadora",
+    "incorporadoras", "construtora", "construtoras", "tipologia", "tipologias", "preco", "precos", "valor",
+    "valores", "medio", "media", "maior", "menor", "total", "quantidade", "numero", "existem", "existe",
+    "registrado", "registrados", "lista", "listar", "mostrar",
+}
+_INDEX_DDL = (f"CREATE VIRTUAL TABLE {INDEX_TABLE} USING fts5(value, table_name UNINDEXED, column_name UNINDEXED, "
+              "frequency UNINDEXED, tokenize='unicode61 remove_diacritics 2')")
+_WORD = re.compile(r"\w+")
+_lookup_durations = deque(maxlen=1000)
+
+
+def _text_columns(conn, table: str) -> list:
+    return [r[1] for r in conn.execute(f'PRAGMA table_info("{table}")') if "TEXT" in (r[2] or "").upper()]
+
+
+def build_value_index(conn, tables: list) -> int:
+    """
+    (Re)indexa os valores distintos das colunas de texto categóricas de 'tables': no
+    máximo config.VALUE_INDEX_MAX_DISTINCT valores distintos, de até
+    config.VALUE_INDEX_MAX_LENGTH caracteres, com pelo menos uma letra (datas e
+    códigos numéricos ficam de fora). Retorna o número de valores indexados.
+    """
+    start = time.perf_counter()
+    existing = conn.execute("SELECT sql FROM sqlite_master WHERE name = ?", (INDEX_TABLE,)).fetchone()
+    if existing is not None and existing[0] != _INDEX_DDL:
+        # Índice de uma versão anterior (tokenizer trigram): refeito com todas as tabelas que ele cobria
+        covered = [r[0] for r in conn.execute(f"SELECT DISTINCT table_name FROM {INDEX_TABLE}")]
+        tables = list(dict.fromkeys(list(tables) + covered))
+        conn.execute(f"DROP TABLE {INDEX_TABLE}")
+        existing = None
+    if existing is None:
+        conn.execute(_INDEX_DDL)
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {TERMS_TABLE} (term TEXT PRIMARY KEY, documents INTEGER) WITHOUT ROWID")
+    total = 0
+    for table in tables:
+        conn.execute(f"DELETE FROM {INDEX_TABLE} WHERE table_name = ?", (table,))
+        columns = _text_columns(conn, table)
+        if not columns:
+            continue
+        # Uma varredura da tabela mede todas as colunas de texto
+        measures = ", ".join(f'COUNT(DISTINCT "{c}"), MAX(LENGTH("{c}"))' for c in columns)
+        stats = conn.execute(f'SELECT {measures} FROM "{table}"').fetchone()
+        for i, col in enumerate(columns):
+            distinct, max_length = stats[2 * i], stats[2 * i + 1] or 0
+            if not 0 < distinct <= config.VALUE_INDEX_MAX_DISTINCT or max_length > config.VALUE_INDEX_MAX_LENGTH:
+                continue
+            total += conn.execute(f'INSERT INTO {INDEX_TABLE} SELECT "{col}", ?, ?, COUNT(*) FROM "{table}" '
+                                  f'WHERE "{col}" GLOB \'*[a-z]*\' GROUP BY "{col}"', (table, col)).rowcount
+
+    conn.execute(f"CREATE VIRTUAL TABLE temp.{INDEX_TABLE}_vocab USING fts5vocab(main, {INDEX_TABLE}, 'row')")
+    conn.execute(f"DELETE FROM {TERMS_TABLE}")
+    conn.execute(f"INSERT INTO {TERMS_TABLE} SELECT term, doc FROM temp.{INDEX_TABLE}_vocab")
+    conn.execute(f"DROP TABLE temp.{INDEX_TABLE}_vocab")
+    print(f"✅ Índice de valores: {total} valores de {len(tables)} tabelas em {time.perf_counter() - start:.2f}s.")
+    return total
+
+
+def _singular(word: str) -> str:
+    """Singular aproximado dos plurais mais comuns ("disponiveis" -> "disponivel", "prontos" -> "pronto")."""
+    if len(word) > 4 and word.endswith("eis"):
+        return word[:-3] + "el"
+    if len(word) > 4 and word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def _is_content(word: str) -> bool:
+    return len(word) >= 3 and word not in _STOPWORDS and word not in _NOISE_WORDS and not word.isdigit()
+
+
+def question_terms(normalized_question: str) -> list:
+    """
+    Termos de busca da pergunta: as palavras de conteúdo (sem stopwords, palavras do
+    esquema e números), o singular das que estão no plural e as sequências de 2 e 3
+    palavras que começam e terminam numa palavra de conteúdo ("moinhos de vento").
+    """
+    words = _WORD.findall(normalized_question)
+    terms = []
+    for n in (3, 2):
+        for i in range(len(words) - n + 1):
+            gram = words[i:i + n]
+            if _is_content(gram[0]) and _is_content(gram[-1]) and all(w not in _NOISE_WORDS for w in gram):
+                terms.append(" ".join(gram))
+    for word in words:
+        if _is_content(word):
+            for term in (word, _singular(word)):
+                if term not in terms:
+                    terms.append(term)
+    return list(dict.fromkeys(terms))
+
+
+def index_available(db_file: str = None) -> bool:
+    """Se o banco já tem o índice de valores (lookup_values retorna {} também sem ele)."""
+    try:
+        with get_pool(db_file).connection() as conn:
+            return conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (INDEX_TABLE,)).fetchone() is not None
+    except Exception:
+        return False
+
+
+def lookup_values(normalized_question: str, tables: list = None, limit: int = None, db_file: str = None) -> dict:
+    """
+    Valores existentes que contêm termos da pergunta (já passada por normalize_text),
+    como palavras inteiras: {tabela: {coluna: [valores]}}, até 'limit' por coluna, na
+    ordem do ranking do FTS (bm25). Sem o índice no banco, retorna {}.
+    """
+    limit = limit or config.VALUE_INDEX_MATCHES
+    terms = question_terms(normalized_question)
+    if not terms:
+        return {}
+    start = time.perf_counter()
+    words = [t for t in terms if " " not in t]
+    try:
+        with get_pool(db_file).connection() as conn:
+            documents = dict(conn.execute(f"SELECT term, documents FROM {TERMS_TABLE} "
+                                          f"WHERE term IN ({', '.join('?' * len(words))})", words))
+            # Sequências só com palavras que existem nos valores; palavras isoladas só as raras
+            query_terms = [t for t in terms
+                           if (all(w in documents for w in t.split() if _is_content(w)) if " " in t
+                               else documents.get(t, config.VALUE_INDEX_MAX_TERM_VALUES + 1)
+                               <= config.VALUE_INDEX_MAX_TERM_VALUES)]
+            if not query_terms:
+                return {}
+            query = " OR ".join('"' + t.replace('"', '""') + '"' for t in query_terms)
+            sql = f"SELECT value, table_name, column_name FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH ?"
+            params = [query]
+            if tables:
+                sql += f" AND table_name IN ({', '.join('?' * len(tables))})"
+                params += list(tables)
+            rows = conn.execute(sql + " ORDER BY rank LIMIT ?", params + [config.VALUE_INDEX_CANDIDATES]).fetchall()
+    except Exception:
+        return {}  # Banco carregado antes do índice de valores
+
+    matches = {}
+    for value, table, column in rows:
+        values = matches.setdefault(table, {}).setdefault(column, [])
+        if len(values) < limit:
+            values.append(value)
+    _lookup_durations.append(time.perf_counter() - start)
+    return matches
+
+
+def get_value_index_stats() -> dict:
+    durations = sorted(_lookup_durations)
+    pick = lambda q: 1000 * durations[min(len(durations) - 1, int(q * len(durations)))] if durations else 0.0
+    return {"lookups": len(durations), "p50_ms": pick(0.5), "p95_ms": pick(0.95)}
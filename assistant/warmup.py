@@ -0,0 +1,118 @@
+# assistant/warmup.py
+"""
+Subida do Thorr em paralelo. Warmup.start() dispara, em threads:
+
+- o esquema do banco (SchemaCatalog.from_database);
+- o modelo de embeddings e, assim que ele e o esquema ficam prontos, os índices
+  FAISS, o cache de SQL e os centróides do classificador de intenção ("index");
+- o modelo de chat, o prefill dos system prompts fixos e os fragmentos de esquema
+  dos prompts, com seus tokens contados (prompt_fragments) ("llm").
+
+O evento 'ready' sinaliza o fim de tudo e 'wait' espera pela subida inteira ou por
+uma etapa, relançando o erro de quem falhou. Assim o REPL aceita a primeira pergunta
+enquanto os modelos carregam, e o LLM deixa de ser carregado dentro dela.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from . import config, tracing
+from .embeddings import load_embedding_model
+
+
+class Warmup:
+    """
+    Carga concorrente do estado do assistente: as chaves de 'state' são as mesmas do
+    load_state do servidor (dfs, model, index, table_names, column_catalog, sql_cache).
+    'model' permite passar um modelo de embeddings já carregado.
+    """
+
+    def __init__(self, load_llm: bool = True, model=None):
+        self.load_llm = load_llm
+        self.model = model
+        self.state = {}
+        self.timings = {}
+        self.ready = threading.Event()
+        self.time_to_ready = None
+        self._futures = {}
+        self._start = None
+
+    def _timed(self, stage: str, function, *args):
+        start = time.perf_counter()
+        with tracing.span(f"warmup.{stage}"):
+            result = function(*args)
+        self.timings[stage] = time.perf_counter() - start
+        return result
+
+    def _load_schema(self):
+        from .schema_catalog import SchemaCatalog
+        return SchemaCatalog.from_database()
+
+    def _build_index(self, schema_future):
+        from . import intent_classifier, pipeline
+        from .executa_sql import get_pool
+        from .schema_catalog import SchemaCatalog
+        from .sql_cache import SemanticSQLCache
+
+        model = self.model if self.model is not None else self._timed("embeddings", load_embedding_model)
+        dfs = schema_future.result()
+
+        def _index():
+            index, table_names, _, _, column_catalog = pipeline.setup_faiss_and_model(dfs, config.BASE_TEXTS, model)
+            intent_classifier.classify_intent_embedding("aquecimento", model)  # Centróides das intenções
+            sql_cache = SemanticSQLCache(schema_fingerprint=pipeline.schema_fingerprint(dfs, model))
+            # Troca atômica do banco (setup_database) com o processo rodando: confere o esquema do arquivo novo
+            get_pool().add_reload_listener(lambda db_file: sql_cache.set_schema_fingerprint(
+                pipeline.schema_fingerprint(SchemaCatalog.from_database(db_file), model)))
+            return {
+                "dfs": dfs,
+                "model": model,
+                "index": index,
+                "table_names": table_names,
+                "column_catalog": column_catalog,
+                "sql_cache": sql_cache,
+            }
+        self.state.update(self._timed("index", _index))
+
+    def _load_llm(self, schema_future):
+        from . import conversation, intent_classifier, local_llm, prompt_fragments
+
+        def _llm():
+            backend = local_llm.get_backend(config.CHAT_MODEL)
+            backend.warm_up([config.SQL_GENERATION_SYSTEM_PROMPT, intent_classifier.INTENT_SYSTEM_MESSAGE,
+                             conversation.SYSTEM_MESSAGE])
+        self._timed("llm", _llm)
+        # A contagem de tokens usa o tokenizer do modelo de chat: só depois dele carregado
+        self._timed("fragments", prompt_fragments.precompute, schema_future.result())
+
+    def start(self) -> "Warmup":
+        self._start = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="thorr-warmup")
+        schema = executor.submit(self._timed, "schema", self._load_schema)
+        self._futures = {"schema": schema, "index": executor.submit(self._build_index, schema)}
+        if self.load_llm:
+            self._futures["llm"] = executor.submit(self._load_llm, schema)
+        executor.shutdown(wait=False)
+        threading.Thread(target=self._finish, name="thorr-warmup-ready", daemon=True).start()
+        return self
+
+    def _finish(self):
+        wait_futures(list(self._futures.values()))
+        self.time_to_ready = time.perf_counter() - self._start
+        self.ready.set()
+        failed = [stage for stage, future in self._futures.items() if future.exception() is not None]
+        if failed:
+            print(f"❌ Falha ao carregar: {', '.join(failed)} ({self._futures[failed[0]].exception()})")
+            return
+        stages = ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in self.timings.items())
+        print(f"\n✅ Thorr pronto em {self.time_to_ready:.1f}s ({stages}).")
+
+    def wait(self, stage: str = None, timeout: float = None) -> dict:
+        """Espera a subida inteira (ou só 'stage': "schema", "index" ou "llm") e retorna o estado."""
+        futures = [self._futures[stage]] if stage else list(self._futures.values())
+        done, _ = wait_futures(futures, timeout)
+        if len(done) < len(futures):
+            raise TimeoutError(f"O Thorr não ficou pronto em {timeout}s.")
+        for future in futures:
+            if future.exception() is not None:
+                raise future.exception()
+        return self.state
@@ -0,0 +1,125 @@
+# benchmarks/duckdb_engine.py
+"""
+Compara o SQLite com o motor DuckDB (assistant/duckdb_engine.py) nas consultas
+analíticas sobre o histórico de preços, lendo o banco anexado ("sqlite") e a cópia
+em Parquet ("parquet"). Para cada consulta mostra a rota escolhida pelo roteador,
+a mediana dos tempos e se os resultados dos dois motores são iguais.
+
+Sem --db, usa um banco sintético (benchmarks/synthetic.py) com alguns milhões de
+atualizações de preço (2500 prédios x 40 unidades x 30 atualizações = 3 milhões).
+Requer o pacote duckdb.
+
+Uso: python -m benchmarks.duckdb_engine [--db banco.db] [--buildings 2500] [--updates-per-unit 30]
+                                        [--sources sqlite parquet] [--repeat 3]
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+from assistant import config, duckdb_engine
+from assistant.executa_sql import run_query
+from benchmarks.summary_tables import _same_rows
+from benchmarks.synthetic import create_synthetic_database
+
+
+def benchmark_queries() -> list:
+    """(nome, SQL no dialeto do SQLite, como o LLM escreve): agregações e uma busca pontual."""
+    c = {k: f'"{v}"' for k, v in config.UNITS_UPDATES_COLUMNS.items()}
+    uid = f'"{config.UNITS_ID_COLUMN}"'
+    return [
+        ("preço médio por cidade (histórico)",
+         f'SELECT b."cidade_endereço", COUNT(*) AS atualizacoes, AVG(uu.{c["price"]}) AS preco_medio '
+         f"FROM units_updates uu JOIN units u ON u.{uid} = uu.{c['unit']} "
+         f'JOIN buildings b ON b.id_predio = u.id_predio GROUP BY b."cidade_endereço" ORDER BY b."cidade_endereço"'),
+        ("atualizações e preço médio por mês",
+         f"SELECT substr(uu.{c['date']}, 1, 7) AS mes, COUNT(*), AVG(uu.{c['price']}) "
+         f"FROM units_updates uu GROUP BY mes ORDER BY mes"),
+        ("faixa de preço de uma incorporadora (LIKE)",
+         f"SELECT b.nome_empreendimento, MIN(uu.{c['price']}), MAX(uu.{c['price']}) "
+         f"FROM units_updates uu JOIN units u ON u.{uid} = uu.{c['unit']} "
+         f"JOIN buildings b ON b.id_predio = u.id_predio WHERE b.incorporadora_nome LIKE '%CYRELA%' "
+         f"GROUP BY b.nome_empreendimento"),
+        ("desconto médio por número de quartos",
+         f"SELECT t.quartos, AVG(uu.{c['discount']}), COUNT(DISTINCT u.{uid}) "
+         f"FROM units_updates uu JOIN units u ON u.{uid} = uu.{c['unit']} "
+         f"JOIN typologies t ON t.id_tipologia = u.id_tipologia GROUP BY t.quartos"),
+        # Sem --db, o desconto é NULL em todo o histórico de parte das unidades: a ordem dos NULLs decide o LIMIT
+        ("menores descontos médios por unidade (NULLs no ORDER BY)",
+         f"SELECT {c['unit']}, AVG({c['discount']}) AS desconto_medio FROM units_updates "
+         f"GROUP BY {c['unit']} ORDER BY desconto_medio LIMIT 5"),
+        ("histórico de uma unidade (busca pontual)",
+         f"SELECT * FROM units_updates WHERE {c['unit']} = 1234 ORDER BY {c['id']}"),
+    ]
+
+
+def _timed(run, repeat: int):
+    timings, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        timings.append(time.perf_counter() - start)
+    return 1000 * statistics.median(timings), list(result.itertuples(index=False, name=None))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="Banco a usar (padrão: banco sintético temporário)")
+    parser.add_argument("--buildings", type=int, default=2500, help="Prédios do banco sintético")
+    parser.add_argument("--updates-per-unit", type=int, default=30, help="Atualizações por unidade no banco sintético")
+    parser.add_argument("--sources", nargs="+", default=["sqlite", "parquet"], choices=["sqlite", "parquet"],
+                        help="Fontes de dados do DuckDB a comparar")
+    parser.add_argument("--repeat", type=int, default=3, help="Execuções por consulta (mediana)")
+    args = parser.parse_args()
+
+    if duckdb_engine._import_duckdb() is None:
+        print("❌ Pacote 'duckdb' não instalado (pip install duckdb).")
+        return
+
+    tmp_dir = tempfile.mkdtemp()
+    db_file = args.db
+    if db_file is None:
+        db_file = os.path.join(tmp_dir, "synthetic.db")
+        start = time.perf_counter()
+        conn = create_synthetic_database(db_file, buildings=args.buildings, updates_per_unit=args.updates_per_unit)
+        discount = config.UNITS_UPDATES_COLUMNS["discount"]
+        conn.execute(f'UPDATE units_updates SET "{discount}" = NULL '
+                     f'WHERE "{config.UNITS_UPDATES_COLUMNS["unit"]}" % 50 = 0')
+        conn.execute("ANALYZE")
+        conn.commit()
+        conn.close()
+        print(f"Banco sintético criado em {time.perf_counter() - start:.0f}s.")
+    conn = sqlite3.connect(db_file)
+    rows = conn.execute("SELECT COUNT(*) FROM units_updates").fetchone()[0]
+    conn.close()
+    print(f"Histórico com {rows} atualizações de preço.")
+
+    config.SQL_ANALYTIC_ENGINE = "duckdb"
+    engines = {}
+    for source in args.sources:
+        engine = duckdb_engine.DuckDBEngine(db_file, source, parquet_dir=os.path.join(tmp_dir, "parquet"))
+        start = time.perf_counter()
+        try:
+            engine.execute("SELECT 1")  # Anexa o banco ou exporta para Parquet
+        except Exception as e:
+            print(f"❌ DuckDB ({source}) indisponível: {str(e).splitlines()[0]}")
+            continue
+        print(f"DuckDB ({source}) pronto em {time.perf_counter() - start:.1f}s.")
+        engines[source] = engine
+
+    for name, sql in benchmark_queries():
+        print("-" * 50)
+        print(f"{name} -> rota: {duckdb_engine.route_query(sql, db_file)}")
+        sqlite_ms, sqlite_rows = _timed(lambda: run_query(sql, db_file=db_file, timeout=3600, max_rows=10 ** 7),
+                                        args.repeat)
+        print(f"   SQLite: {sqlite_ms:.1f} ms")
+        duck_sql = duckdb_engine.to_duckdb_dialect(sql)
+        for source, engine in engines.items():
+            duck_ms, duck_rows = _timed(lambda: engine.execute(duck_sql, timeout=3600, max_rows=10 ** 7), args.repeat)
+            check = "✅" if _same_rows(sqlite_rows, duck_rows) else "❌ resultados diferentes"
+            print(f"   DuckDB ({source}): {duck_ms:.1f} ms ({sqlite_ms / max(duck_ms, 1e-6):.1f}x) {check}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+# benchmarks/end_to_end.py
+"""
+Benchmark de ponta a ponta do Thorr, reproduzível e só com CPU, sem rede:
+
+1. gera os dados sintéticos (benchmarks/synthetic.py) em CSV, na escala pedida
+   (--updates: de 10 mil a 10 milhões de atualizações de preço);
+2. carrega os CSVs com o setup_database.py, num processo filho, e mede a vazão da
+   carga (linhas/s) e o pico de memória dela;
+3. sobe o assistente (esquema, índices FAISS, LLM) e mede o tempo de inicialização;
+4. roda o conjunto fixo de perguntas (QUESTIONS) pelo pipeline inteiro: intenção,
+   geração do SQL e execução. O LLM é um StubBackend que devolve o SQL pronto de
+   cada pergunta, e os embeddings vêm de um modelo determinístico por hashing
+   (HashingEmbedder), a não ser que --embedding-model aponte para um modelo local.
+
+As latências por etapa saem dos spans de assistant/tracing.py (p50 e p95, em ms).
+O relatório vai para --output em JSON; com --baseline, cada métrica é comparada com
+a de um relatório anterior e o comando termina com erro se alguma piorar mais que
+--tolerance.
+
+Uso: python -m benchmarks.end_to_end [--updates 100000] [--repeat 3] [--output relatorio.json]
+                                     [--baseline base.json] [--tolerance 0.25] [--embedding-model modelo]
+"""
+import time
+
+_PROCESS_START = time.perf_counter()  # Antes dos imports pesados: eles contam na inicialização
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import resource
+import shutil
+import sys
+import tempfile
+import numpy as np
+from assistant import config, executa_sql, intent_classifier, local_llm, pipeline, tracing
+from assistant.schema_catalog import SchemaCatalog
+from benchmarks.synthetic import buildings_for_updates, create_synthetic_database, export_csv
+
+_IMPORT_SECONDS = time.perf_counter() - _PROCESS_START
+
+# Perguntas fixas e o SQL que o LLM falso devolve para cada uma
+_C = {k: f'"{v}"' for k, v in config.UNITS_UPDATES_COLUMNS.items()}
+_UID = f'"{config.UNITS_ID_COLUMN}"'
+QUESTIONS = [
+    ("Quantos prédios temos em Porto Alegre?",
+     "SELECT COUNT(*) FROM buildings WHERE \"cidade_endereço\" = 'porto alegre'"),
+    ("Liste os empreendimentos da Cyrela Goldsztein",
+     "SELECT nome_empreendimento FROM buildings WHERE incorporadora_nome = 'cyrela goldsztein'"),
+    ("Quantos prédios estão em construção em cada cidade?",
+     "SELECT \"cidade_endereço\", COUNT(*) FROM buildings WHERE status = 'em construcao' GROUP BY \"cidade_endereço\""),
+    ("Quais tipologias têm 3 quartos?",
+     "SELECT id_tipologia, id_predio, area_privada FROM typologies WHERE quartos = 3"),
+    ("Qual o preço médio das unidades de 2 quartos?",
+     f"SELECT AVG(uu.{_C['price']}) FROM units_updates uu JOIN units u ON u.{_UID} = uu.{_C['unit']} "
+     f"JOIN typologies t ON t.id_tipologia = u.id_tipologia WHERE t.quartos = 2"),
+    ("Qual o preço atual da unidade 1234?",
+     f"SELECT {_C['price']}, {_C['date']} FROM units_updates WHERE {_C['unit']} = 1234 "
+     f"ORDER BY {_C['id']} DESC LIMIT 1"),
+    ("Qual o preço médio por cidade?",
+     f'SELECT b."cidade_endereço", AVG(uu.{_C["price"]}) FROM units_updates uu '
+     f"JOIN units u ON u.{_UID} = uu.{_C['unit']} JOIN buildings b ON b.id_predio = u.id_predio "
+     f'GROUP BY b."cidade_endereço"'),
+    ("Qual o maior desconto já dado em uma unidade?",
+     f"SELECT MAX({_C['discount']}) FROM units_updates"),
+    ("Quantas atualizações de preço houve por mês?",
+     f"SELECT substr({_C['date']}, 1, 7) AS mes, COUNT(*) FROM units_updates GROUP BY mes ORDER BY mes"),
+    ("Quantas unidades disponíveis existem no bairro Moinhos de Vento?",
+     "SELECT SUM(unidades_disponiveis) FROM buildings_summary bs JOIN buildings b ON b.id_predio = bs.id_predio "
+     "WHERE b.\"bairro_endereço\" = 'moinhos de vento'"),
+]
+# Etapas do relatório, na ordem do pipeline ("question" é a pergunta inteira)
+STAGES = ["embed_question", "intent", "retrieve_tables", "refine_columns", "build_prompt", "llm", "sql_guard",
+          "sql.execute", "question"]
+# Métricas em que um valor maior é melhor (as demais são tempos e memória)
+_HIGHER_IS_BETTER = {"ingestion.rows_per_second"}
+# Diferenças menores que isto (ms) não contam como regressão: etapas de décimos de ms oscilam muito
+_NOISE_FLOOR_MS = 1.0
+
+
+class HashingEmbedder:
+    """
+    Embeddings determinísticos sem modelo: cada palavra (sem acento, minúscula) e cada
+    trigrama de caracteres soma +1/-1 numa posição escolhida por hash, e o vetor é
+    normalizado. Tem a interface de encode do SentenceTransformer usada pelo Thorr.
+    """
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+
+    def _features(self, text: str) -> list:
+        words = re.findall(r"\w+", pipeline.normalize_text(text))
+        return words + [w[i:i + 3] for w in words for i in range(len(w) - 2)]
+
+    def encode(self, texts, batch_size: int = 32, **kwargs) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype="float32")
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                vectors[row, value % self.dimension] += 1.0 if value >> 63 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class CannedSQLBackend(local_llm.StubBackend):
+    """StubBackend que responde, no perfil "sql", o SQL pronto da pergunta que está no prompt."""
+
+    def __init__(self, sql_by_question: dict):
+        super().__init__()
+        self.sql_by_question = sql_by_question
+
+    def respond(self, system_prompt: str, user_prompt: str, profile: str) -> str:
+        if profile == "sql":
+            match = re.search(r"Pergunta do usuário: (.*)", user_prompt)
+            if match and match.group(1).strip() in self.sql_by_question:
+                return self.sql_by_question[match.group(1).strip()]
+        return super().respond(system_prompt, user_prompt, profile)
+
+
+class StageRecorder:
+    """Sink de tracing que guarda as durações de cada etapa."""
+
+    def __init__(self):
+        self.durations = {}
+
+    def __call__(self, finished):
+        self.durations.setdefault(finished.name, []).append(finished.duration)
+
+    def percentiles(self) -> dict:
+        report = {}
+        for name, durations in self.durations.items():
+            durations = sorted(durations)
+            pick = lambda q: 1000 * durations[min(len(durations) - 1, int(q * len(durations)))]
+            report[name] = {"count": len(durations), "p50_ms": pick(0.5), "p95_ms": pick(0.95)}
+        return report
+
+
+def _peak_rss_mb(who=resource.RUSAGE_SELF) -> float:
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # bytes no macOS, KB no Linux
+
+
+def _ingest(csv_dir: str, db_file: str, results):
+    """Processo filho: carga completa dos CSVs com o setup_database.py (sem contar a subida do processo)."""
+    import setup_database
+    setup_database.DATA_DIR = csv_dir
+    setup_database.DB_FILE = db_file
+    setup_database.SOURCE_FILES = {table: f"{table}.csv" for table in setup_database.SOURCE_FILES}
+    start = time.perf_counter()
+    setup_database.create_database(force=True)
+    results.put(time.perf_counter() - start)
+
+
+def run_ingestion(csv_dir: str, db_file: str, rows: int) -> dict:
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_ingest, args=(csv_dir, db_file, results))
+    process.start()
+    process.join()
+    if process.exitcode != 0 or results.empty() or not os.path.exists(db_file):
+        raise RuntimeError(f"A carga com o setup_database.py falhou (código {process.exitcode}).")
+    seconds = results.get()
+    return {"rows": rows, "seconds": seconds, "rows_per_second": rows / max(seconds, 1e-9),
+            "peak_rss_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN)}
+
+
+def run_questions(model, index, table_names, dfs, column_catalog, repeat: int) -> tuple:
+    """
+    Roda as perguntas 'repeat' vezes (mais uma de aquecimento, fora da medição).
+    Retorna (percentis por etapa, erros de execução dos SQLs).
+    """
+    recorder = StageRecorder()
+    errors = []
+    for round_number in range(repeat + 1):
+        if round_number == 1:
+            tracing.add_sink(recorder)
+        for question, _ in QUESTIONS:
+            with tracing.span("question"):
+                question_embedding = pipeline.encode_question(question, model)
+                intent_classifier.classify_intent(question, model, question_embedding)
+                # Todas as perguntas são de SQL: o pipeline roda mesmo se o classificador errar
+                sql_query = pipeline.run_sql_pipeline(question, model, index, table_names, dfs,
+                                                      column_catalog=column_catalog,
+                                                      question_embedding=question_embedding)
+                result = executa_sql.execute_query(sql_query)
+            if isinstance(result, str) and round_number == 0:
+                errors.append(f"{question}: {result}")
+    tracing.remove_sink(recorder)
+    return recorder.percentiles(), errors
+
+
+def flatten_metrics(report: dict) -> dict:
+    """Métricas comparáveis do relatório, como {"stages.llm.p95_ms": valor}."""
+    metrics = {"startup_seconds": report["startup_seconds"], "peak_rss_mb": report["peak_rss_mb"]}
+    for key in ("rows_per_second", "peak_rss_mb"):
+        metrics[f"ingestion.{key}"] = report["ingestion"][key]
+    for stage, values in report["stages"].items():
+        for key in ("p50_ms", "p95_ms"):
+            metrics[f"stages.{stage}.{key}"] = values[key]
+    return metrics
+
+
+def compare_with_baseline(report: dict, baseline: dict, tolerance: float) -> list:
+    """Imprime a comparação métrica a métrica e retorna as que pioraram mais que 'tolerance'."""
+    if baseline.get("scale") != report["scale"]:
+        print(f"⚠️ A linha de base foi medida em outra escala ({baseline.get('scale')}); compare com cuidado.")
+    current, previous = flatten_metrics(report), flatten_metrics(baseline)
+    regressions = []
+    print(f"{'métrica':<36} {'base':>12} {'atual':>12} {'variação':>10}")
+    for name, value in current.items():
+        if name not in previous:
+            continue
+        before = previous[name]
+        change = (value - before) / before if before else 0.0
+        worse = -change if name in _HIGHER_IS_BETTER else change
+        regressed = worse > tolerance and not (name.endswith("_ms") and abs(value - before) < _NOISE_FLOOR_MS)
+        print(f"{name:<36} {before:>12.2f} {value:>12.2f} {change:>+9.0%} {'❌' if regressed else '✅'}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=100000,
+                        help="Atualizações de preço do banco sintético (10 mil a 10 milhões)")
+    parser.add_argument("--repeat", type=int, default=3, help="Rodadas medidas do conjunto de perguntas")
+    parser.add_argument("--seed", type=int, default=0, help="Semente do gerador de dados")
+    parser.add_argument("--embedding-model", help="Modelo de embeddings local (padrão: HashingEmbedder)")
+    parser.add_argument("--output", help="Arquivo JSON onde gravar o relatório")
+    parser.add_argument("--baseline", help="Relatório anterior para comparar")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Piora aceita em relação à linha de base")
+    parser.add_argument("--keep", action="store_true", help="Não apaga a pasta temporária com os dados")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="thorr-bench-")
+    try:
+        # 1. Dados sintéticos em CSV
+        start = time.perf_counter()
+        conn = create_synthetic_database(os.path.join(tmp_dir, "generated.db"), seed=args.seed,
+                                         buildings=buildings_for_updates(args.updates))
+        rows = export_csv(conn, os.path.join(tmp_dir, "csv"))
+        conn.close()
+        os.remove(os.path.join(tmp_dir, "generated.db"))
+        print(f"Dados sintéticos gerados em {time.perf_counter() - start:.1f}s: {rows}")
+
+        # 2. Carga com o setup_database.py
+        db_file = os.path.join(tmp_dir, "database.db")
+        ingestion = run_ingestion(os.path.join(tmp_dir, "csv"), db_file, sum(rows.values()))
+        print(f"Carga: {ingestion['rows_per_second']:.0f} linhas/s, pico de {ingestion['peak_rss_mb']:.0f} MB.")
+
+        # 3. Inicialização do assistente (imports + esquema, índices e LLM; sem a geração e a carga dos dados)
+        start = time.perf_counter()
+        config.DB_FILE = db_file
+        config.LLM_BACKEND = "benchmark"
+        local_llm.BACKEND_LOADERS["benchmark"] = lambda model_name: CannedSQLBackend(dict(QUESTIONS))
+        if args.embedding_model:
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(args.embedding_model, device="cpu")
+        else:
+            model = HashingEmbedder()
+        dfs = SchemaCatalog.from_database()
+        index, table_names, _, _, column_catalog = pipeline.setup_faiss_and_model(dfs, config.BASE_TEXTS, model,
+                                                                                 cache_dir=None)
+        local_llm.get_backend(config.CHAT_MODEL)
+        intent_classifier.classify_intent_embedding("aquecimento", model)  # Centróides das intenções
+        startup_seconds = _IMPORT_SECONDS + time.perf_counter() - start
+        print(f"Assistente pronto em {startup_seconds:.2f}s ({_IMPORT_SECONDS:.2f}s de imports).")
+
+        # 4. Perguntas
+        stages, errors = run_questions(model, index, table_names, dfs, column_catalog, args.repeat)
+        for error in errors:
+            print(f"⚠️ {error}")
+    finally:
+        if not args.keep:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    report = {
+        "scale": {"updates": rows["units_updates"], "rows": sum(rows.values()), "seed": args.seed,
+                  "embedding": args.embedding_model or "hashing", "questions": len(QUESTIONS), "repeat": args.repeat},
+        "ingestion": ingestion,
+        "import_seconds": _IMPORT_SECONDS,
+        "startup_seconds": startup_seconds,
+        "peak_rss_mb": _peak_rss_mb(),
+        "stages": {stage: stages[stage] for stage in STAGES if stage in stages},
+    }
+    print("-" * 50)
+    print(f"{'etapa':<18} {'p50 (ms)':>10} {'p95 (ms)':>10}")
+    for stage, values in report["stages"].items():
+        print(f"{stage:<18} {values['p50_ms']:>10.2f} {values['p95_ms']:>10.2f}")
+    print(f"Pico de memória do assistente: {report['peak_rss_mb']:.0f} MB")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✅ Relatório gravado em '{args.output}'.")
+
+    if args.baseline:
+        print("-" * 50)
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare_with_baseline(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} métricas pioraram mais de {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print("✅ Nenhuma regressão em relação à linha de base.")
+
+
+if __name__ == "__main__":
+    main()
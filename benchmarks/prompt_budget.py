@@ -0,0 +1,101 @@
+# benchmarks/prompt_budget.py
+"""
+Mede o efeito do orçamento de tokens do esquema (assistant/prompt_fragments.py) nos
+prompts de SQL e de assistência de dados. Para cada pergunta de
+benchmarks/end_to_end.QUESTIONS, monta o prompt sem orçamento (o esquema refinado
+inteiro, como antes) e com o orçamento pedido, conta os tokens do prompt completo
+no tokenizer do modelo de chat e mede o prefill (tempo até o primeiro token) do LLM.
+
+Usa o banco e os modelos de config.py; com --stub, o LLM falso e o HashingEmbedder
+(tokens aproximados e sem prefill para medir).
+
+Uso: python -m benchmarks.prompt_budget [--stub] [--sql-budget 384] [--data-budget 512]
+"""
+import argparse
+import statistics
+from assistant import config, local_llm, pipeline, tracing
+from assistant.schema_catalog import SchemaCatalog
+from benchmarks.end_to_end import QUESTIONS, HashingEmbedder
+
+
+class PrefillRecorder:
+    """Sink de tracing que guarda o prefill (llm.prefill) da última geração."""
+
+    def __init__(self):
+        self.last = None
+
+    def __call__(self, finished):
+        if finished.name == "llm.prefill":
+            self.last = finished.duration
+
+
+def measure(backend, recorder, system_prompt: str, user_prompt: str, profile: str) -> dict:
+    recorder.last = None
+    backend.generate(system_prompt, user_prompt, profile)
+    return {"tokens": backend.count_tokens(local_llm.format_prompt(system_prompt, user_prompt)[1]),
+            "prefill_ms": 1000 * recorder.last if recorder.last is not None else None}
+
+
+def summarize(name: str, runs: dict):
+    print(f"\n{name}")
+    print(f"{'orçamento':<12} {'tokens (mediana)':>17} {'prefill (mediana)':>18}")
+    medians = {}
+    for label, results in runs.items():
+        tokens = statistics.median(r["tokens"] for r in results)
+        prefills = [r["prefill_ms"] for r in results if r["prefill_ms"] is not None]
+        prefill = statistics.median(prefills) if prefills else None
+        medians[label] = (tokens, prefill)
+        print(f"{label:<12} {tokens:>17.0f} {f'{prefill:.0f} ms' if prefill is not None else '-':>18}")
+    (full_tokens, full_prefill), (tokens, prefill) = medians.values()
+    saving = f"Economia por requisição: {full_tokens - tokens:.0f} tokens ({(full_tokens - tokens) / full_tokens:.0%})"
+    if prefill is not None and full_prefill is not None:
+        saving += f", {full_prefill - prefill:.0f} ms de prefill"
+    print(saving)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stub", action="store_true", help="LLM falso e embeddings por hashing")
+    parser.add_argument("--sql-budget", type=int, default=config.SQL_SCHEMA_TOKEN_BUDGET)
+    parser.add_argument("--data-budget", type=int, default=config.DATA_ASSISTANCE_SCHEMA_TOKEN_BUDGET)
+    args = parser.parse_args()
+
+    if args.stub:
+        config.LLM_BACKEND = "stub"
+        model = HashingEmbedder()
+    else:
+        from assistant.embeddings import load_embedding_model
+        model = load_embedding_model()
+    dfs = SchemaCatalog.from_database()
+    index, table_names, _, _, column_catalog = pipeline.setup_faiss_and_model(dfs, config.BASE_TEXTS, model, cache_dir="")
+    backend = local_llm.get_backend(config.CHAT_MODEL)
+
+    recorder = PrefillRecorder()
+    tracing.add_sink(recorder)  # Com um sink ativo, os backends medem o tempo até o primeiro token
+    sql_runs = {"sem limite": [], str(args.sql_budget): []}
+    data_runs = {"sem limite": [], str(args.data_budget): []}
+    try:
+        for question, _ in QUESTIONS:
+            question_embedding = pipeline.encode_question(question, model)
+            retrieved = pipeline.retrieve_tables_thorr(question, model, index, table_names,
+                                                       question_embedding=question_embedding)
+            refined = pipeline.refine_tables_thorr(question, retrieved, dfs, model, column_catalog=column_catalog,
+                                                   question_embedding=question_embedding)
+            ranked = pipeline.retrieve_tables_thorr(question, model, index, table_names, k=len(table_names),
+                                                    question_embedding=question_embedding)
+            for runs, budget in zip(sql_runs.values(), [0, args.sql_budget]):
+                runs.append(measure(backend, recorder, config.SQL_GENERATION_SYSTEM_PROMPT,
+                                    pipeline.build_sql_prompt(question, refined, token_budget=budget), "sql"))
+            for runs, budget in zip(data_runs.values(), [0, args.data_budget]):
+                runs.append(measure(backend, recorder, pipeline.DATA_ASSISTANCE_SYSTEM_MESSAGE,
+                                    pipeline.build_data_assistance_prompt(question, dfs, ranked, token_budget=budget),
+                                    "chat"))
+    finally:
+        tracing.remove_sink(recorder)
+
+    summarize("Prompt de SQL", sql_runs)
+    summarize("Prompt de assistência de dados", data_runs)
+
+
+if __name__ == "__main__":
+    main()
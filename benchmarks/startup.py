@@ -0,0 +1,104 @@
+# benchmarks/startup.py
+"""
+Mede a subida do Thorr em processos novos, nos dois modos:
+
+- "serial": como o main.py fazia antes, um passo depois do outro (esquema, modelo de
+  embeddings, índices), com o LLM carregado dentro da primeira pergunta;
+- "warmup": assistant/warmup.py, com o esquema, os embeddings + índices e o LLM
+  carregando em paralelo.
+
+Para cada modo mostra a mediana do tempo de imports, do tempo até ficar pronto e da
+latência da primeira pergunta (intenção, SQL e execução). Usa os modelos de
+config.py; com --stub, o LLM falso e o HashingEmbedder de benchmarks/end_to_end.py
+(sem GPU nem rede, mas sem o custo real de carregar os modelos).
+
+Uso: python -m benchmarks.startup [--repeat 3] [--stub] [--question "..."]
+"""
+import time
+
+_PROCESS_START = time.perf_counter()
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+MODES = ["serial", "warmup"]
+
+
+def run_child(mode: str, stub: bool, question: str) -> dict:
+    """Executado no processo filho: sobe o assistente no modo pedido e responde 'question'."""
+    from assistant import config, executa_sql, intent_classifier, pipeline
+    from assistant.warmup import Warmup, load_embedding_model
+    import_seconds = time.perf_counter() - _PROCESS_START
+
+    embedder = None
+    if stub:
+        from benchmarks.end_to_end import HashingEmbedder
+        embedder = HashingEmbedder()
+
+    if mode == "serial":
+        from assistant.schema_catalog import SchemaCatalog
+        from assistant.sql_cache import SemanticSQLCache
+        dfs = SchemaCatalog.from_database()
+        model = embedder if embedder is not None else load_embedding_model()
+        index, table_names, _, _, column_catalog = pipeline.setup_faiss_and_model(dfs, config.BASE_TEXTS, model)
+        state = {"dfs": dfs, "model": model, "index": index, "table_names": table_names,
+                 "column_catalog": column_catalog,
+                 "sql_cache": SemanticSQLCache(schema_fingerprint=pipeline.schema_fingerprint(dfs, model))}
+    else:
+        state = Warmup(model=embedder).start().wait()
+    ready_seconds = time.perf_counter() - _PROCESS_START
+
+    start = time.perf_counter()
+    question_embedding = pipeline.encode_question(question, state["model"])
+    intent_classifier.classify_intent(question, state["model"], question_embedding)
+    sql_query = pipeline.run_sql_pipeline(question, state["model"], state["index"], state["table_names"], state["dfs"],
+                                          column_catalog=state["column_catalog"], question_embedding=question_embedding)
+    executa_sql.execute_query(sql_query)
+    first_question_seconds = time.perf_counter() - start
+    return {"import_seconds": import_seconds, "ready_seconds": ready_seconds,
+            "first_question_seconds": first_question_seconds}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="Processos por modo (mediana)")
+    parser.add_argument("--stub", action="store_true", help="LLM falso e embeddings por hashing")
+    parser.add_argument("--question", default="Qual o preço médio das unidades por cidade?")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_child(args.child, args.stub, args.question)
+        print(json.dumps(result))
+        return
+
+    env = dict(os.environ)
+    if args.stub:
+        # Sem o cache de embeddings: os vetores do HashingEmbedder não podem ir para o cache do modelo real
+        env.update(THORR_LLM_BACKEND="stub", THORR_EMBEDDING_CACHE_DIR="")
+    results = {}
+    for mode in MODES:
+        runs = []
+        for _ in range(args.repeat):
+            command = [sys.executable, "-m", "benchmarks.startup", "--child", mode, "--question", args.question]
+            if args.stub:
+                command.append("--stub")
+            completed = subprocess.run(command, capture_output=True, text=True, env=env)
+            if completed.returncode != 0:
+                print(f"❌ Modo '{mode}' falhou:\n{completed.stderr[-2000:]}")
+                return
+            runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+        results[mode] = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+
+    print(f"{'modo':<8} {'imports':>9} {'pronto':>9} {'1ª pergunta':>12} {'pronto + 1ª':>12}")
+    for mode, r in results.items():
+        print(f"{mode:<8} {r['import_seconds']:>8.2f}s {r['ready_seconds']:>8.2f}s "
+              f"{r['first_question_seconds']:>11.2f}s {r['ready_seconds'] + r['first_question_seconds']:>11.2f}s")
+
+
+if __name__ == "__main__":
+    main()
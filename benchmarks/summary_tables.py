@@ -0,0 +1,108 @@
+# benchmarks/summary_tables.py
+"""
+Compara as tabelas de resumo (units_latest, buildings_summary, cities_summary) com as
+consultas equivalentes sobre o histórico bruto (units_updates), do jeito que o LLM as
+escreve: subconsulta correlacionada "última atualização por unidade". Também mede a
+atualização completa e a incremental dos resumos.
+
+Sem --db, usa um banco sintético (benchmarks/synthetic.py) em um arquivo temporário.
+
+Uso: python -m benchmarks.summary_tables [--db banco.db] [--buildings 500] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from assistant import config
+from assistant.summary_tables import refresh_summary_tables
+from benchmarks.synthetic import add_updates, create_synthetic_database
+
+
+def benchmark_queries() -> list:
+    """Pares (nome, SQL sobre o histórico bruto, SQL sobre o resumo) com o mesmo resultado."""
+    c = {k: f'"{v}"' for k, v in config.UNITS_UPDATES_COLUMNS.items()}
+    uid = f'"{config.UNITS_ID_COLUMN}"'
+    available = ", ".join(f"'{v}'" for v in config.UNIT_AVAILABLE_VALUES)
+    latest = (f"FROM units_updates uu WHERE uu.{c['id']} = "
+              f"(SELECT MAX(x.{c['id']}) FROM units_updates x WHERE x.{c['unit']} = uu.{c['unit']})")
+    return [
+        ("preço atual por unidade",
+         f"SELECT uu.{c['unit']}, uu.{c['price']} {latest}",
+         f"SELECT {c['unit']}, {c['price']} FROM units_latest"),
+        ("unidades disponíveis por prédio",
+         f"SELECT u.id_predio, SUM(CASE WHEN CAST(uu.{c['availability']} AS TEXT) IN ({available}) THEN 1 ELSE 0 END) "
+         f"FROM units u JOIN units_updates uu ON uu.{c['unit']} = u.{uid} "
+         f"AND uu.{c['id']} = (SELECT MAX(x.{c['id']}) FROM units_updates x WHERE x.{c['unit']} = u.{uid}) "
+         f"GROUP BY u.id_predio",
+         "SELECT id_predio, unidades_disponiveis FROM buildings_summary"),
+        ("preço mínimo e médio por cidade",
+         f'SELECT b."cidade_endereço", MIN(uu.{c["price"]}), AVG(uu.{c["price"]}) '
+         f"FROM buildings b JOIN units u ON u.id_predio = b.id_predio "
+         f"JOIN units_updates uu ON uu.{c['unit']} = u.{uid} "
+         f"AND uu.{c['id']} = (SELECT MAX(x.{c['id']}) FROM units_updates x WHERE x.{c['unit']} = u.{uid}) "
+         f'GROUP BY b."cidade_endereço"',
+         'SELECT "cidade_endereço", preco_min, preco_medio FROM cities_summary'),
+    ]
+
+
+def time_query(conn: sqlite3.Connection, sql: str, repeat: int):
+    timings, rows = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = conn.execute(sql).fetchall()
+        timings.append(time.perf_counter() - start)
+    return 1000 * statistics.median(timings), rows
+
+
+def _same_rows(a: list, b: list) -> bool:
+    normalize = lambda rows: sorted(tuple(round(v, 6) if isinstance(v, float) else v for v in r) for r in rows)
+    return normalize(a) == normalize(b)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="Banco a usar (padrão: banco sintético temporário)")
+    parser.add_argument("--buildings", type=int, default=500, help="Prédios do banco sintético")
+    parser.add_argument("--repeat", type=int, default=5, help="Execuções por consulta (mediana)")
+    args = parser.parse_args()
+
+    tmp_dir = None
+    if args.db:
+        conn = sqlite3.connect(args.db, isolation_level=None)
+    else:
+        tmp_dir = tempfile.mkdtemp()
+        conn = create_synthetic_database(os.path.join(tmp_dir, "synthetic.db"), buildings=args.buildings)
+        conn.isolation_level = None
+
+    rows = conn.execute("SELECT COUNT(*) FROM units_updates").fetchone()[0]
+    print(f"Histórico com {rows} atualizações de preço.")
+    print("-" * 50)
+
+    full = refresh_summary_tables(conn, force=True)
+    if tmp_dir:
+        # Um lote novo de atualizações (5% das unidades) para medir a atualização incremental
+        c = config.UNITS_UPDATES_COLUMNS
+        next_id = conn.execute(f'SELECT MAX("{c["id"]}") + 1 FROM units_updates').fetchone()[0]
+        unit_ids = [r[0] for r in conn.execute(f'SELECT "{config.UNITS_ID_COLUMN}" FROM units')]
+        rng = random.Random(1)
+        add_updates(conn, rng.sample(unit_ids, max(1, len(unit_ids) // 20)), 1, next_id, rng, start_day=400)
+        incremental = refresh_summary_tables(conn)
+        print(f"Atualização dos resumos: completa {full['seconds'] * 1000:.0f} ms, "
+              f"incremental {incremental['seconds'] * 1000:.0f} ms ({incremental['new_rows']} linhas novas).")
+    conn.execute("ANALYZE")
+    print("-" * 50)
+
+    for name, raw_sql, summary_sql in benchmark_queries():
+        raw_ms, raw_rows = time_query(conn, raw_sql, args.repeat)
+        summary_ms, summary_rows = time_query(conn, summary_sql, args.repeat)
+        check = "✅" if _same_rows(raw_rows, summary_rows) else "❌ resultados diferentes"
+        print(f"{name}: bruto {raw_ms:.1f} ms, resumo {summary_ms:.2f} ms "
+              f"({raw_ms / max(summary_ms, 1e-6):.0f}x) {check}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+# benchmarks/synthetic.py
+"""
+Gera um banco SQLite sintético com o mesmo esquema do Thorr (buildings, typologies,
+units e units_updates), para benchmarks sem os dados reais. buildings e typologies
+têm todas as colunas que o setup_database grava a partir de tables/*.xlsx, com
+valores na forma e na frequência dos reais (cidades, bairros, incorporadoras,
+status, tipologias); os nomes das colunas do histórico vêm de config.UNITS_UPDATES_COLUMNS. Com --updates, o número de prédios é
+calculado para chegar perto desse número de atualizações de preço (de 10 mil a 10
+milhões); com --csv-dir, as tabelas também são gravadas em CSV, no formato que o
+setup_database.py carrega.
+
+Uso: python -m benchmarks.synthetic saida.db [--buildings 500 | --updates 1000000] [--units-per-building 40]
+                                             [--updates-per-unit 20] [--csv-dir pasta]
+"""
+import argparse
+import csv
+import math
+import os
+import random
+import sqlite3
+from assistant import config
+
+# Valores com a mesma forma (normalizados) e frequência aproximada dos da carga real de tables/
+CITIES = {  # cidade -> (estado, peso, bairros)
+    "porto alegre": ("rs", 30, ["moinhos de vento", "petropolis", "bela vista", "menino deus", "tristeza",
+                                "cidade baixa", "centro historico", "mont serrat", "auxiliadora", "jardim europa"]),
+    "curitiba": ("pr", 26, ["batel", "agua verde", "centro civico", "ecoville", "bigorrilho", "cabral", "portao"]),
+    "itapema": ("sc", 20, ["meia praia", "centro", "morretes", "canto da praia"]),
+    "porto belo": ("sc", 10, ["pereque", "centro", "balneario pereque"]),
+    "balneario camboriu": ("sc", 7, ["centro", "barra sul", "pioneiros", "praia dos amores"]),
+    "itajai": ("sc", 7, ["fazenda", "centro", "praia brava", "sao joao"]),
+    "florianopolis": ("sc", 5, ["centro", "jurere", "campeche", "agronomica", "trindade"]),
+    "canoas": ("rs", 4, ["centro", "marechal rondon", "igara"]),
+    "sao paulo": ("sp", 3, ["pinheiros", "vila mariana", "moema", "itaim bibi"]),
+    "gravatai": ("rs", 1, ["centro", "parque dos anjos"]),
+    "novo hamburgo": ("rs", 1, ["centro", "hamburgo velho"]),
+    "sao jose dos pinhais": ("pr", 2, ["centro", "afonso pena"]),
+}
+DEVELOPERS = [  # (nome, peso)
+    ("melnick even", 106), ("cyrela goldsztein", 71), ("mrv rs", 63), ("hype", 63), ("tenda rs", 51),
+    ("gt building", 37), ("pasqualotto construtora", 35), ("mrv pr", 35), ("terrasse", 29), ("porto camargo", 27),
+    ("fg empreendimentos", 26), ("piemonte pr", 24), ("cgl", 24), ("plaenge pr", 23), ("obraprima", 22),
+    ("maiojama", 22), ("lottici", 20), ("b fabbriani", 19), ("valor real", 18), ("pride", 18),
+    ("embraed empreendimentos sc", 18), ("cyrela pr", 18), ("verticall construtora", 17), ("nex group", 17),
+    ("ap empreendimentos", 17), ("vasco civitas", 16), ("zuckhan", 15), ("tecnisa pr", 15), ("abf", 10),
+    ("arquisul", 10), ("rossi", 8), ("multiplan", 6),
+]
+# (status, estagio, peso)
+STAGES = [("pronto novo", "pronto novo", 2346), ("em construcao", "em construcao", 1831),
+          ("em construcao", "lancamento", 296), ("futuro", "terreno", 47), ("lancamento", "lancamento", 13),
+          ("previsto", "terreno", 5), ("pronto", "nan", 4), ("estudo", "nan", 2)]
+SEGMENTS = [("nan", 3706), ("open", 206), ("emergente", 206), ("medio-alto", 153), ("comercial", 99),
+            ("investimento", 98), ("alto-padrao", 64), ("loja", 12), ("hotel", 5)]
+STREET_TYPES = [("rua", 3565), ("avenida", 824), ("estrada", 64), ("rodovia", 35), ("alameda", 35), ("travessa", 27)]
+STREETS = ["nereu ramos", "senador atilio fontana", "governador celso ramos", "brasil", "padre chagas",
+           "dom pedro ii", "carlos gomes", "sete de setembro", "independencia", "protasio alves", "nilo pecanha",
+           "atlantica", "terceira avenida", "quarta avenida", "marechal floriano", "visconde de guarapuava",
+           "silva jardim", "republica argentina", "osvaldo aranha", "iguatemi"]
+NAME_PARTS = ["aurora", "veneza", "kiev", "toscana", "lumi", "avalon", "graciosa", "vanguard", "celeno",
+              "maison joie", "oceanic", "diamante", "acacia", "brava", "aspen", "bosque", "hayet", "reviva",
+              "polo", "vega", "strait", "pinah", "carmelo", "sirius", "lago", "horizonte", "mirante", "solar"]
+NAME_FORMATS = ["residencial {}", "{} residence", "{} tower", "villa {}", "reserva {}", "{} home club",
+                "{} garden", "{} living", "{}", "{} - fase {}", "{} - breve lancamento", "{} {}"]
+INFRASTRUCTURE = ["elevador social", "portaria", "seguranca", "condominio fechado", "piscina adulto", "academia",
+                  "salao de festas", "playground", "espaco gourmet", "churrasqueira condominial", "pet place",
+                  "coworking", "bicicletario", "quadra poliesportiva", "brinquedoteca", "sala de jogos"]
+TYPOLOGY_TYPES = [("apartamento", 8260), ("garden", 2980), ("cobertura duplex", 1361), ("studio", 605),
+                  ("sala", 585), ("casa em condominio", 414), ("loja", 390), ("duplex", 364),
+                  ("terreno/lote residencial", 330), ("cobertura horizontal", 328), ("loft", 178)]
+TYPOLOGY_INFRASTRUCTURE = ["['churrasqueira', 'area de servico']", "['churrasqueira', 'sacada']",
+                           "['churrasqueira', 'sacada', 'area de servico']"]
+AVAILABILITY = ["disponivel", "vendido", "reservado"]
+
+BUILDINGS_COLUMNS = [
+    ("id_predio", "INTEGER"), ("nome_empreendimento", "TEXT"), ("data_entrega", "TEXT"), ("data_lançamento", "TEXT"),
+    ("tipo", "TEXT"), ("finalidade", "TEXT"), ("status", "TEXT"), ("estagio", "TEXT"), ("numero_torres", "INTEGER"),
+    ("infraestrutura", "TEXT"), ("id_incorporadora", "INTEGER"), ("incorporadora_nome", "TEXT"),
+    ("tipo_endereço", "TEXT"), ("rua_endereço", "TEXT"), ("numero_endereço", "INTEGER"), ("bairro_endereço", "TEXT"),
+    ("cidade_endereço", "TEXT"), ("estado_endereço", "TEXT"), ("segmento", "TEXT"), ("criado_em", "TEXT"),
+    ("minha_casa_minha_vida", "INTEGER"), ("numero_andares", "INTEGER"),
+]
+TYPOLOGIES_COLUMNS = [
+    ("id_tipologia", "INTEGER"), ("id_predio", "INTEGER"), ("tipo", "TEXT"), ("area_privada", "REAL"),
+    ("area_total", "REAL"), ("area_exterior", "REAL"), ("quartos", "INTEGER"), ("banheiros", "INTEGER"),
+    ("suites", "INTEGER"), ("lavabo", "INTEGER"), ("infraestrutura", "TEXT"), ("estacionamento", "INTEGER"),
+    ("total_unidades_por_tipologia_por_predio", "INTEGER"),
+]
+
+
+def _q(name: str) -> str:
+    return f'"{name}"'
+
+
+def add_updates(conn: sqlite3.Connection, unit_ids: list, updates_per_unit: int, first_id: int, rng: random.Random,
+                start_day: int = 0) -> int:
+    """Acrescenta 'updates_per_unit' atualizações a cada unidade. Retorna a próxima id livre."""
+    c = config.UNITS_UPDATES_COLUMNS
+    columns = ", ".join(_q(c[k]) for k in ("id", "unit", "price", "discount", "availability", "date"))
+    next_id, rows = first_id, []
+    for step in range(updates_per_unit):
+        for unit_id in unit_ids:
+            day = start_day + step
+            rows.append((next_id, unit_id, rng.randint(200, 3000) * 1000, round(rng.random() * 0.15, 3),
+                         rng.choice(AVAILABILITY), f"{2020 + day // 360:04d}-{day % 360 // 30 + 1:02d}-{day % 30 + 1:02d}"))
+            next_id += 1
+            if len(rows) == 10000:
+                conn.executemany(f"INSERT INTO units_updates ({columns}) VALUES (?, ?, ?, ?, ?, ?)", rows)
+                rows = []
+    if rows:
+        conn.executemany(f"INSERT INTO units_updates ({columns}) VALUES (?, ?, ?, ?, ?, ?)", rows)
+    return next_id
+
+
+def _pick(rng: random.Random, weighted: list):
+    """Sorteia pelo peso (último campo); devolve o valor, ou a tupla dos valores sem o peso."""
+    values = [item[0] if len(item) == 2 else item[:-1] for item in weighted]
+    return rng.choices(values, weights=[item[-1] for item in weighted])[0]
+
+
+def _date(rng: random.Random, first_year: int, last_year: int) -> str:
+    return f"{rng.randint(first_year, last_year):04d}-{rng.randint(1, 12):02d}-{rng.choice([1, 28, 30]):02d} 00:00:00"
+
+
+def _building_row(b: int, rng: random.Random) -> tuple:
+    city = rng.choices(list(CITIES), weights=[w for _, w, _ in CITIES.values()])[0]
+    state, _, neighborhoods = CITIES[city]
+    developer = _pick(rng, DEVELOPERS)
+    status, stage = _pick(rng, STAGES)
+    name_format = rng.choice(NAME_FORMATS)
+    if name_format == "{} - fase {}":
+        name = name_format.format(rng.choice(NAME_PARTS), rng.randint(1, 3))
+    elif name_format == "{} {}":
+        name = name_format.format(rng.choice(NAME_PARTS), rng.choice([city, rng.choice(neighborhoods)]))
+    else:
+        name = name_format.format(rng.choice(NAME_PARTS))
+    horizontal = rng.random() < 0.13
+    commercial = rng.random() < 0.09
+    infrastructure = rng.sample(INFRASTRUCTURE, rng.randint(0, 8))
+    launch = _date(rng, 2010, 2028)
+    delivery = _date(rng, int(launch[:4]) + 2, int(launch[:4]) + 4)
+    return (b, name, delivery, launch,
+            "horizontal" if horizontal else "vertical", "comercial" if commercial else "residencial",
+            status, stage, rng.choice([0, 1, 1, 1, 2, 2, 3]), str(infrastructure),
+            98 + 7 * [name for name, _ in DEVELOPERS].index(developer), developer,
+            _pick(rng, STREET_TYPES), rng.choice(STREETS), rng.randint(10, 3000), rng.choice(neighborhoods), city,
+            state, _pick(rng, SEGMENTS), _date(rng, 2014, 2025), int(rng.random() < 0.15),
+            0 if horizontal else rng.randint(3, 35))
+
+
+def _typology_row(b: int, t: int, units_per_building: int, rng: random.Random) -> tuple:
+    area = round(rng.uniform(28, 90) + 35 * t, 2)
+    area_total = round(area * rng.uniform(1.2, 1.6), 2) if rng.random() < 0.3 else None
+    return (b * 3 + t, b, _pick(rng, TYPOLOGY_TYPES), area, area_total,
+            round(rng.uniform(5, 60), 2) if rng.random() < 0.01 else None,
+            t + 1, min(t + 1, rng.randint(1, 3)), min(t, 2), int(rng.random() < 0.3 * t),
+            rng.choice(TYPOLOGY_INFRASTRUCTURE) if rng.random() < 0.01 else "nan",
+            rng.randint(0, t + 1), units_per_building // 3 + (units_per_building % 3 > t))
+
+
+def create_synthetic_database(path: str, buildings: int = 500, units_per_building: int = 40,
+                              updates_per_unit: int = 20, seed: int = 0) -> sqlite3.Connection:
+    """Cria (ou recria) o banco em 'path' e retorna uma conexão aberta para ele."""
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    c = config.UNITS_UPDATES_COLUMNS
+
+    # buildings e typologies com as colunas e os tipos que o setup_database grava a partir de tables/*.xlsx
+    for table, columns in (("buildings", BUILDINGS_COLUMNS), ("typologies", TYPOLOGIES_COLUMNS)):
+        conn.execute(f"CREATE TABLE {table} ({', '.join(f'{_q(name)} {kind}' for name, kind in columns)})")
+    conn.execute(f"CREATE TABLE units ({_q(config.UNITS_ID_COLUMN)} INTEGER, id_predio INTEGER, "
+                 "id_tipologia INTEGER, andar INTEGER, area REAL)")
+    conn.execute(f"CREATE TABLE units_updates ({_q(c['id'])} INTEGER, {_q(c['unit'])} INTEGER, {_q(c['price'])} REAL, "
+                 f"{_q(c['discount'])} REAL, {_q(c['availability'])} TEXT, {_q(c['date'])} TEXT)")
+
+    conn.executemany(f"INSERT INTO buildings VALUES ({', '.join('?' * len(BUILDINGS_COLUMNS))})",
+                     [_building_row(b, rng) for b in range(buildings)])
+    conn.executemany(f"INSERT INTO typologies VALUES ({', '.join('?' * len(TYPOLOGIES_COLUMNS))})",
+                     [_typology_row(b, t, units_per_building, rng) for b in range(buildings) for t in range(3)])
+    unit_ids = list(range(buildings * units_per_building))
+    conn.executemany("INSERT INTO units VALUES (?, ?, ?, ?, ?)", [
+        (u, u // units_per_building, (u // units_per_building) * 3 + u % 3, u % units_per_building // 4 + 1,
+         40.0 + 30 * (u % 3)) for u in unit_ids])
+    add_updates(conn, unit_ids, updates_per_unit, 0, rng)
+
+    # Os mesmos índices de junção que o setup_database cria
+    for table in ("buildings", "typologies", "units", "units_updates"):
+        columns = [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+        for col in config.KEY_COLUMNS:
+            if col in columns:
+                conn.execute(f'CREATE INDEX "idx_{table}_{col}" ON {table} ("{col}")')
+    conn.commit()
+    return conn
+
+
+def buildings_for_updates(update_rows: int, units_per_building: int = 40, updates_per_unit: int = 20) -> int:
+    """Número de prédios para o histórico ter cerca de 'update_rows' atualizações de preço."""
+    return max(1, math.ceil(update_rows / (units_per_building * updates_per_unit)))
+
+
+def export_csv(conn: sqlite3.Connection, out_dir: str) -> dict:
+    """Grava cada tabela em '<tabela>.csv' (com cabeçalho) em 'out_dir'. Retorna as linhas por tabela."""
+    os.makedirs(out_dir, exist_ok=True)
+    rows = {}
+    for table in ("buildings", "typologies", "units", "units_updates"):
+        cursor = conn.execute(f"SELECT * FROM {table}")
+        with open(os.path.join(out_dir, f"{table}.csv"), "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow([d[0] for d in cursor.description])
+            rows[table] = 0
+            for batch in iter(lambda: cursor.fetchmany(10000), []):
+                writer.writerows(batch)
+                rows[table] += len(batch)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output", help="Arquivo SQLite a criar")
+    parser.add_argument("--buildings", type=int, default=500)
+    parser.add_argument("--updates", type=int, help="Atualizações de preço desejadas (define o número de prédios)")
+    parser.add_argument("--units-per-building", type=int, default=40)
+    parser.add_argument("--updates-per-unit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--csv-dir", help="Pasta onde gravar também as tabelas em CSV")
+    args = parser.parse_args()
+
+    buildings = args.buildings
+    if args.updates:
+        buildings = buildings_for_updates(args.updates, args.units_per_building, args.updates_per_unit)
+    conn = create_synthetic_database(args.output, buildings, args.units_per_building,
+                                     args.updates_per_unit, args.seed)
+    rows = conn.execute("SELECT COUNT(*) FROM units_updates").fetchone()[0]
+    if args.csv_dir:
+        export_csv(conn, args.csv_dir)
+        print(f"✅ Tabelas gravadas em CSV em '{args.csv_dir}'.")
+    conn.close()
+    print(f"✅ Banco sintético '{args.output}' criado ({rows} atualizações de preço).")
+
+
+if __name__ == "__main__":
+    main()
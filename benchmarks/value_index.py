@@ -0,0 +1,61 @@
+# benchmarks/value_index.py
+"""
+Mede a construção do índice de valores (assistant/value_index.py) e o tempo de
+lookup_values para um conjunto de perguntas, mostrando os valores encontrados.
+
+Sem --db, usa um banco sintético (benchmarks/synthetic.py) em um arquivo temporário.
+
+Uso: python -m benchmarks.value_index [--db banco.db] [--buildings 500] [--repeat 200]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from assistant import config, value_index
+from assistant.pipeline import normalize_text
+from benchmarks.synthetic import create_synthetic_database
+
+QUESTIONS = [
+    "Quais empreendimentos da Cyrela estão em obras em Porto Alegre?",
+    "Preço médio dos apartamentos no bairro Moinhos de Vento",
+    "Quantas unidades disponíveis existem em Gravataí?",
+    "Liste os prédios prontos da Melnick Even em Canoas",
+    "Qual o maior preço registrado?",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="Banco a usar (padrão: banco sintético temporário)")
+    parser.add_argument("--buildings", type=int, default=500, help="Prédios do banco sintético")
+    parser.add_argument("--repeat", type=int, default=200, help="Buscas por pergunta")
+    args = parser.parse_args()
+
+    db_file = args.db
+    if db_file is None:
+        db_file = os.path.join(tempfile.mkdtemp(), "synthetic.db")
+        conn = create_synthetic_database(db_file, buildings=args.buildings)
+        tables = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+        value_index.build_value_index(conn, tables)
+        conn.commit()
+        conn.close()
+    config.DB_FILE = db_file
+
+    for question in QUESTIONS:
+        normalized = normalize_text(question)
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            matches = value_index.lookup_values(normalized)
+            timings.append(time.perf_counter() - start)
+        print("-" * 50)
+        print(f"{question}\n   mediana {1000 * statistics.median(timings):.3f} ms, "
+              f"máximo {1000 * max(timings):.3f} ms")
+        for table, columns in matches.items():
+            for column, values in columns.items():
+                print(f"   {table}.{column}: {values}")
+
+
+if __name__ == "__main__":
+    main()
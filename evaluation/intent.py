@@ -0,0 +1,56 @@
+# evaluation/intent.py
+"""
+Avalia o classificador de intenção: acurácia e latência do caminho rápido (embeddings)
+e do caminho via LLM, sobre o conjunto rotulado em evaluation/data/intent_eval.jsonl.
+
+Uso: python -m evaluation.intent [--skip-llm]
+"""
+import argparse
+import json
+import os
+import time
+from assistant.embeddings import load_embedding_model
+from assistant import intent_classifier
+
+EVAL_FILE = os.path.join(os.path.dirname(__file__), "data", "intent_eval.jsonl")
+
+
+def load_eval_set(path: str = EVAL_FILE):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(name: str, examples, classify):
+    correct, latencies = 0, []
+    for example in examples:
+        start = time.perf_counter()
+        predicted = classify(example["question"])
+        latencies.append(time.perf_counter() - start)
+        if predicted == example["intent"]:
+            correct += 1
+        else:
+            print(f"  [{name}] erro: '{example['question']}' -> {predicted} (esperado {example['intent']})")
+
+    latencies.sort()
+    print(f"{name}: acurácia {correct / len(examples):.1%} ({correct}/{len(examples)}), "
+          f"latência média {1000 * sum(latencies) / len(latencies):.1f} ms, "
+          f"p95 {1000 * latencies[int(0.95 * (len(latencies) - 1))]:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--skip-llm", action="store_true", help="Avalia apenas o classificador por embeddings")
+    args = parser.parse_args()
+
+    examples = load_eval_set()
+    model = load_embedding_model()
+    intent_classifier.classify_intent_embedding("aquecimento", model)  # calcula os centróides fora da medição
+
+    evaluate("embeddings", examples, lambda q: intent_classifier.classify_intent_embedding(q, model)[0])
+    if not args.skip_llm:
+        evaluate("embeddings + fallback LLM", examples, lambda q: intent_classifier.classify_intent(q, model))
+        evaluate("LLM", examples, intent_classifier.classify_intent_llm)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# evaluation/llm_equivalence.py
+"""
+Confere, em CPU e com um modelo minúsculo de arquitetura Llama, que as otimizações de
+geração do local_llm produzem exatamente a mesma saída do caminho original sob
+decodificação gulosa (greedy).
+
+Sem --model, usa um Llama minúsculo (pesos aleatórios, tokenizer de bytes) montado na
+hora, sem baixar nada; os mesmos passos rodam no pytest (tests/test_llm_equivalence.py).
+
+Uso: python -m evaluation.llm_equivalence [--model hf-internal-testing/tiny-random-LlamaForCausalLM]
+"""
+import argparse
+import copy
+from contextlib import contextmanager
+from assistant import config, local_llm
+
+TINY_LLAMA = "tiny-llama-local"
+DRAFT_NOISE = 0.01  # Desvio do ruído somado aos pesos do rascunho padrão
+
+PROMPTS = [
+    (config.SQL_GENERATION_SYSTEM_PROMPT, "Esquema de banco de dados:\nTabela: buildings\n\nPergunta do usuário: Quantos prédios existem?\n\nConsulta SQL:"),
+    (config.SQL_GENERATION_SYSTEM_PROMPT, "Pergunta do usuário: Qual a unidade mais cara?\n\nConsulta SQL:"),
+    ("Você é o assistente Thori.", "Olá, tudo bem?"),
+]
+
+# Respostas típicas do Llama-2-chat e o SQL esperado depois da regra de parada "sql" e
+# do clean_sql_response (inclusive com texto antes do SQL e apóstrofo nele)
+SQL_STOP_CASES = [
+    ("```sql\nSELECT COUNT(*) FROM buildings;\n```", "SELECT COUNT(*) FROM buildings;"),
+    ("Sure! Here's the SQL query:\n```sql\nSELECT COUNT(*) FROM buildings WHERE cidade = 'porto alegre';\n```\n"
+     "This query counts...", "SELECT COUNT(*) FROM buildings WHERE cidade = 'porto alegre';"),
+    ("Sure! Here's the SQL query:\n```sql\nSELECT nome FROM buildings\n```\nExplanation: ...",
+     "SELECT nome FROM buildings"),
+    ("Here's how to SELECT it:\n```sql\nSELECT MAX(preco) FROM units_updates;\n```",
+     "SELECT MAX(preco) FROM units_updates;"),
+    ("Claro! Aqui está a consulta:\n\nSELECT nome FROM buildings WHERE nome = 'it''s';\nEla retorna...",
+     "SELECT nome FROM buildings WHERE nome = 'it''s';"),
+    ("SELECT 'a;b' FROM buildings; -- comentário", "SELECT 'a;b' FROM buildings;"),
+]
+
+
+def check_sql_stop() -> bool:
+    """Regra de parada "sql" sobre respostas fixas, na resposta completa e em streaming (um caractere por vez)."""
+    from assistant.pipeline import clean_sql_response
+    stop_index = local_llm.STOP_RULES["sql"]
+    ok = True
+    for response, expected in SQL_STOP_CASES:
+        cut = clean_sql_response(local_llm._apply_stop(response, stop_index))
+        streamed = clean_sql_response("".join(local_llm._incremental_text(iter(response), stop_index)))
+        if cut != expected or streamed != expected:
+            ok = False
+            print(f"  [parada SQL] {response[:40]!r}...:\n    {cut!r} / {streamed!r}\n    esperado {expected!r}")
+    print(f"Regra de parada SQL: {'OK' if ok else 'FALHOU'}")
+    return ok
+
+
+@contextmanager
+def _overrides(**overrides):
+    """Troca valores do config durante o bloco e restaura os anteriores ao sair."""
+    previous = {key: getattr(config, key) for key in overrides}
+    for key, value in overrides.items():
+        setattr(config, key, value)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            setattr(config, key, value)
+
+
+def tiny_llama(seed: int = 0, tokenizer=None):
+    """
+    Llama minúsculo (2 camadas, dimensão 16) com pesos aleatórios da semente 'seed' e um
+    tokenizer de bytes (um token por byte), montados sem acesso à rede. Com um tokenizer
+    de bytes, os tokens do prefixo de sistema são sempre o começo dos tokens do prompt.
+    """
+    import torch
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+    from transformers import LlamaConfig, LlamaForCausalLM, PreTrainedTokenizerFast
+
+    if tokenizer is None:
+        specials = ["<unk>", "<s>", "</s>"]
+        vocab = {token: i for i, token in enumerate(specials + sorted(pre_tokenizers.ByteLevel.alphabet()))}
+        byte_tokenizer = Tokenizer(models.BPE(vocab=vocab, merges=[], unk_token="<unk>"))
+        byte_tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+        byte_tokenizer.decoder = decoders.ByteLevel()
+        tokenizer = PreTrainedTokenizerFast(tokenizer_object=byte_tokenizer, unk_token="<unk>",
+                                            bos_token="<s>", eos_token="</s>")
+    model_config = LlamaConfig(vocab_size=len(tokenizer), hidden_size=16, intermediate_size=64,
+                               num_hidden_layers=2, num_attention_heads=4, num_key_value_heads=4,
+                               max_position_embeddings=config.LLM_CONTEXT_SIZE,
+                               bos_token_id=tokenizer.bos_token_id, eos_token_id=tokenizer.eos_token_id)
+    torch.manual_seed(seed)
+    return tokenizer, LlamaForCausalLM(model_config).eval()
+
+
+def load_models(model_name: str = None, draft_model_name: str = None) -> tuple:
+    """
+    Registra no local_llm o modelo principal e um rascunho diferente dele; retorna
+    (nome do modelo, nome do rascunho). Sem 'model_name', usa o tiny_llama local.
+    """
+    import torch
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    if model_name is None:
+        model_name = TINY_LLAMA
+        tokenizer, model = tiny_llama()
+    else:
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForCausalLM.from_pretrained(model_name)
+    model.generation_config.do_sample = False
+    if draft_model_name:
+        draft_model = AutoModelForCausalLM.from_pretrained(draft_model_name)
+    else:
+        # Cópia do modelo principal com ruído nos pesos: parte dos tokens propostos é aceita
+        # e parte é rejeitada, exercitando os dois caminhos da verificação
+        draft_model_name, draft_model = f"{model_name}#rascunho-ruidoso", copy.deepcopy(model)
+        torch.manual_seed(1234)
+        with torch.no_grad():
+            for parameter in draft_model.parameters():
+                parameter.add_(torch.randn_like(parameter) * DRAFT_NOISE)
+    draft_model.eval()
+    local_llm.register_local_model(model_name, tokenizer, model, drafts={draft_model_name: draft_model})
+    return model_name, draft_model_name
+
+
+def baseline(model_name: str) -> dict:
+    """Saídas do caminho original (sem KV cache de prefixo nem rascunho), por prompt."""
+    with _overrides(PREFIX_KV_CACHE=False, DRAFT_MODEL=None):
+        return {prompt: local_llm.generate_local_response(*prompt, model_name) for prompt in PROMPTS}
+
+
+def speculation_counts() -> tuple:
+    """(tokens propostos pelo rascunho, tokens aceitos) acumulados nas estatísticas de geração."""
+    stats = local_llm.get_generation_stats().values()
+    return sum(s.get("draft_proposed", 0) for s in stats), sum(s.get("draft_accepted", 0) for s in stats)
+
+
+def check(name: str, model_name: str, baseline: dict, **overrides) -> bool:
+    with _overrides(**overrides):
+        ok = True
+        for system_prompt, user_prompt in PROMPTS:
+            # Duas chamadas por prompt: a primeira preenche os caches, a segunda os usa
+            for _ in range(2):
+                output = local_llm.generate_local_response(system_prompt, user_prompt, model_name)
+                if output != baseline[(system_prompt, user_prompt)]:
+                    ok = False
+                    print(f"  [{name}] divergência em '{user_prompt[:40]}...':\n    {output!r}\n    {baseline[(system_prompt, user_prompt)]!r}")
+        print(f"{name}: {'OK' if ok else 'FALHOU'}")
+        return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", default=None,
+                        help="Modelo do Hugging Face (ex.: hf-internal-testing/tiny-random-LlamaForCausalLM); "
+                             "padrão: o Llama minúsculo montado localmente")
+    parser.add_argument("--draft-model", default=None,
+                        help="Modelo de rascunho (mesmo tokenizer, diferente de --model) para a decodificação "
+                             "especulativa; padrão: uma cópia de --model com ruído nos pesos")
+    args = parser.parse_args()
+    if args.draft_model and args.draft_model == args.model:
+        parser.error("--draft-model precisa ser diferente de --model: com o próprio modelo, todo rascunho é aceito "
+                     "e o caminho de rejeição nunca é testado.")
+    stop_ok = check_sql_stop()
+
+    model_name, draft_name = load_models(args.model, args.draft_model)
+    expected = baseline(model_name)
+
+    results = [
+        stop_ok,
+        check("KV cache de prefixo", model_name, expected, PREFIX_KV_CACHE=True, DRAFT_MODEL=None),
+        check("Decodificação especulativa", model_name, expected, DRAFT_MODEL=draft_name),
+    ]
+    proposed, accepted = speculation_counts()
+    # Equivalência só vale se o modelo principal aceitou parte dos tokens propostos e recusou outra parte
+    speculation_ok = 0 < accepted < proposed
+    results.append(speculation_ok)
+    print(f"Rascunho exercitado ({accepted}/{proposed} tokens aceitos): {'OK' if speculation_ok else 'FALHOU'}")
+
+    with _overrides(PREFIX_KV_CACHE=False, DRAFT_MODEL=None):
+        streamed = {prompt: "".join(local_llm.stream_local_response(*prompt, model_name)) for prompt in PROMPTS}
+    results.append(streamed == expected)
+    print(f"Streaming: {'OK' if streamed == expected else 'FALHOU'}")
+    raise SystemExit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# evaluation/retrieval.py
+"""
+Compara configurações do modelo de embeddings na recuperação de tabelas: recall@k
+sobre o conjunto rotulado em evaluation/data/retrieval_eval.jsonl (pergunta ->
+tabelas esperadas), latência de um encode de pergunta e tempo de montagem dos índices.
+
+Configurações (--configs):
+- "atual": sentence-transformers, todas as dimensões, sem normalizar, IndexFlatL2;
+- "st-ip": sentence-transformers normalizado, IndexFlatIP;
+- "onnx-int8": modelo ONNX quantizado (python -m assistant.embeddings export), IndexFlatIP;
+- "onnx-int8-256": o anterior truncado em 256 dimensões.
+
+Uso: python -m evaluation.retrieval [--configs atual onnx-int8] [-k 3]
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from assistant import config, embeddings, pipeline
+from assistant.schema_catalog import SchemaCatalog
+
+EVAL_FILE = os.path.join(os.path.dirname(__file__), "data", "retrieval_eval.jsonl")
+
+CONFIGS = {
+    "atual": {"backend": "sentence-transformers", "dimensions": 0, "normalize": False},
+    "st-ip": {"backend": "sentence-transformers", "dimensions": 0, "normalize": True},
+    "onnx-int8": {"backend": "onnx-int8", "dimensions": 0, "normalize": True},
+    "onnx-int8-256": {"backend": "onnx-int8", "dimensions": 256, "normalize": True},
+}
+
+
+def load_eval_set(path: str = EVAL_FILE):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_model(name: str, encoders: dict):
+    """Aplica a configuração 'name' em config e monta o modelo; o encoder de cada backend é carregado uma vez."""
+    settings = CONFIGS[name]
+    config.EMBEDDING_BACKEND = settings["backend"]
+    config.EMBEDDING_DIMENSIONS = settings["dimensions"]
+    config.EMBEDDING_NORMALIZE = settings["normalize"]
+    if settings["backend"] not in encoders:
+        encoders[settings["backend"]] = embeddings.load_embedding_model(backend=settings["backend"])
+    loaded = encoders[settings["backend"]]
+    if loaded.backend != settings["backend"]:
+        return None  # Backend indisponível: load_embedding_model já avisou e voltou para o sentence-transformers
+    return embeddings.EmbeddingModel(loaded.encoder, loaded.backend, settings["dimensions"], settings["normalize"],
+                                     loaded.name)
+
+
+def evaluate(name: str, model, dfs, examples, k: int) -> dict:
+    start = time.perf_counter()
+    # Sem cache em disco: os índices de cada configuração são montados do zero
+    index, table_names, _, _, _ = pipeline.setup_faiss_and_model(dfs, config.BASE_TEXTS, model, cache_dir="")
+    build_seconds = time.perf_counter() - start
+
+    model.encode(["query: aquecimento"])
+    recalls, latencies = [], []
+    for example in examples:
+        expected = [t for t in example["tables"] if t in table_names]
+        if not expected:
+            continue
+        start = time.perf_counter()
+        question_embedding = pipeline.encode_question(example["question"], model)
+        latencies.append(time.perf_counter() - start)
+        retrieved = pipeline.retrieve_tables_thorr(example["question"], model, index, table_names, k=k,
+                                                   question_embedding=question_embedding)
+        recall = len(set(expected) & set(retrieved)) / len(expected)
+        recalls.append(recall)
+        if recall < 1:
+            print(f"  [{name}] '{example['question']}' -> {retrieved} (esperado {expected})")
+
+    latencies.sort()
+    return {
+        "recall": statistics.mean(recalls) if recalls else 0.0,
+        "questions": len(recalls),
+        "encode_ms": 1000 * statistics.median(latencies),
+        "encode_p95_ms": 1000 * latencies[int(0.95 * (len(latencies) - 1))],
+        "build_s": build_seconds,
+        "dimensions": int(index.d),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--configs", nargs="+", choices=list(CONFIGS), default=list(CONFIGS))
+    parser.add_argument("-k", type=int, default=3, help="Tabelas recuperadas por pergunta")
+    args = parser.parse_args()
+
+    examples = load_eval_set()
+    dfs = SchemaCatalog.from_database()
+    encoders, results = {}, {}
+    for name in args.configs:
+        model = load_model(name, encoders)
+        if model is None:
+            print(f"⚠️ Configuração '{name}' ignorada: backend '{CONFIGS[name]['backend']}' indisponível.")
+            continue
+        results[name] = evaluate(name, model, dfs, examples, args.k)
+
+    print(f"\n{'configuração':<14} {'dims':>5} {'recall@' + str(args.k):>9} {'encode':>10} {'p95':>10} {'índices':>9}")
+    for name, r in results.items():
+        print(f"{name:<14} {r['dimensions']:>5} {r['recall']:>9.1%} {r['encode_ms']:>7.1f} ms "
+              f"{r['encode_p95_ms']:>7.1f} ms {r['build_s']:>8.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# index_advisor.py
+"""
+Sugere índices compostos a partir do log de consultas (config.SQL_QUERY_LOG).
+
+Lê as consultas cujo plano varreu uma tabela inteira ou ordenou com uma B-tree
+temporária, extrai os filtros (igualdade e intervalo) e a ordenação de cada tabela,
+agrupa os padrões repetidos e propõe um índice por padrão: colunas de igualdade,
+depois a de intervalo ou as de ordenação. Com --apply, cria os índices, roda ANALYZE
+e mede as consultas do log antes e depois.
+
+Uso: python index_advisor.py [--log .cache/query_log.jsonl] [--top 5] [--min-count 2] [--apply]
+"""
+import argparse
+import json
+import re
+import sqlite3
+import time
+from collections import defaultdict
+from assistant import config
+from assistant.query_guard import table_aliases
+from setup_database import ADVISOR_TABLE
+
+_CLAUSE_END = r"(?=\bgroup\s+by\b|\border\s+by\b|\blimit\b|\bhaving\b|\bunion\b|\)|;|$)"
+_PREDICATE = re.compile(r'(?:(\w+)\.)?"?(\w+)"?\s*(==|=|<=|>=|<|>|\bin\b|\bbetween\b)\s*(\w+\.\w+)?',
+                        re.IGNORECASE)
+
+
+def read_log(path: str) -> list:
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry.get("error") is None and entry.get("plan"):
+                entries.append(entry)
+    return entries
+
+
+def table_columns(conn: sqlite3.Connection) -> dict:
+    tables = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+    return {t: [r[1] for r in conn.execute(f'PRAGMA table_info("{t}")')] for t in tables}
+
+
+def existing_indexes(conn: sqlite3.Connection) -> dict:
+    """Colunas de cada índice existente, por tabela."""
+    indexes = defaultdict(list)
+    for name, table in conn.execute("SELECT name, tbl_name FROM sqlite_master WHERE type='index'"):
+        indexes[table].append(tuple(r[2] for r in conn.execute(f'PRAGMA index_info("{name}")')))
+    return indexes
+
+
+def _resolve(qualifier: str, col: str, aliases: dict, columns: dict):
+    """Tabela da coluna: pelo alias/nome qualificado ou, sem qualificação, pela única tabela que a tem."""
+    if qualifier:
+        table = aliases.get(qualifier, qualifier)
+        return table if col in columns.get(table, []) else None
+    owners = [t for t in set(aliases.values()) if col in columns.get(t, [])]
+    return owners[0] if len(owners) == 1 else None
+
+
+def extract_patterns(sql: str, columns: dict) -> dict:
+    """Filtros e ordenação de cada tabela: {tabela: {"eq": set, "range": list, "order": list}}."""
+    aliases = table_aliases(sql)
+    patterns = defaultdict(lambda: {"eq": set(), "range": [], "order": []})
+
+    for clause in re.findall(rf"\b(?:where|on)\b(.*?){_CLAUSE_END}", sql, re.IGNORECASE | re.DOTALL):
+        for qualifier, col, op, other_column in _PREDICATE.findall(clause):
+            if other_column:
+                continue  # a.x = b.y é junção, coberta pelos índices das colunas-chave
+            table = _resolve(qualifier, col, aliases, columns)
+            if table is None:
+                continue
+            if op.lower() in ("=", "==", "in"):
+                patterns[table]["eq"].add(col)
+            elif col not in patterns[table]["range"]:
+                patterns[table]["range"].append(col)
+
+    order = re.search(r"\border\s+by\b(.*?)(?=\blimit\b|\)|;|$)", sql, re.IGNORECASE | re.DOTALL)
+    if order:
+        for term in order.group(1).split(","):
+            match = re.fullmatch(r'\s*(?:(\w+)\.)?"?(\w+)"?(?:\s+(?:asc|desc))?\s*', term, re.IGNORECASE)
+            if match is None:
+                continue  # expressões (ex.: AVG(preco)) não usam índice
+            table = _resolve(match.group(1), match.group(2), aliases, columns)
+            if table is not None:
+                patterns[table]["order"].append(match.group(2))
+    return patterns
+
+
+def _scanned_tables(entry: dict, aliases: dict) -> set:
+    scanned = set()
+    for detail in entry["plan"]:
+        match = re.match(r"SCAN (?:TABLE )?(\w+)", detail)
+        if match:
+            scanned.add(aliases.get(match.group(1), match.group(1)))
+    return scanned
+
+
+def index_columns(pattern: dict) -> tuple:
+    """Igualdades primeiro (ordem alfabética, para padrões iguais darem o mesmo índice), depois intervalo ou ordenação."""
+    cols = sorted(pattern["eq"])
+    tail = pattern["range"][:1] or pattern["order"]
+    for col in tail:
+        if col not in cols:
+            cols.append(col)
+    return tuple(cols)
+
+
+def propose_indexes(entries: list, columns: dict, indexes: dict, min_count: int) -> list:
+    candidates = {}
+    for entry in entries:
+        aliases = table_aliases(entry["sql"])
+        scanned = _scanned_tables(entry, aliases)
+        temp_sort = any("TEMP B-TREE FOR ORDER BY" in d for d in entry["plan"])
+        for table, pattern in extract_patterns(entry["sql"], columns).items():
+            if table not in scanned and not (temp_sort and pattern["order"]):
+                continue
+            cols = index_columns(pattern)
+            if not cols:
+                continue
+            candidate = candidates.setdefault((table, cols), {"table": table, "columns": cols, "count": 0,
+                                                              "total_ms": 0.0, "queries": []})
+            candidate["count"] += 1
+            candidate["total_ms"] += entry.get("duration_ms") or 0.0
+            if entry["sql"] not in candidate["queries"]:
+                candidate["queries"].append(entry["sql"])
+
+    # Um padrão que é prefixo de outro da mesma tabela é atendido pelo índice maior
+    for key, candidate in sorted(candidates.items(), key=lambda kv: len(kv[0][1])):
+        longer = [c for (table, cols), c in candidates.items()
+                  if table == key[0] and len(cols) > len(key[1]) and cols[:len(key[1])] == key[1]]
+        if longer:
+            target = max(longer, key=lambda c: c["count"])
+            target["count"] += candidate["count"]
+            target["total_ms"] += candidate["total_ms"]
+            target["queries"].extend(q for q in candidate["queries"] if q not in target["queries"])
+            candidate["count"] = 0
+
+    proposals = []
+    for candidate in candidates.values():
+        covered = any(existing[:len(candidate["columns"])] == candidate["columns"] for existing in indexes[candidate["table"]])
+        if candidate["count"] >= min_count and not covered:
+            name = f"idx_adv_{candidate['table']}_{'_'.join(candidate['columns'])}"
+            column_list = ", ".join(f'"{c}"' for c in candidate["columns"])
+            candidate.update(name=name, create_sql=f'CREATE INDEX IF NOT EXISTS "{name}" ON "{candidate["table"]}" ({column_list})')
+            proposals.append(candidate)
+    return sorted(proposals, key=lambda c: c["total_ms"], reverse=True)
+
+
+def time_queries(conn: sqlite3.Connection, queries: list) -> float:
+    """Tempo total (ms) das consultas, cada uma executada até o fim."""
+    start = time.perf_counter()
+    for sql in queries:
+        conn.execute(sql).fetchall()
+    return 1000 * (time.perf_counter() - start)
+
+
+def apply_index(conn: sqlite3.Connection, proposal: dict, sample_size: int = 5):
+    queries = proposal["queries"][:sample_size]
+    before = time_queries(conn, queries)
+    conn.execute(proposal["create_sql"])
+    conn.execute("ANALYZE")
+    # Guardado no banco: o setup_database recria o índice quando recarregar a tabela
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {ADVISOR_TABLE} "
+                 "(index_name TEXT PRIMARY KEY, table_name TEXT, create_sql TEXT, created_at REAL)")
+    conn.execute(f"INSERT OR REPLACE INTO {ADVISOR_TABLE} VALUES (?, ?, ?, ?)",
+                 (proposal["name"], proposal["table"], proposal["create_sql"], time.time()))
+    conn.commit()
+    after = time_queries(conn, queries)
+    return before, after
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", default=config.SQL_QUERY_LOG, help="Log JSONL de consultas")
+    parser.add_argument("--top", type=int, default=5, help="Número máximo de índices propostos")
+    parser.add_argument("--min-count", type=int, default=2, help="Ocorrências mínimas de um padrão")
+    parser.add_argument("--apply", action="store_true", help="Cria os índices propostos e mede antes/depois")
+    args = parser.parse_args()
+
+    entries = read_log(args.log)
+    conn = sqlite3.connect(config.DB_FILE)
+    proposals = propose_indexes(entries, table_columns(conn), existing_indexes(conn), args.min_count)[:args.top]
+    print(f"{len(entries)} consultas no log, {len(proposals)} índices propostos.")
+
+    for proposal in proposals:
+        print("-" * 50)
+        print(f"{proposal['create_sql']};")
+        print(f"   {proposal['count']} consultas, {proposal['total_ms']:.0f} ms no total")
+        if args.apply:
+            before, after = apply_index(conn, proposal)
+            print(f"   ✅ Aplicado: {before:.1f} ms -> {after:.1f} ms ({before / max(after, 1e-9):.1f}x) "
+                  f"em {min(len(proposal['queries']), 5)} consultas do log")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
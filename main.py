@@ -1,57 +1,105 @@
 # main.py
-from sentence_transformers import SentenceTransformer
-from assistant import config, executa_sql, pipeline, intent_classifier, conversation
+from assistant import executa_sql, pipeline, intent_classifier, conversation, prompt_fragments, tracing
 from assistant.pipeline import run_sql_pipeline
+from assistant.warmup import Warmup
 
 
-def main():
-    # --- Etapa de Configuração Inicial ---
-    print("Iniciando o assistente de dados Thorr...")
-    print("Carregando dados e modelo de embeddings...")
+def print_stream(chunks):
+    """Imprime a resposta do Thorr conforme os pedaços chegam do modelo."""
+    print("\nThorr: ", end="", flush=True)
+    for chunk in chunks:
+        print(chunk, end="", flush=True)
+    print()
+
+
+def print_paged_result(sql_query: str) -> bool:
+    """
+    Mostra a primeira página do resultado e busca as próximas conforme o usuário pede.
+    Retorna True se a query executou sem erro.
+    """
+    pager = executa_sql.open_query(sql_query)
+    if isinstance(pager, str):
+        print(pager)
+        return False
+    success = True
+    try:
+        page = pager.fetch_page()
+        print(page.to_string() if page is not None and len(page) else "(nenhuma linha)")
+        while not pager.done:
+            if input(f"-- {pager.rows} linhas até aqui. Mais? [Enter = sim, n = não] ").strip().lower() in ("n", "nao", "não"):
+                break
+            page = pager.fetch_page()
+            if page is not None and len(page):
+                print(page.to_string(header=False))
+    except Exception as e:
+        print(f"Erro ao executar a query: {e}")
+        success = False
+    finally:
+        pager.close()
+    report = pager.report()
+    total = f"{report['total_ms']:.0f} ms" if report["total_ms"] is not None else "leitura interrompida"
+    first = f"{report['first_page_ms']:.0f} ms" if report["first_page_ms"] is not None else "-"
+    print(f"[{pager.rows} linhas | primeira página em {first} | resultado completo: {total}]")
+    return success
 
-    # Carrega DataFrames do novo banco de dados
-    dfs = executa_sql.get_all_tables_dfs()
-    base_texts = config.BASE_TEXTS  # Textos descritivos das tabelas e colunas
 
-    model = SentenceTransformer(config.EMBEDDING_MODEL)
-    index, table_names, _, _ = pipeline.setup_faiss_and_model(dfs, base_texts, model)
-    
-    print("Assistente pronto! Digite 'sair' para encerrar.")
+def main(verbose: bool = True):  # verbose=False desliga as mensagens DEBUG das etapas
+    # --- Etapa de Configuração Inicial ---
+    print("Iniciando o assistente de dados Thorr...")
+    # Esquema, modelo de embeddings + índices FAISS e LLM carregam em paralelo, em segundo plano
+    warmup = Warmup().start()
+    print("Carregando dados e modelos; a primeira pergunta já pode ser digitada. Digite 'sair' para encerrar.")
     print("-" * 50)
 
 
     while True:
         question = input("> Digite sua pergunta: ").strip()
         if question.lower() in ['sair', 'exit', 'quit']:
+            if "sql_cache" in warmup.state:
+                print(warmup.state["sql_cache"].report())
+            print(prompt_fragments.report())
             print("Até logo!")
             break
 
-        intent = intent_classifier.classify_intent(question)
+        # O LLM pode continuar carregando: só a recuperação precisa estar pronta aqui
+        state = warmup.wait("index")
+        model, dfs = state["model"], state["dfs"]
 
-        if intent == 'SQL_QUERY':
+        with tracing.console(verbose), tracing.span("question", question=question) as span:
+            # Um único embedding da pergunta serve à intenção, ao cache e à recuperação
+            question_embedding = pipeline.encode_question(question, model)
+            intent = intent_classifier.classify_intent(question, model, question_embedding)
+            span.set(intent=intent)
 
-            sql_query = run_sql_pipeline(
-                question=question,
-                model=model,
-                index=index,
-                table_names=table_names,
-                all_dfs=dfs,
-                verbose=True  # Mude para False para desligar o debug!
-            )
+            if intent == 'SQL_QUERY':
+
+                sql_query = run_sql_pipeline(
+                    question=question,
+                    model=model,
+                    index=state["index"],
+                    table_names=state["table_names"],
+                    all_dfs=dfs,
+                    column_catalog=state["column_catalog"],
+                    sql_cache=state["sql_cache"],
+                    question_embedding=question_embedding,
+                    verbose=verbose
+                )
             
-            print("\n[Resultado Final]:")
-            result = executa_sql.execute_query(sql_query)
-            print(result)
+                print("\n[Resultado Final]:")
+                if print_paged_result(sql_query):
+                    state["sql_cache"].confirm(sql_query)  # Só SQL que executou sem erro fica no cache
             
-        elif intent == 'DATA_ASSISTANCE':
-            answer = pipeline.handle_data_assistance(question, dfs)
-            print(f"\nThorr: {answer}")
-
-        elif intent == 'GENERAL_CONVERSATION':
-            answer = conversation.handle_general_conversation(question)
-            print(f"\nThorr: {answer}")
-        else:
-            print("\nThorr: Desculpe, não consegui entender. Poderia reformular?")
+            elif intent == 'DATA_ASSISTANCE':
+                # Tabelas ordenadas pela recuperação: as mais relevantes entram primeiro no orçamento do prompt
+                ranked_tables = pipeline.retrieve_tables_thorr(question, model, state["index"], state["table_names"],
+                                                               k=len(state["table_names"]),
+                                                               question_embedding=question_embedding)
+                print_stream(pipeline.stream_data_assistance(question, dfs, ranked_tables))
+
+            elif intent == 'GENERAL_CONVERSATION':
+                print_stream(conversation.stream_general_conversation(question))
+            else:
+                print("\nThorr: Desculpe, não consegui entender. Poderia reformular?")
         
         print("-" * 50)
 
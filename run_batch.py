@@ -0,0 +1,68 @@
+# run_batch.py
+"""
+Processa em lote um arquivo de perguntas pelo pipeline de Text-to-SQL.
+
+Entrada: um .txt (uma pergunta por linha) ou um .jsonl (campo "question").
+Saída: um .jsonl com o SQL gerado, as tabelas recuperadas e os tempos por etapa.
+
+Uso: python run_batch.py perguntas.txt resultados.jsonl [--batch-size 8] [--chunk-size 256]
+"""
+import argparse
+import json
+import time
+from assistant.embeddings import load_embedding_model
+from assistant import config, pipeline
+from assistant.schema_catalog import SchemaCatalog
+
+
+def read_questions(path: str):
+    """Lê as perguntas do arquivo uma a uma, sem carregar o arquivo inteiro."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            yield json.loads(line)["question"] if path.endswith(".jsonl") else line
+
+
+def chunked(items, size: int):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="Arquivo de perguntas (.txt ou .jsonl)")
+    parser.add_argument("output", help="Arquivo JSONL de resultados")
+    parser.add_argument("--batch-size", type=int, default=config.LLM_BATCH_SIZE,
+                        help="Prompts por chamada de model.generate")
+    parser.add_argument("--chunk-size", type=int, default=256,
+                        help="Perguntas lidas e processadas por vez (limita a memória em arquivos grandes)")
+    args = parser.parse_args()
+
+    dfs = SchemaCatalog.from_database()
+    model = load_embedding_model()
+    index, table_names, _, _, column_catalog = pipeline.setup_faiss_and_model(dfs, config.BASE_TEXTS, model)
+
+    total, start = 0, time.perf_counter()
+    with open(args.output, "w", encoding="utf-8") as out:
+        for questions in chunked(read_questions(args.input), args.chunk_size):
+            results = pipeline.run_sql_pipeline_batch(questions, model, index, table_names, dfs,
+                                                      column_catalog=column_catalog, batch_size=args.batch_size)
+            for result in results:
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            total += len(questions)
+            print(f"{total} perguntas processadas ({total / (time.perf_counter() - start):.2f} perguntas/s)")
+
+    print(f"✅ Resultados gravados em '{args.output}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,48 @@
 # setup_database.py
-import pandas as pd
-import sqlite3
+"""
+Carrega as planilhas da pasta 'tables' no banco SQLite ('database.db').
+
+A carga é incremental: o hash de cada arquivo de origem fica na tabela
+'_ingestion_manifest' e só as tabelas cujos arquivos mudaram são recriadas
+(use --force para recriar tudo). Cada tabela recriada ganha índices nas colunas
+de junção (config.KEY_COLUMNS), as tabelas de resumo do histórico de preços são
+atualizadas (assistant/summary_tables.py), os valores das colunas categóricas são
+indexados (assistant/value_index.py) e o banco é analisado (ANALYZE).
+
+A gravação acontece em uma cópia temporária do banco, em uma única transação, e a
+cópia substitui o banco com os.replace: quem está lendo o banco nunca vê uma carga
+pela metade.
+
+Uso: python setup_database.py [--force]
+"""
+import argparse
+import hashlib
 import os
+import sqlite3
+import time
+from functools import lru_cache
+import numpy as np
+import pandas as pd
 from unidecode import unidecode  # <-- NOVO: Importa a biblioteca de normalização
+from assistant import config
+from assistant.summary_tables import SUMMARY_TABLES, refresh_summary_tables
+from assistant.value_index import build_value_index
 
 # --- Constantes de Configuração ---
 DB_FILE = "database.db"
-DATA_DIR = "tables" 
+DATA_DIR = "tables"
+# Arquivo de origem de cada tabela (.xlsx ou .csv)
+SOURCE_FILES = {
+    'buildings': 'buildings.xlsx',
+    'typologies': 'typologies.xlsx',
+    'units': 'units.xlsx',
+    'units_updates': 'units_updates.xlsx',
+}
+# Linhas lidas e gravadas por vez: planilhas grandes nunca ficam inteiras na memória
+CHUNK_ROWS = 50000
+MANIFEST_TABLE = "_ingestion_manifest"
+# Índices criados pelo index_advisor.py, recriados quando a tabela é recarregada
+ADVISOR_TABLE = "_advisor_indexes"
 
 # --- FUNÇÃO DE NORMALIZAÇÃO ---
 def normalize_text_column(s):
@@ -24,68 +60,209 @@ def normalize_text_column(s):
 
     # Remove acentos (unidecode) e converte para minúsculas
     return unidecode(s).lower().strip()
+
+# Cidades, incorporadoras e status se repetem muito: cada valor distinto é normalizado uma vez
+_normalize_cached = lru_cache(maxsize=200000)(normalize_text_column)
+
+def normalize_text_series(series: pd.Series) -> pd.Series:
+    """
+    Versão vetorizada de normalize_text_column para uma coluna inteira: normaliza só
+    os valores distintos (com memo entre blocos e tabelas) e espalha o resultado
+    pelos códigos do factorize.
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    normalized = np.array([_normalize_cached(v) for v in uniques], dtype=object)
+    return pd.Series(normalized[codes], index=series.index, dtype=object)
 # -----------------------------
 
-def create_database():
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def iter_source_chunks(path: str, chunk_rows: int = CHUNK_ROWS):
+    """Lê o arquivo em blocos de DataFrames (.csv com pandas, .xlsx com openpyxl em modo read-only)."""
+    if path.endswith(".csv"):
+        yield from pd.read_csv(path, chunksize=chunk_rows)
+        return
+
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == chunk_rows:
+                yield pd.DataFrame.from_records(batch, columns=header).replace({None: np.nan})
+                batch = []
+        if batch:
+            yield pd.DataFrame.from_records(batch, columns=header).replace({None: np.nan})
+    finally:
+        workbook.close()
+
+def prepare_chunk(df: pd.DataFrame, table_name: str, text_columns: set) -> pd.DataFrame:
+    """
+    Normaliza o texto e ajusta os tipos de um bloco. 'text_columns' guarda, entre
+    blocos, as colunas numéricas que precisaram virar TEXT.
+    """
+    # --- NOVO: APLICA A NORMALIZAÇÃO ANTES DO TRATAMENTO DE TIPOS ---
+    for col in df.columns:
+        # Aplica a limpeza apenas em colunas de texto
+        if df[col].dtype == "object" or df[col].dtype == "string":
+            df[col] = normalize_text_series(df[col])
+    # -----------------------------------------------------------------
+
+    # Força conversão de colunas com números muito grandes para string
+    for col in df.columns:
+        # Verifica se a coluna é numérica (inteiro ou float)
+        if pd.api.types.is_numeric_dtype(df[col]) and col not in text_columns:
+            # Se houver valores fora do limite de um inteiro de 64 bits do SQLite
+            if (df[col].dropna().max() > 2**63 - 1) or (df[col].dropna().min() < -2**63):
+                print(f"⚠️ Coluna '{col}' na tabela '{table_name}' convertida para TEXT (valores muito grandes).")
+                text_columns.add(col)
+        if col in text_columns:
+            df[col] = df[col].astype(str)
+
+    # Datas no mesmo formato que o df.to_sql gravava
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime("%Y-%m-%d %H:%M:%S")
+
+    # Força todas as colunas "object" a virarem string explícita para o SQLite
+    return df.astype({col: "string" for col in df.columns if df[col].dtype == "object"})
+
+def ingest_table(conn: sqlite3.Connection, table_name: str, path: str) -> int:
+    """Recria a tabela a partir do arquivo, bloco a bloco. Retorna o número de linhas."""
+    conn.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+    text_columns, total = set(), 0
+    insert_sql = None
+    for chunk in iter_source_chunks(path):
+        chunk = prepare_chunk(chunk, table_name, text_columns)
+        if insert_sql is None:
+            # O primeiro bloco define o esquema (os mesmos tipos que o df.to_sql usava)
+            conn.execute(pd.io.sql.get_schema(chunk, table_name))
+            columns = ", ".join(f'"{c}"' for c in chunk.columns)
+            insert_sql = f'INSERT INTO "{table_name}" ({columns}) VALUES ({", ".join("?" * len(chunk.columns))})'
+        records = chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None)
+        conn.executemany(insert_sql, records)
+        total += len(chunk)
+    return total
+
+def create_indexes(conn: sqlite3.Connection, table_name: str):
     """
-    Lê os arquivos Excel da pasta 'tables', trata os tipos de dados e os salva
-    em um banco de dados SQLite persistente ('database.db').
+    Índices nas colunas de junção (config.KEY_COLUMNS) da tabela, e os índices que o
+    index_advisor.py aplicou nela antes da recarga.
     """
-    # Se o banco de dados já existir, ele será removido para garantir uma recriação limpa.
-    if os.path.exists(DB_FILE):
-        print(f"O banco de dados '{DB_FILE}' já existe. Removendo para recriar.")
-        os.remove(DB_FILE)
+    columns = [r[1] for r in conn.execute(f'PRAGMA table_info("{table_name}")')]
+    for col in config.KEY_COLUMNS:
+        if col in columns:
+            conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table_name}_{col}" ON "{table_name}" ("{col}")')
+    for (create_sql,) in conn.execute(f"SELECT create_sql FROM {ADVISOR_TABLE} WHERE table_name = ?",
+                                      (table_name,)).fetchall():
+        conn.execute(create_sql)
+
+def read_manifest(db_file: str) -> dict:
+    if not os.path.exists(db_file):
+        return {}
+    conn = sqlite3.connect(db_file)
+    try:
+        return dict(conn.execute(f"SELECT table_name, file_hash FROM {MANIFEST_TABLE}").fetchall())
+    except sqlite3.OperationalError:
+        return {}  # Banco criado antes do manifesto: tudo é recarregado
+    finally:
+        conn.close()
 
-    # Conecta-se a um arquivo no disco
-    conn = sqlite3.connect(DB_FILE)
-    print(f"Conexão com o banco de dados '{DB_FILE}' estabelecida.")
+def create_database(force: bool = False):
+    """
+    Lê os arquivos da pasta 'tables', trata os tipos de dados e os salva em um banco
+    de dados SQLite persistente ('database.db'), recriando só as tabelas cujos
+    arquivos mudaram desde a última carga.
+    """
+    manifest = {} if force else read_manifest(DB_FILE)
 
+    hashes, changed = {}, []
+    for table_name, file_name in SOURCE_FILES.items():
+        file_path = os.path.join(DATA_DIR, file_name)
+        if not os.path.exists(file_path):
+            print(f"⚠️ Arquivo '{file_path}' não encontrado; a tabela '{table_name}' não será atualizada.")
+            continue
+        hashes[table_name] = file_hash(file_path)
+        if manifest.get(table_name) != hashes[table_name]:
+            changed.append(table_name)
+
+    if not changed:
+        print(f"Nenhum arquivo mudou desde a última carga; '{DB_FILE}' já está atualizado.")
+        return
+
+    # Trabalha numa cópia: o banco em uso só é trocado quando a carga termina
+    tmp_file = DB_FILE + ".tmp"
+    if os.path.exists(tmp_file):
+        os.remove(tmp_file)
+    if os.path.exists(DB_FILE) and not force:
+        source = sqlite3.connect(DB_FILE)
+        target = sqlite3.connect(tmp_file)
+        source.backup(target)
+        source.close()
+        target.close()
+
+    conn = sqlite3.connect(tmp_file, isolation_level=None)
+    print(f"Recriando {changed} em '{tmp_file}'...")
+    total_rows, start = 0, time.perf_counter()
     try:
-        excel_files = {
-            'buildings': 'buildings.xlsx',
-            'typologies': 'typologies.xlsx',
-            'units': 'units.xlsx',
-            'units_updates': 'units_updates.xlsx',
-        }
-
-        for table_name, file_name in excel_files.items():
-            file_path = os.path.join(DATA_DIR, file_name)
+        conn.execute("BEGIN")
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {MANIFEST_TABLE} "
+                     "(table_name TEXT PRIMARY KEY, file_hash TEXT, rows INTEGER, ingested_at REAL)")
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {ADVISOR_TABLE} "
+                     "(index_name TEXT PRIMARY KEY, table_name TEXT, create_sql TEXT, created_at REAL)")
+        for table_name in changed:
+            file_path = os.path.join(DATA_DIR, SOURCE_FILES[table_name])
             print(f"Processando '{file_path}'...")
-            
-            df = pd.read_excel(file_path)
-            
-            # --- NOVO: APLICA A NORMALIZAÇÃO ANTES DO TRATAMENTO DE TIPOS ---
-            for col in df.columns:
-                # Aplica a limpeza apenas em colunas de texto
-                if df[col].dtype == "object" or df[col].dtype == "string":
-                    df[col] = df[col].apply(lambda x: normalize_text_column(x))
-            # -----------------------------------------------------------------
-            
-            # Força conversão de colunas com números muito grandes para string
-            for col in df.columns:
-                # Verifica se a coluna é numérica (inteiro ou float)
-                if pd.api.types.is_numeric_dtype(df[col]):
-                    # Se houver valores fora do limite de um inteiro de 64 bits do SQLite
-                    if (df[col].dropna().max() > 2**63 - 1) or (df[col].dropna().min() < -2**63):
-                        print(f"⚠️ Coluna '{col}' na tabela '{table_name}' convertida para TEXT (valores muito grandes).")
-                        df[col] = df[col].astype(str)
-            
-            # Força todas as colunas "object" a virarem string explícita para o SQLite
-            df = df.astype({col: "string" for col in df.columns if df[col].dtype == "object"})
-
-            # Grava o DataFrame tratado no banco de dados SQLite
-            df.to_sql(table_name, conn, if_exists='replace', index=False)
-            print(f"✅ Tabela '{table_name}' criada com sucesso.")
-
-    except FileNotFoundError as e:
-        print(f"\n❌ ERRO: Arquivo não encontrado! Verifique se a pasta '{DATA_DIR}' existe e contém os arquivos Excel.")
-        print(f"   Detalhe: {e}")
+            table_start = time.perf_counter()
+            rows = ingest_table(conn, table_name, file_path)
+            create_indexes(conn, table_name)
+            conn.execute(f"INSERT OR REPLACE INTO {MANIFEST_TABLE} VALUES (?, ?, ?, ?)",
+                         (table_name, hashes[table_name], rows, time.time()))
+            elapsed = time.perf_counter() - table_start
+            total_rows += rows
+            print(f"✅ Tabela '{table_name}' criada com sucesso ({rows} linhas, {rows / max(elapsed, 1e-9):.0f} linhas/s).")
+        # Preço e disponibilidade atuais por unidade, prédio e cidade (incremental)
+        refreshed = []
+        if {"units_updates", "units", "buildings"} & set(changed):
+            refresh_summary_tables(conn, changed, force=force)
+            refreshed = SUMMARY_TABLES
+        # Valores das colunas categóricas, para citar literais reais no prompt de SQL
+        build_value_index(conn, changed + refreshed)
+        # Estatísticas para o planejador (e contagens de linhas para o query_guard)
+        conn.execute("ANALYZE")
+        conn.execute("COMMIT")
     except Exception as e:
-        print(f"\n❌ ERRO ao processar os arquivos e salvar no banco de dados. Causa provável: problema de tipo de dado.")
-        print(f"   Detalhe: {e}")
-    finally:
+        conn.execute("ROLLBACK")
         conn.close()
-        print("\nProcesso finalizado. Conexão com o banco de dados fechada.")
+        os.remove(tmp_file)
+        print("\n❌ ERRO ao processar os arquivos e salvar no banco de dados. Causa provável: problema de tipo de dado.")
+        print(f"   Detalhe: {e}")
+        print(f"   O banco '{DB_FILE}' não foi alterado.")
+        return
+    conn.close()
+
+    # Troca atômica: leitores abertos continuam no arquivo antigo até reabrirem
+    os.replace(tmp_file, DB_FILE)
+    elapsed = time.perf_counter() - start
+    print(f"\nBanco '{DB_FILE}' atualizado: {total_rows} linhas em {elapsed:.1f}s "
+          f"({total_rows / max(elapsed, 1e-9):.0f} linhas/s).")
+
+    # Cópia colunar para o motor DuckDB, se ele lê de Parquet
+    if config.SQL_ANALYTIC_ENGINE == "duckdb" and config.DUCKDB_SOURCE == "parquet":
+        from assistant.duckdb_engine import export_parquet
+        export_parquet(DB_FILE)
 
 if __name__ == "__main__":
-    create_database()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--force", action="store_true", help="Recria todas as tabelas, mesmo sem mudança nos arquivos")
+    create_database(force=parser.parse_args().force)
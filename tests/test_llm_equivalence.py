@@ -0,0 +1,43 @@
+# tests/test_llm_equivalence.py
+"""
+Sob decodificação gulosa, o KV cache de prefixo e a decodificação especulativa geram
+exatamente a mesma saída do caminho original (Llama minúsculo em CPU, sem rede).
+"""
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from assistant import local_llm
+from evaluation import llm_equivalence
+
+
+@pytest.fixture(scope="module")
+def models():
+    model_name, draft_name = llm_equivalence.load_models()
+    return model_name, draft_name, llm_equivalence.baseline(model_name)
+
+
+def test_prefix_kv_cache_matches_baseline(models):
+    model_name, _, expected = models
+    assert llm_equivalence.check("KV cache de prefixo", model_name, expected, PREFIX_KV_CACHE=True, DRAFT_MODEL=None)
+    # O cache de prefixo foi de fato preenchido (e reaproveitado na segunda chamada de cada prompt)
+    assert any(key[0] == model_name for key in local_llm._prefix_cache)
+
+
+def test_speculative_decoding_matches_baseline(models):
+    model_name, draft_name, expected = models
+    proposed_before, accepted_before = llm_equivalence.speculation_counts()
+    assert llm_equivalence.check("Decodificação especulativa", model_name, expected, DRAFT_MODEL=draft_name)
+    proposed, accepted = llm_equivalence.speculation_counts()
+    proposed, accepted = proposed - proposed_before, accepted - accepted_before
+    # O rascunho teve tokens aceitos e rejeitados: os dois caminhos da verificação rodaram
+    assert 0 < accepted < proposed
+
+
+@pytest.mark.parametrize("overrides", [{"PREFIX_KV_CACHE": False}, {"PREFIX_KV_CACHE": True}], ids=["original", "kv-cache"])
+def test_streaming_matches_baseline(models, overrides):
+    model_name, _, expected = models
+    with llm_equivalence._overrides(DRAFT_MODEL=None, **overrides):
+        streamed = {prompt: "".join(local_llm.stream_local_response(*prompt, model_name)) for prompt in llm_equivalence.PROMPTS}
+    assert streamed == expected
@@ -0,0 +1,59 @@
+# tests/test_server.py
+"""Micro-lotes e resposta 429 do serviço HTTP, com o backend stub do LLM (sem GPU nem rede)."""
+import asyncio
+import httpx
+import pytest
+from assistant import config, local_llm, server
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def stub_llm(monkeypatch):
+    # Um modelo de chat próprio do teste, servido por um StubBackend lento o bastante para formar lotes
+    monkeypatch.setattr(config, "CHAT_MODEL", "stub-teste-servidor")
+    local_llm._model_cache[config.CHAT_MODEL] = {"tokenizer": None, "model": None,
+                                                 "backend": local_llm.StubBackend(delay=0.05)}
+    yield local_llm.StubBackend.RESPONSES["chat"]
+    local_llm._model_cache.pop(config.CHAT_MODEL, None)
+
+
+async def _post_chats(app, n: int) -> list:
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://thorr") as client:
+            responses = await asyncio.gather(*[client.post("/chat", json={"question": f"Oi {i}"}) for i in range(n)])
+            metrics = (await client.get("/metrics")).json()
+    return responses, metrics
+
+
+@pytest.mark.anyio
+async def test_concurrent_chats_are_micro_batched(stub_llm, monkeypatch):
+    monkeypatch.setattr(config, "SERVER_MAX_BATCH_SIZE", 8)
+    monkeypatch.setattr(config, "SERVER_MAX_WAIT_MS", 50)
+    responses, metrics = await _post_chats(server.create_app(state={"model": None}), 8)
+
+    assert [r.status_code for r in responses] == [200] * 8
+    assert all(r.json()["answer"] == stub_llm for r in responses)
+    llm = metrics["batchers"]["llm"]
+    assert llm["items"] == 8 and llm["batches"] < 8
+    assert metrics["latency"]["/chat"]["count"] == 8
+
+
+@pytest.mark.anyio
+async def test_full_queue_answers_429_outside_latency_percentiles(stub_llm, monkeypatch):
+    monkeypatch.setattr(config, "SERVER_MAX_BATCH_SIZE", 1)
+    monkeypatch.setattr(config, "SERVER_MAX_QUEUE", 1)
+    responses, metrics = await _post_chats(server.create_app(state={"model": None}), 6)
+
+    statuses = [r.status_code for r in responses]
+    assert 200 in statuses and 429 in statuses and set(statuses) == {200, 429}
+    rejected = [r for r in responses if r.status_code == 429]
+    assert all(r.headers["Retry-After"] == "1" for r in rejected)
+    # Só os pedidos atendidos entram nos percentis; os recusados têm contador próprio
+    latency = metrics["latency"]["/chat"]
+    assert latency["count"] == statuses.count(200)
+    assert latency["rejected"] == len(rejected) == metrics["batchers"]["llm"]["rejected"]
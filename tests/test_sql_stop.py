@@ -0,0 +1,21 @@
+# tests/test_sql_stop.py
+"""Regra de parada "sql" do local_llm; roda sem torch."""
+import pytest
+from assistant import local_llm
+from assistant.pipeline import clean_sql_response
+from evaluation.llm_equivalence import SQL_STOP_CASES
+
+
+@pytest.mark.parametrize("response, expected", SQL_STOP_CASES)
+def test_sql_stop_full_response(response, expected):
+    stop_index = local_llm.STOP_RULES["sql"]
+    assert clean_sql_response(local_llm._apply_stop(response, stop_index)) == expected
+
+
+@pytest.mark.parametrize("response, expected", SQL_STOP_CASES)
+def test_sql_stop_streaming(response, expected):
+    # Um caractere por vez: a concatenação do que sai deve ser igual ao corte da resposta completa
+    stop_index = local_llm.STOP_RULES["sql"]
+    streamed = "".join(local_llm._incremental_text(iter(response), stop_index))
+    assert streamed == local_llm._apply_stop(response, stop_index)
+    assert clean_sql_response(streamed) == expected